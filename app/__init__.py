@@ -0,0 +1,3 @@
+import time
+
+started_at = time.perf_counter()
@@ -1,15 +1,120 @@
+from typing import Literal, Optional
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
+    # Storage Settings
+    STORAGE_BACKEND: Literal["minio", "local", "memory"] = "minio"
+    LOCAL_STORAGE_PATH: str = "data"
+    LOCAL_TEMPLATES_PATH: Optional[str] = "app/templates"
+    # HMAC key for /files links of the local/memory backends (random per process if unset)
+    STORAGE_SIGNING_KEY: Optional[str] = None
+    PUBLIC_BASE_URL: str = ""
+
     MINIO_ENDPOINT: str
     MINIO_ACCESS_KEY: str
     MINIO_SECRET_KEY: str
     MINIO_BUCKET: str = "nda"
     MINIO_SECURE: bool = False
+    MINIO_REGION: str = "us-east-1"
+    # Host used in presigned URLs handed to clients (defaults to MINIO_ENDPOINT)
+    MINIO_PUBLIC_ENDPOINT: Optional[str] = None
+    MINIO_PUBLIC_SECURE: Optional[bool] = None
+    # Pool size should cover STORAGE_WORKERS + RENDER_WORKERS
+    MINIO_POOL_SIZE: int = 32
+    MINIO_CONNECT_TIMEOUT_SECONDS: float = 5
+    MINIO_READ_TIMEOUT_SECONDS: float = 60
+    MINIO_RETRIES: int = 3
+    MINIO_RETRY_BACKOFF_SECONDS: float = 0.2
+    MINIO_RETRY_JITTER_SECONDS: float = 0.2
+    MINIO_TCP_KEEPALIVE: bool = True
     MAX_FILE_SIZE_MB: int = 10
     ALLOWED_FILE_EXTENSIONS: str = "pdf,doc,docx,zip"
+    # Signed uploads: ZIP/DOCX central directory is verified from this many trailing bytes
+    SIGNED_ZIP_MAX_DIRECTORY_BYTES: int = 1024 * 1024
+    SIGNED_ZIP_MAX_UNCOMPRESSED_MB: int = 200
     PRESIGNED_URL_EXPIRY_SECONDS: int = 900
+    # S3 multipart minimum is 5 MB
+    UPLOAD_PART_SIZE_MB: int = 5
+    # How /nda/generate returns the document: inline bytes, presigned URL or 303 redirect
+    NDA_DELIVERY_MODE: Literal["inline", "url", "redirect"] = "inline"
+    BATCH_MAX_ITEMS: int = 100
+    BATCH_CONCURRENCY: int = 4
+
+    # Startup Settings
+    WARMUP_ON_STARTUP: bool = True
+    STARTUP_STORAGE_TIMEOUT_SECONDS: int = 60
+
+    # Metrics Settings (/metrics in Prometheus text format). false turns off the HTTP
+    # middleware, stage and storage timers and the /metrics endpoint
+    METRICS_ENABLED: bool = True
+
+    # Profiling Settings: X-Profile: 1 + X-Admin-Token profiles one request,
+    # PROFILE_SAMPLE_RATE profiles a random share of requests (0 disables)
+    ADMIN_TOKEN: Optional[str] = None
+    PROFILE_SAMPLE_RATE: float = 0
+    PROFILE_DIR: str = "data/profiles"
+    PROFILE_MAX_FILES: int = 200
+
+    # NDA Index Settings (SQLite index behind GET /nda, rebuilt by scripts/rebuild_index.py)
+    NDA_INDEX_ENABLED: bool = True
+    NDA_INDEX_PATH: str = "data/nda_index.sqlite3"
+
+    # PDF Conversion Settings (DOCX -> PDF in the background with headless LibreOffice;
+    # GET /nda/{id}/pdf/{type} reports the status and returns a link to the PDF)
+    PDF_CONVERSION_ENABLED: bool = False
+    PDF_CONVERTER_BINARY: str = "soffice"
+    PDF_CONVERSION_WORKERS: int = 2
+    PDF_CONVERSION_TIMEOUT_SECONDS: int = 120
+    PDF_CONVERSION_MAX_ATTEMPTS: int = 3
+    PDF_CONVERSION_RETRY_BASE_SECONDS: int = 30
+    PDF_CONVERSION_QUEUE_PATH: str = "data/pdf_jobs.sqlite3"
+    PDF_CONVERSION_PROFILE_DIR: str = "data/soffice"
+    PDF_CACHE_TTL_SECONDS: int = 30 * 86400
+
+    # Maintenance Settings (cleanup of stale drafts, archival of old NDAs;
+    # MAINTENANCE_INTERVAL_SECONDS=0 disables the background job, scripts/maintenance.py runs it once)
+    MAINTENANCE_INTERVAL_SECONDS: int = 0
+    MAINTENANCE_LOCK_PATH: str = "data/maintenance.lock"
+    MAINTENANCE_DRAFT_TTL_DAYS: int = 30
+    MAINTENANCE_EXPIRE_STATUSES: str = "draft,generated"
+    MAINTENANCE_ARCHIVE_AFTER_DAYS: int = 180
+    MAINTENANCE_ARCHIVE_MODE: Literal["tarball", "prefix"] = "tarball"
+    MAINTENANCE_OPS_PER_SECOND: float = 20
+    MAINTENANCE_LIST_CONCURRENCY: int = 4
+    MAINTENANCE_DELETE_BATCH: int = 500
+
+    # Template Cache Settings
+    TEMPLATE_CACHE_SIZE: int = 4
+    TEMPLATE_CACHE_REVALIDATE_SECONDS: int = 30
+
+    # DOCX Rendering Settings
+    DOCX_RENDER_ENGINE: Literal["python-docx", "ooxml"] = "python-docx"
+
+    # Generated Document Cache Settings
+    GENERATION_CACHE_SIZE: int = 16
+    GENERATION_CACHE_TTL_SECONDS: int = 3600
+    GENERATION_CACHE_STORAGE: bool = True
+
+    # Genitive Inflection Cache Settings
+    GENITIVE_CACHE_SIZE: int = 10000
+    GENITIVE_CACHE_FILE: Optional[str] = None
+
+    # Metadata Cache Settings (0 disables the cache)
+    METADATA_CACHE_SIZE: int = 1024
+    METADATA_CACHE_TTL_SECONDS: int = 30
+    METADATA_UPDATE_RETRIES: int = 5
+
+    # Concurrency Settings
+    STORAGE_WORKERS: int = 16
+    STORAGE_QUEUE_SIZE: int = 64
+    RENDER_WORKERS: int = 2
+    RENDER_QUEUE_SIZE: int = 16
+    # "process" renders in a pool of RENDER_PROCESSES worker processes;
+    # keep RENDER_WORKERS >= RENDER_PROCESSES so every process gets work
+    RENDER_BACKEND: Literal["thread", "process"] = "thread"
+    RENDER_PROCESSES: int = 2
+    BACKPRESSURE_RETRY_AFTER_SECONDS: int = 1
 
     # Mail Settings
     MAIL_USERNAME: str
@@ -23,6 +128,34 @@ class Settings(BaseSettings):
     VALIDATE_CERTS: bool = True
     ADMIN_EMAIL: str # Recipient for lead emails
 
+    # Lead Mail Queue Settings
+    LEAD_SPOOL_PATH: str = "data/lead_spool.sqlite3"
+    LEAD_MAIL_POOL_SIZE: int = 2
+    LEAD_MAIL_IDLE_TIMEOUT_SECONDS: int = 60
+    LEAD_MAIL_TIMEOUT_SECONDS: int = 30
+    LEAD_MAIL_POLL_SECONDS: float = 5
+    LEAD_MAIL_BATCH_SIZE: int = 50
+    LEAD_MAIL_MAX_ATTEMPTS: int = 10
+    LEAD_MAIL_RETRY_BASE_SECONDS: float = 5
+    LEAD_MAIL_RETRY_MAX_SECONDS: float = 900
+    # Bursts of LEAD_DIGEST_THRESHOLD+ queued leads go out as one email per interval (0 disables)
+    LEAD_DIGEST_INTERVAL_SECONDS: int = 0
+    LEAD_DIGEST_THRESHOLD: int = 5
+
+    # Lead Spam Protection Settings
+    # sqlite shares buckets and duplicate hashes between workers via LEAD_RATE_LIMIT_PATH
+    LEAD_RATE_LIMIT_BACKEND: Literal["memory", "sqlite"] = "memory"
+    LEAD_RATE_LIMIT_PATH: str = "data/lead_limits.sqlite3"
+    LEAD_RATE_LIMIT_MAX_KEYS: int = 10000
+    LEAD_IP_RATE_PER_MINUTE: float = 2
+    LEAD_IP_BURST: int = 5
+    LEAD_EMAIL_RATE_PER_HOUR: float = 3
+    LEAD_EMAIL_BURST: int = 3
+    LEAD_DUPLICATE_WINDOW_SECONDS: int = 3600
+    LEAD_MAX_LINKS: int = 2
+    # Take the client IP from X-Forwarded-For (only behind a trusted reverse proxy)
+    LEAD_TRUST_FORWARDED_FOR: bool = False
+
     class Config:
         env_file = ".env"
         case_sensitive = True
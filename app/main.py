@@ -1,11 +1,69 @@
-from fastapi import FastAPI
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import nda, leads
+from fastapi.responses import JSONResponse, PlainTextResponse
+import app as app_package
+from app.config import settings
+from app.routers import admin, files, nda, leads
+from app.services.docx_generator import docx_generator
+from app.services.executors import ExecutorSaturated, render_executor, storage_executor
+from app.services.generation_cache import generation_cache
+from app.services.lead_guard import LeadRejected, lead_guard
+from app.services.lead_mailer import lead_mailer
+from app.services.maintenance import maintenance_job
+from app.services.metrics import Gauge, MetricsMiddleware, registry
+from app.services.nda_index import nda_index
+from app.services.pdf_converter import pdf_conversion
+from app.services.profiler import ProfilingMiddleware
+from app.services.render_pool import ProcessRenderPool, renderer
+from app.services.storage import MetadataConflict, storage
+from app.services.upload_limit import UploadSizeLimitMiddleware
+from app.services.warmup import retry_until, warmup
+
+logging.basicConfig(level=logging.INFO)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup.timings["imports"] = round((time.perf_counter() - app_package.started_at) * 1000, 1)
+    warmup.add_step(
+        "storage",
+        lambda: retry_until(storage.ensure_ready, settings.STARTUP_STORAGE_TIMEOUT_SECONDS)
+    )
+    if settings.WARMUP_ON_STARTUP:
+        warmup.add_step("morph_analyzer", docx_generator.genitive.warm_up)
+        warmup.add_step("templates", docx_generator.warm_up_templates)
+    if isinstance(renderer, ProcessRenderPool):
+        warmup.add_step("render_pool", renderer.start)
+
+    warmup_task = asyncio.create_task(asyncio.to_thread(warmup.run))
+    lead_mailer.start()
+    maintenance_job.start()
+    if pdf_conversion is not None:
+        pdf_conversion.start()
+
+    yield
+
+    await asyncio.to_thread(maintenance_job.stop)
+    if pdf_conversion is not None:
+        pdf_conversion.stop()
+    storage_executor.shutdown()
+    render_executor.shutdown()
+    if isinstance(renderer, ProcessRenderPool):
+        renderer.shutdown()
+    docx_generator.genitive.save()
+    warmup_task.cancel()
+    await lead_mailer.stop()
+
 
 app = FastAPI(
     title="NDA Backend Service",
     description="Микросервис для управления NDA документами с использованием MinIO",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -16,8 +74,50 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(UploadSizeLimitMiddleware)
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+registry.register(Gauge(
+    "executor_active_tasks", "Tasks running in bounded executors", ("executor",),
+    collect=lambda: {(e.name,): e.active for e in (storage_executor, render_executor)}
+))
+registry.register(Gauge(
+    "executor_queued_tasks", "Tasks waiting in bounded executors", ("executor",),
+    collect=lambda: {(e.name,): e.stats()["queued"] for e in (storage_executor, render_executor)}
+))
+
 app.include_router(nda.router)
 app.include_router(leads.router)
+app.include_router(files.router)
+app.include_router(admin.router)
+
+
+@app.exception_handler(ExecutorSaturated)
+async def executor_saturated_handler(request: Request, exc: ExecutorSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
+@app.exception_handler(MetadataConflict)
+async def metadata_conflict_handler(request: Request, exc: MetadataConflict):
+    return JSONResponse(
+        status_code=409,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(settings.BACKPRESSURE_RETRY_AFTER_SECONDS)}
+    )
+
+
+@app.exception_handler(LeadRejected)
+async def lead_rejected_handler(request: Request, exc: LeadRejected):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
 
 
 @app.get("/")
@@ -32,3 +132,40 @@ async def root():
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
+
+
+@app.get("/ready")
+async def readiness_check():
+    if not warmup.ready:
+        return JSONResponse(status_code=503, content={"status": "starting", **warmup.status()})
+    # Пул процессов мог сломаться после прогрева: проверяем, что воркер отвечает
+    if isinstance(renderer, ProcessRenderPool) and not await asyncio.to_thread(renderer.is_healthy):
+        return JSONResponse(status_code=503, content={"status": "render_pool_unhealthy", **warmup.status()})
+    return JSONResponse(status_code=200, content={"status": "ready", **warmup.status()})
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    if not settings.METRICS_ENABLED:
+        return JSONResponse(status_code=404, content={"detail": "Metrics are disabled"})
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/stats")
+async def stats():
+    return {
+        "template_cache": docx_generator.template_cache.stats(),
+        "genitive_cache": docx_generator.genitive.stats(),
+        "generation_cache": generation_cache.stats(),
+        "lead_mail": lead_mailer.stats(),
+        "lead_guard": lead_guard.stats(),
+        "storage": storage.stats(),
+        "nda_index": nda_index.stats() if nda_index is not None else None,
+        "maintenance": maintenance_job.stats(),
+        "pdf_conversion": pdf_conversion.stats() if pdf_conversion is not None else None,
+        "executors": {
+            "storage": storage_executor.stats(),
+            "render": render_executor.stats()
+        },
+        "render_pool": renderer.stats() if isinstance(renderer, ProcessRenderPool) else None
+    }
@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Literal, Optional
 from datetime import datetime
 from pydantic import BaseModel, EmailStr, Field
 from uuid import UUID, uuid4
@@ -18,6 +18,30 @@ class NDAType(str, Enum):
     RU_EN = "ru_en"
 
 
+class DeliveryMode(str, Enum):
+    INLINE = "inline"
+    URL = "url"
+    REDIRECT = "redirect"
+
+
+class NDAFileType(str, Enum):
+    ENG = "eng"
+    RU_EN = "ru_en"
+    SIGNED = "signed"
+
+
+class PDFStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class BatchFormat(str, Enum):
+    ZIP = "zip"
+    NDJSON = "ndjson"
+
+
 class NDAStatus(str, Enum):
     DRAFT = "draft"
     GENERATED = "generated"
@@ -50,12 +74,57 @@ class FieldsRuEn(BaseModel):
     address_ru: str
     email: EmailStr
 
+    def to_eng(self) -> FieldsENG:
+        """Поля ENG NDA из английской части билингвальной формы"""
+        return FieldsENG(
+            effective_date=self.effective_date,
+            company_name=self.company_name_en,
+            country=self.country_en,
+            registration_number=self.registration_number,
+            signatory_name=self.signatory_name_en,
+            signatory_title=self.signatory_title_en,
+            address=self.address_en,
+            email=self.email
+        )
+
 
 class NDACreateRequest(BaseModel):
     type: NDAType
     fields: Dict
 
 
+class NDABundleRequest(BaseModel):
+    fields: FieldsRuEn
+
+
+class NDABatchRequest(BaseModel):
+    items: List[NDACreateRequest] = Field(..., min_length=1)
+
+
+class NDABatchItemResult(BaseModel):
+    index: int
+    type: NDAType
+    status: Literal["ok", "error"]
+    nda_id: Optional[UUID] = None
+    file: Optional[str] = None
+    presigned_url: Optional[str] = None
+    expires_in_seconds: Optional[int] = None
+    error: Optional[str] = None
+
+
+class SignedFile(BaseModel):
+    path: str
+    sha256: Optional[str] = None
+    size: Optional[int] = None
+    content_type: Optional[str] = None
+    uploaded_at: Optional[datetime] = None
+
+    @classmethod
+    def parse(cls, entry: Any) -> "SignedFile":
+        """Записи files["signed"] до проверки загрузок - просто пути к объектам"""
+        return cls(path=entry) if isinstance(entry, str) else cls.model_validate(entry)
+
+
 class NDAMetadata(BaseModel):
     nda_id: UUID = Field(default_factory=uuid4)
     type: NDAType
@@ -63,6 +132,10 @@ class NDAMetadata(BaseModel):
     created_at: datetime = Field(default_factory=datetime.utcnow)
     fields: Dict
     files: Dict[str, Any] = Field(default_factory=lambda: {"generated": {}, "signed": []})
+    generation_keys: Dict[str, str] = Field(default_factory=dict)
+
+    def signed_files(self) -> List[SignedFile]:
+        return [SignedFile.parse(entry) for entry in self.files.get("signed") or []]
 
 
 class NDAResponse(BaseModel):
@@ -72,12 +145,39 @@ class NDAResponse(BaseModel):
     created_at: datetime
 
 
+class NDAListItem(NDAResponse):
+    company: Optional[str] = None
+
+
+class NDAListResponse(BaseModel):
+    items: List[NDAListItem]
+    next_cursor: Optional[str] = None
+
+
 class NDADownloadResponse(BaseModel):
+    nda_id: Optional[UUID] = None
     presigned_url: str
     expires_in_seconds: int
 
 
+class NDAPdfStatusResponse(BaseModel):
+    nda_id: UUID
+    type: NDAType
+    status: PDFStatus
+    error: Optional[str] = None
+    presigned_url: Optional[str] = None
+    expires_in_seconds: Optional[int] = None
+
+
+class NDABundleResponse(BaseModel):
+    nda_id: UUID
+    files: Dict[NDAType, NDADownloadResponse]
+
+
 class NDAUploadResponse(BaseModel):
     nda_id: UUID
     status: NDAStatus
     message: str
+    sha256: Optional[str] = None
+    content_type: Optional[str] = None
+    duplicate: bool = False
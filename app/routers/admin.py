@@ -0,0 +1,47 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import FileResponse, PlainTextResponse
+from app.services.profiler import admin_token_valid, profile_store
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    if not admin_token_valid(x_admin_token):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin token required"
+        )
+
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/profiles")
+async def list_profiles():
+    """Сохранённые профили запросов, новые первыми"""
+    return {"profiles": profile_store.list()}
+
+
+@router.get("/profiles/{name}")
+async def download_profile(
+    name: str,
+    format: str = Query("prof", pattern="^(prof|text)$"),
+    sort: str = Query("cumulative", pattern="^(cumulative|tottime|calls)$"),
+    limit: int = Query(50, ge=1, le=1000)
+):
+    """
+    Профиль запроса: .prof для pstats/snakeviz (format=prof)
+    или текстовая сводка по самым тяжёлым функциям (format=text).
+    """
+    try:
+        path = profile_store.path(name)
+        if not path.is_file():
+            raise FileNotFoundError(name)
+        if format == "text":
+            return PlainTextResponse(profile_store.summary(name, sort, limit))
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+
+    return FileResponse(path, media_type="application/octet-stream", filename=name)
@@ -0,0 +1,43 @@
+from fastapi import APIRouter, HTTPException, Query, status
+from fastapi.responses import FileResponse, Response
+from app.services.storage import SignedURLStorage, async_storage, storage
+
+router = APIRouter(prefix="/files", tags=["Files"])
+
+
+@router.get("/{object_path:path}")
+async def serve_file(
+    object_path: str,
+    expires: int = Query(...),
+    signature: str = Query(...),
+    filename: str = Query("")
+):
+    """
+    Отдаёт объект локального хранилища по подписанной ссылке.
+    Ссылки выдаёт get_presigned_url, когда STORAGE_BACKEND=local или memory.
+    """
+    if not isinstance(storage, SignedURLStorage) or not storage.verify_url(
+        object_path, expires, filename, signature
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Link is invalid or expired"
+        )
+
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'} if filename else {}
+
+    try:
+        path = storage.file_path(object_path)
+        if path is not None:
+            if not path.is_file():
+                raise FileNotFoundError(object_path)
+            return FileResponse(path, media_type="application/octet-stream", headers=headers)
+
+        data = await async_storage.get_object(object_path)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found"
+        )
+
+    return Response(content=data, media_type="application/octet-stream", headers=headers)
@@ -1,23 +1,155 @@
-﻿from datetime import datetime
-from uuid import UUID
-from fastapi import APIRouter, HTTPException, UploadFile, File, Query, status
-from typing import Optional
-from fastapi.responses import Response
+﻿from datetime import date, datetime
+import asyncio
+import json
+from io import BytesIO
+import zipfile
+from uuid import UUID, uuid4
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, status
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Tuple, Union
+from fastapi.responses import JSONResponse, RedirectResponse, Response, StreamingResponse
 from app.models import (
-    NDACreateRequest, NDAUploadResponse, NDAMetadata, NDAStatus, NDAType
+    BatchFormat, DeliveryMode, NDABatchItemResult, NDABatchRequest, NDABundleRequest,
+    NDABundleResponse, NDACreateRequest, NDADownloadResponse, NDAFileType, NDAListResponse,
+    NDAPdfStatusResponse, NDAUploadResponse, NDAMetadata, NDAStatus, NDAType, PDFStatus, SignedFile
 )
-from app.services.minio_service import minio_service
+from app.routers.admin import require_admin
 from app.services.docx_generator import docx_generator
+from app.services.executors import ExecutorSaturated, render_executor, storage_executor
+from app.services.generation_cache import generation_cache
+from app.services.metrics import stage
+from app.services.nda_index import nda_index
+from app.services.pdf_converter import pdf_conversion
+from app.services.render_pool import renderer
+from app.services.storage import MetadataConflict, async_storage, storage
+from app.services.streams import ChunkSink, LimitedReader, UploadTooLarge, iter_chunks
+from app.services.upload_verification import UploadRejected, VerifyingReader
 from app.config import settings
 
 
 router = APIRouter(prefix="/nda", tags=["NDA"])
 
 
+def _presigned_response(nda_id: UUID, object_path: str, mode: DeliveryMode) -> Response:
+    """Ссылка на объект в хранилище вместо передачи байтов через API (JSON или 303 redirect)"""
+    expiry = settings.PRESIGNED_URL_EXPIRY_SECONDS
+    # Подпись вычисляется локально, без обращения к хранилищу
+    url = storage.get_presigned_url(
+        object_path, expiry, filename=object_path.rsplit("/", 1)[-1]
+    )
+    headers = {
+        "X-NDA-ID": str(nda_id),
+        "Access-Control-Expose-Headers": "X-NDA-ID"
+    }
+    
+    if mode == DeliveryMode.REDIRECT:
+        return RedirectResponse(url, status_code=status.HTTP_303_SEE_OTHER, headers=headers)
+    
+    body = NDADownloadResponse(nda_id=nda_id, presigned_url=url, expires_in_seconds=expiry)
+    return JSONResponse(content=body.model_dump(mode="json"), headers=headers)
+
+
+def _attachment_response(data: bytes, media_type: str, filename: str,
+                         headers: Dict[str, str]) -> StreamingResponse:
+    """
+    Отдаёт документ частями из того же объекта bytes, что ушёл в хранилище и кэш,
+    без дополнительной копии тела. Content-Length известен заранее.
+    """
+    return StreamingResponse(
+        iter_chunks(data),
+        media_type=media_type,
+        headers={
+            **headers,
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "Content-Length": str(len(data)),
+        }
+    )
+
+
+async def _produce_document(nda_id: UUID, nda_type: NDAType, fields: Dict) -> Tuple[str, bytes, bool]:
+    """Ключ кэша генерации, DOCX и признак того, что он был отрендерен, а не взят из кэша"""
+    with stage("cache_lookup"):
+        cache_key = await storage_executor.run(docx_generator.cache_key, nda_type, fields)
+        docx_bytes = await storage_executor.run(generation_cache.get, cache_key)
+    if docx_bytes is not None:
+        return cache_key, docx_bytes, False
+    
+    # Включает ожидание в очереди render_executor и, для process-пула, передачу в воркер
+    with stage("render"):
+        docx_bytes = await render_executor.run(
+            renderer.generate,
+            nda_id=nda_id,
+            nda_type=nda_type,
+            fields=fields
+        )
+    return cache_key, docx_bytes, True
+
+
+async def _generate_and_store(metadata: NDAMetadata, documents: List[Tuple[NDAType, Dict]],
+                              existing: bool) -> Tuple[NDAMetadata, List[bytes]]:
+    """
+    Рендерит документы параллельно (или берёт из кэша генерации), сохраняет их
+    и обновляет meta.json одной записью.
+    """
+    produced = await asyncio.gather(*(
+        _produce_document(metadata.nda_id, nda_type, fields) for nda_type, fields in documents
+    ))
+    
+    generated = metadata.files.get("generated", {})
+    to_store = []
+    for (nda_type, _), (cache_key, docx_bytes, _) in zip(documents, produced):
+        type_key = str(nda_type.value)
+        # Тот же документ уже лежит в папке NDA: не загружаем его и не переписываем meta.json
+        if metadata.generation_keys.get(type_key) != cache_key or type_key not in generated:
+            to_store.append((nda_type, cache_key, docx_bytes))
+    
+    if to_store:
+        with stage("upload"):
+            paths = await asyncio.gather(*(
+                async_storage.save_generated_docx_by_type(metadata.nda_id, docx_bytes, nda_type)
+                for nda_type, _, docx_bytes in to_store
+            ))
+        
+        def record_generated(meta: NDAMetadata) -> None:
+            meta.status = NDAStatus.GENERATED
+            for (nda_type, cache_key, _), docx_path in zip(to_store, paths):
+                meta.files.setdefault("generated", {})[str(nda_type.value)] = docx_path
+                meta.generation_keys[str(nda_type.value)] = cache_key
+                # PDF прежней версии документа больше не актуален
+                meta.files.get("pdf", {}).pop(str(nda_type.value), None)
+        
+        with stage("metadata_write"):
+            if existing:
+                # eng и ru_en для одного NDA могут генерироваться параллельно
+                updated = await async_storage.update_metadata(metadata.nda_id, record_generated)
+                metadata = updated or metadata
+            else:
+                record_generated(metadata)
+                await async_storage.save_metadata(metadata)
+        
+        if pdf_conversion is not None:
+            await storage_executor.run(pdf_conversion.enqueue, [
+                (metadata.nda_id, nda_type, docx_path, cache_key)
+                for (nda_type, cache_key, _), docx_path in zip(to_store, paths)
+            ])
+    
+    for (nda_type, _), (cache_key, docx_bytes, rendered) in zip(documents, produced):
+        if rendered:
+            with stage("cache_store"):
+                await storage_executor.run(
+                    generation_cache.put, cache_key, docx_bytes,
+                    metadata.files["generated"][str(nda_type.value)]
+                )
+    
+    return metadata, [docx_bytes for _, docx_bytes, _ in produced]
+
+
 @router.post("/generate")
 async def generate_and_download_nda(
     request: NDACreateRequest,
-    nda_id: Optional[str] = Query(None, description="Existing NDA ID to reuse")
+    nda_id: Optional[str] = Query(None, description="Existing NDA ID to reuse"),
+    delivery: Optional[DeliveryMode] = Query(
+        None, description="inline (DOCX in body), url (presigned URL) or redirect (303)"
+    )
 ):
     """
     Генерирует NDA и возвращает DOCX файл.
@@ -29,14 +161,18 @@ async def generate_and_download_nda(
     2. Нажатие "Download ENG NDA" -> POST /nda/generate?nda_id={saved_id} (type=eng)
        Используется тот же NDA ID, оба документа в одной папке
     
+    Оба документа за один запрос - POST /nda/generate/bundle.
+    
     Возвращает:
-    - DOCX файл для скачивания
+    - DOCX файл для скачивания (delivery=inline, по умолчанию NDA_DELIVERY_MODE)
+      или presigned URL (delivery=url) / 303 redirect на него (delivery=redirect)
     - X-NDA-ID в заголовке
     """
     if nda_id:
         try:
             nda_uuid = UUID(nda_id)
-            metadata = minio_service.get_metadata(nda_uuid)
+            with stage("metadata_fetch"):
+                metadata = await async_storage.get_metadata(nda_uuid)
             
             if not metadata:
                 raise HTTPException(
@@ -56,35 +192,86 @@ async def generate_and_download_nda(
         )
     
     try:
-        docx_bytes = docx_generator.generate(
-            nda_id=metadata.nda_id,
-            nda_type=request.type,
-            fields=request.fields
+        metadata, (docx_bytes,) = await _generate_and_store(
+            metadata, [(request.type, request.fields)], existing=bool(nda_id)
         )
+        type_key = str(request.type.value)
         
-        docx_path = minio_service.save_generated_docx_by_type(
-            metadata.nda_id, 
-            docx_bytes, 
-            request.type
-        )
-        
-        metadata.status = NDAStatus.GENERATED
-        if "generated" not in metadata.files:
-            metadata.files["generated"] = {}
-        metadata.files["generated"][str(request.type.value)] = docx_path
-        minio_service.save_metadata(metadata)
+        mode = delivery or DeliveryMode(settings.NDA_DELIVERY_MODE)
+        if mode != DeliveryMode.INLINE:
+            return _presigned_response(
+                metadata.nda_id, metadata.files["generated"][type_key], mode
+            )
         
         filename = f"NDA_{request.type}_{metadata.nda_id}.docx"
         
-        return Response(
-            content=docx_bytes,
-            media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            headers={
-                "Content-Disposition": f'attachment; filename="{filename}"',
+        return _attachment_response(
+            docx_bytes,
+            "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            filename,
+            {
                 "X-NDA-ID": str(metadata.nda_id),
                 "Access-Control-Expose-Headers": "X-NDA-ID"
             }
         )
+    except (ExecutorSaturated, MetadataConflict):
+        raise
+    except FileNotFoundError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to generate NDA: {str(e)}"
+        )
+
+
+@router.post("/generate/bundle")
+async def generate_nda_bundle(
+    request: NDABundleRequest,
+    nda_id: Optional[UUID] = Query(None, description="Existing NDA ID to reuse"),
+    delivery: Optional[DeliveryMode] = Query(
+        None, description="inline (ZIP with both documents) or url (presigned URLs)"
+    )
+):
+    """
+    Генерирует ENG и RU_EN документы одного NDA за один запрос.
+    
+    Поля ENG берутся из английской части билингвальной формы. Документы
+    рендерятся параллельно, meta.json записывается один раз.
+    
+    Возвращает:
+    - ZIP с обоими DOCX (delivery=inline, по умолчанию NDA_DELIVERY_MODE)
+      или JSON с presigned URL на каждый документ (delivery=url или redirect)
+    - X-NDA-ID в заголовке
+    """
+    ru_en_fields = request.fields.model_dump(mode="json")
+    eng_fields = request.fields.to_eng().model_dump(mode="json")
+    
+    if nda_id:
+        metadata = await async_storage.get_metadata(nda_id)
+        if not metadata:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"NDA with id {nda_id} not found"
+            )
+    else:
+        metadata = NDAMetadata(
+            type=NDAType.RU_EN,
+            status=NDAStatus.DRAFT,
+            fields=ru_en_fields
+        )
+    
+    try:
+        metadata, documents = await _generate_and_store(
+            metadata,
+            [(NDAType.ENG, eng_fields), (NDAType.RU_EN, ru_en_fields)],
+            existing=bool(nda_id)
+        )
+    except (ExecutorSaturated, MetadataConflict):
+        raise
     except FileNotFoundError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -95,6 +282,260 @@ async def generate_and_download_nda(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to generate NDA: {str(e)}"
         )
+    
+    headers = {
+        "X-NDA-ID": str(metadata.nda_id),
+        "Access-Control-Expose-Headers": "X-NDA-ID"
+    }
+    
+    mode = delivery or DeliveryMode(settings.NDA_DELIVERY_MODE)
+    if mode != DeliveryMode.INLINE:
+        expiry = settings.PRESIGNED_URL_EXPIRY_SECONDS
+        files = {}
+        for nda_type in (NDAType.ENG, NDAType.RU_EN):
+            object_path = metadata.files["generated"][nda_type.value]
+            files[nda_type] = NDADownloadResponse(
+                nda_id=metadata.nda_id,
+                presigned_url=storage.get_presigned_url(
+                    object_path, expiry, filename=object_path.rsplit("/", 1)[-1]
+                ),
+                expires_in_seconds=expiry
+            )
+        body = NDABundleResponse(nda_id=metadata.nda_id, files=files)
+        return JSONResponse(content=body.model_dump(mode="json"), headers=headers)
+    
+    archive_buffer = BytesIO()
+    with zipfile.ZipFile(archive_buffer, "w", compression=zipfile.ZIP_STORED) as archive:
+        for nda_type, docx_bytes in zip((NDAType.ENG, NDAType.RU_EN), documents):
+            archive.writestr(f"NDA_{nda_type.value}_{metadata.nda_id}.docx", docx_bytes)
+    
+    return _attachment_response(
+        archive_buffer.getvalue(), "application/zip", f"NDA_{metadata.nda_id}.zip", headers
+    )
+
+
+class _BatchResult(NamedTuple):
+    index: int
+    request: NDACreateRequest
+    metadata: Optional[NDAMetadata]
+    docx_bytes: Optional[bytes]
+    error: Optional[str]
+
+
+async def _generate_batch(items: List[NDACreateRequest]) -> AsyncIterator[_BatchResult]:
+    """Генерирует элементы пакета параллельно (до BATCH_CONCURRENCY) и отдаёт их по готовности"""
+    semaphore = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+    
+    async def generate_item(index: int, item: NDACreateRequest) -> _BatchResult:
+        async with semaphore:
+            metadata = NDAMetadata(type=item.type, status=NDAStatus.DRAFT, fields=item.fields)
+            try:
+                metadata, (docx_bytes,) = await _generate_and_store(
+                    metadata, [(item.type, item.fields)], existing=False
+                )
+                return _BatchResult(index, item, metadata, docx_bytes, None)
+            except Exception as e:
+                return _BatchResult(index, item, None, None, str(e) or type(e).__name__)
+    
+    tasks = [asyncio.create_task(generate_item(i, item)) for i, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Клиент отключился - не рендерим оставшиеся элементы впустую
+        for task in tasks:
+            task.cancel()
+
+
+def _batch_item(result: _BatchResult, with_url: bool) -> NDABatchItemResult:
+    if result.error is not None:
+        return NDABatchItemResult(
+            index=result.index, type=result.request.type, status="error", error=result.error
+        )
+    
+    type_key = str(result.request.type.value)
+    item = NDABatchItemResult(
+        index=result.index,
+        type=result.request.type,
+        status="ok",
+        nda_id=result.metadata.nda_id,
+        file=f"NDA_{type_key}_{result.metadata.nda_id}.docx"
+    )
+    if with_url:
+        item.expires_in_seconds = settings.PRESIGNED_URL_EXPIRY_SECONDS
+        item.presigned_url = storage.get_presigned_url(
+            result.metadata.files["generated"][type_key], item.expires_in_seconds, filename=item.file
+        )
+    return item
+
+
+async def _batch_zip_stream(results: AsyncIterator[_BatchResult]) -> AsyncIterator[bytes]:
+    sink = ChunkSink()
+    manifest = []
+    # DOCX уже сжат, поэтому ZIP_STORED: без повторного сжатия
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED) as archive:
+        async for result in results:
+            item = _batch_item(result, with_url=False)
+            if result.error is None:
+                archive.writestr(item.file, result.docx_bytes)
+            manifest.append(item.model_dump(mode="json", exclude_none=True))
+            yield sink.drain()
+        
+        manifest.sort(key=lambda entry: entry["index"])
+        archive.writestr("manifest.json", json.dumps({"items": manifest}, indent=2))
+    yield sink.drain()
+
+
+async def _batch_ndjson_stream(results: AsyncIterator[_BatchResult]) -> AsyncIterator[bytes]:
+    async for result in results:
+        yield _batch_item(result, with_url=True).model_dump_json(exclude_none=True).encode() + b"\n"
+
+
+@router.post("/generate/batch")
+async def generate_nda_batch(
+    batch: NDABatchRequest,
+    format: BatchFormat = Query(BatchFormat.ZIP, description="zip (documents + manifest.json) or ndjson")
+):
+    """
+    Пакетная генерация NDA (например, при онбординге партнёров).
+    
+    Каждый элемент - отдельный NDA с новым ID. Документы рендерятся параллельно
+    (не больше BATCH_CONCURRENCY одновременно) и отдаются по мере готовности:
+    - format=zip: архив с DOCX файлами и manifest.json в конце
+    - format=ndjson: по строке на элемент с nda_id и presigned URL
+    
+    Ошибка одного элемента не прерывает пакет: она попадает в manifest / строку
+    NDJSON со status=error.
+    """
+    if len(batch.items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Batch size exceeds maximum of {settings.BATCH_MAX_ITEMS} items"
+        )
+    
+    results = _generate_batch(batch.items)
+    
+    if format == BatchFormat.NDJSON:
+        return StreamingResponse(_batch_ndjson_stream(results), media_type="application/x-ndjson")
+    
+    return StreamingResponse(
+        _batch_zip_stream(results),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="NDA_batch.zip"'}
+    )
+
+
+@router.get("", response_model=NDAListResponse, dependencies=[Depends(require_admin)])
+async def list_ndas(
+    nda_status: Optional[NDAStatus] = Query(None, alias="status"),
+    date_from: Optional[Union[datetime, date]] = Query(None, alias="from", description="created_at >= from"),
+    date_to: Optional[Union[datetime, date]] = Query(
+        None, alias="to", description="created_at < to (a plain date includes the whole day)"
+    ),
+    company: Optional[str] = Query(None, min_length=2, description="Substring of company name"),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page")
+):
+    """
+    Список NDA из индекса, новые первыми (требуется X-Admin-Token).
+    Например, все NDA, ожидающие проверки: GET /nda?status=signed_uploaded
+    """
+    if nda_index is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="NDA index is disabled"
+        )
+    
+    try:
+        items, next_cursor = await storage_executor.run(
+            nda_index.query, nda_status, date_from, date_to, company, limit, cursor
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    
+    return NDAListResponse(items=items, next_cursor=next_cursor)
+
+
+@router.get("/{nda_id}/download/{file_type}")
+async def download_nda_file(
+    nda_id: UUID,
+    file_type: NDAFileType,
+    redirect: bool = Query(False, description="Return 303 redirect instead of JSON")
+):
+    """
+    Выдаёт свежий presigned URL на сгенерированный (eng / ru_en) или
+    последний загруженный подписанный (signed) файл NDA.
+    """
+    metadata = await async_storage.get_metadata(nda_id)
+    
+    if not metadata:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"NDA with id {nda_id} not found"
+        )
+    
+    if file_type == NDAFileType.SIGNED:
+        signed = metadata.signed_files()
+        object_path = signed[-1].path if signed else None
+    else:
+        object_path = metadata.files.get("generated", {}).get(file_type.value)
+    
+    if not object_path:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No {file_type.value} file for NDA {nda_id}"
+        )
+    
+    mode = DeliveryMode.REDIRECT if redirect else DeliveryMode.URL
+    return _presigned_response(nda_id, object_path, mode)
+
+
+@router.get("/{nda_id}/pdf/{nda_type}", response_model=NDAPdfStatusResponse)
+async def get_nda_pdf(nda_id: UUID, nda_type: NDAType):
+    """
+    Статус конвертации сгенерированного документа в PDF.
+    
+    PDF готовится в фоне после /nda/generate; опрашивайте, пока status не станет
+    done (в ответе будет presigned URL) или failed. Пока задача в очереди,
+    заголовок Retry-After подсказывает интервал опроса.
+    """
+    if pdf_conversion is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="PDF conversion is disabled"
+        )
+    
+    metadata = await async_storage.get_metadata(nda_id)
+    
+    if not metadata:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"NDA with id {nda_id} not found"
+        )
+    
+    if not metadata.files.get("generated", {}).get(nda_type.value):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No {nda_type.value} document generated for NDA {nda_id}"
+        )
+    
+    pdf_status, pdf_path, error = await storage_executor.run(
+        pdf_conversion.status, nda_id, nda_type, metadata
+    )
+    body = NDAPdfStatusResponse(nda_id=nda_id, type=nda_type, status=pdf_status, error=error)
+    headers = {}
+    if pdf_status == PDFStatus.DONE:
+        body.expires_in_seconds = settings.PRESIGNED_URL_EXPIRY_SECONDS
+        body.presigned_url = storage.get_presigned_url(
+            pdf_path, body.expires_in_seconds, filename=pdf_path.rsplit("/", 1)[-1]
+        )
+    elif pdf_status != PDFStatus.FAILED:
+        headers["Retry-After"] = "2"
+    
+    return JSONResponse(content=body.model_dump(mode="json", exclude_none=True), headers=headers)
 
 
 @router.post("/{nda_id}/upload-signed")
@@ -106,8 +547,12 @@ async def upload_signed_nda(nda_id: UUID, file: UploadFile = File(...)):
     Параметры:
     - nda_id: UUID полученный из заголовка X-NDA-ID при генерации
     - file: подписанный файл (PDF/DOC/DOCX/ZIP)
+    
+    Содержимое должно соответствовать расширению; ZIP и DOCX проверяются по
+    центральному каталогу. Повторная загрузка того же файла (по SHA-256)
+    не создаёт вторую копию и возвращает duplicate=true.
     """
-    metadata = minio_service.get_metadata(nda_id)
+    metadata = await async_storage.get_metadata(nda_id)
     
     if not metadata:
         raise HTTPException(
@@ -128,38 +573,88 @@ async def upload_signed_nda(nda_id: UUID, file: UploadFile = File(...)):
             detail=f"Invalid file extension. Allowed: {', '.join(settings.allowed_extensions)}"
         )
     
-    file_data = await file.read()
-    file_size = len(file_data)
+    too_large = HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File size exceeds maximum allowed size of {settings.MAX_FILE_SIZE_MB}MB"
+    )
     
-    if file_size > settings.max_file_size_bytes:
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"File size exceeds maximum allowed size of {settings.MAX_FILE_SIZE_MB}MB"
-        )
+    if file.size is not None and file.size > settings.max_file_size_bytes:
+        raise too_large
     
+    # Сигнатура проверяется до записи в хранилище, SHA-256 и конец файла - по пути
+    reader = VerifyingReader(LimitedReader(file.file, settings.max_file_size_bytes), file_ext)
     try:
+        await storage_executor.run(reader.prime)
+        
         timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-        signed_filename = f"NDA_SIGNED_{timestamp}.{file_ext}"
+        # Суффикс нужен, чтобы отклонённая или повторная загрузка в ту же секунду
+        # не перезаписала и затем не удалила предыдущий файл
+        signed_filename = f"NDA_SIGNED_{timestamp}_{uuid4().hex[:8]}.{file_ext}"
+        
+        signed_path = await async_storage.save_signed_stream(
+            nda_id, reader, signed_filename, reader.content_type
+        )
+        try:
+            with stage("upload_verify"):
+                verified = await storage_executor.run(reader.finish)
+        except UploadRejected:
+            await async_storage.delete_objects([signed_path])
+            raise
         
-        signed_path = minio_service.save_signed_file(nda_id, file_data, signed_filename)
+        signed = SignedFile(
+            path=signed_path,
+            sha256=verified.sha256,
+            size=verified.size,
+            content_type=verified.content_type,
+            uploaded_at=datetime.utcnow()
+        )
+        duplicate: Optional[SignedFile] = None
         
-        if "signed" not in metadata.files:
-            metadata.files["signed"] = []
-        metadata.files["signed"].append(signed_path)
-        metadata.status = NDAStatus.SIGNED_UPLOADED
+        def record_signed(meta: NDAMetadata) -> None:
+            nonlocal duplicate
+            duplicate = next((f for f in meta.signed_files() if f.sha256 == signed.sha256), None)
+            if duplicate is None:
+                meta.files.setdefault("signed", []).append(signed.model_dump(mode="json", exclude_none=True))
+                meta.status = NDAStatus.SIGNED_UPLOADED
         
-        minio_service.save_metadata(metadata)
+        updated = await async_storage.update_metadata(nda_id, record_signed)
+        
+        if duplicate is not None:
+            # Тот же файл уже загружен: вторая копия в хранилище не нужна
+            if duplicate.path != signed_path:
+                await async_storage.delete_objects([signed_path])
+            return NDAUploadResponse(
+                nda_id=nda_id,
+                status=updated.status if updated else metadata.status,
+                message="Signed NDA with identical content is already uploaded",
+                sha256=duplicate.sha256,
+                content_type=duplicate.content_type,
+                duplicate=True
+            )
         
         return NDAUploadResponse(
             nda_id=nda_id,
-            status=metadata.status,
-            message="Signed NDA uploaded successfully"
+            status=NDAStatus.SIGNED_UPLOADED,
+            message="Signed NDA uploaded successfully",
+            sha256=signed.sha256,
+            content_type=signed.content_type
         )
+    except UploadRejected as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except UploadTooLarge:
+        raise too_large
+    except (ExecutorSaturated, MetadataConflict):
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to upload signed NDA: {str(e)}"
         )
+    finally:
+        reader.close()
 
 
 @router.post("/{nda_id}/submit")
@@ -171,7 +666,7 @@ async def submit_nda(nda_id: UUID):
     Параметры:
     - nda_id: UUID полученный из заголовка X-NDA-ID при генерации
     """
-    metadata = minio_service.get_metadata(nda_id)
+    metadata = await async_storage.get_metadata(nda_id)
     
     if not metadata:
         raise HTTPException(
@@ -186,14 +681,18 @@ async def submit_nda(nda_id: UUID):
         )
     
     try:
-        metadata.status = NDAStatus.SUBMITTED
-        minio_service.save_metadata(metadata)
+        def mark_submitted(meta: NDAMetadata) -> None:
+            meta.status = NDAStatus.SUBMITTED
+        
+        await async_storage.update_metadata(nda_id, mark_submitted)
         
         return NDAUploadResponse(
             nda_id=nda_id,
-            status=metadata.status,
+            status=NDAStatus.SUBMITTED,
             message="NDA submitted successfully"
         )
+    except (ExecutorSaturated, MetadataConflict):
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -1,10 +1,18 @@
+import copy
+import hashlib
+import json
 from io import BytesIO
 from typing import Dict
 from uuid import UUID
 from docx import Document
 import pymorphy3
+from app.config import settings
 from app.models import NDAType, FieldsENG, FieldsRuEn
-from app.services.minio_service import minio_service
+from app.services.inflection import GenitiveInflector
+from app.services.metrics import stage
+from app.services.placeholder_plan import iter_paragraphs
+from app.services.storage import storage
+from app.services.template_cache import TemplateCache
 
 
 class DOCXGenerator:
@@ -40,7 +48,33 @@ class DOCXGenerator:
     }
 
     def __init__(self):
-        self.morph = pymorphy3.MorphAnalyzer()
+        self.genitive = GenitiveInflector(
+            maxsize=settings.GENITIVE_CACHE_SIZE,
+            cache_file=settings.GENITIVE_CACHE_FILE
+        )
+        self.template_cache = TemplateCache(
+            storage,
+            maxsize=settings.TEMPLATE_CACHE_SIZE,
+            revalidate_seconds=settings.TEMPLATE_CACHE_REVALIDATE_SECONDS
+        )
+
+    @property
+    def morph(self) -> pymorphy3.MorphAnalyzer:
+        return self.genitive.morph
+
+    def warm_up(self) -> None:
+        """Загружает словари и шаблоны и компилирует планы подстановки до первого запроса"""
+        self.genitive.warm_up()
+        self.warm_up_templates()
+
+    def warm_up_templates(self) -> None:
+        for nda_type, template_name in self.TEMPLATE_MAP.items():
+            template = self.template_cache.get(template_name)
+            field_mapping = self._get_field_mapping(nda_type)
+            if settings.DOCX_RENDER_ENGINE == "ooxml":
+                template.ooxml(field_mapping)
+            else:
+                template.plan(field_mapping)
 
     def _get_field_mapping(self, nda_type: NDAType) -> Dict[str, str]:
         if nda_type == NDAType.ENG:
@@ -51,45 +85,39 @@ class DOCXGenerator:
             raise ValueError(f"Unknown NDA type: {nda_type}")
 
     def _to_genitive(self, text: str) -> str:
-        if not text:
-            return text
-        
-        words = text.split()
-        inflected_words = []
-        
-        for word in words:
-            parses = self.morph.parse(word)
-            target_parse = None
-            
-            for p in parses:
-                if 'nomn' in p.tag:
-                    target_parse = p
-                    break
-            
-            if not target_parse:
-                target_parse = parses[0]
-            
-            inflected = target_parse.inflect({'gent'})
-            
-            if inflected:
-                result_word = inflected.word
-                if word.istitle():
-                    result_word = result_word.capitalize()
-                elif word.isupper():
-                    result_word = result_word.upper()
-                inflected_words.append(result_word)
-            else:
-                inflected_words.append(word)
-                
-        return " ".join(inflected_words)
+        return self.genitive.to_genitive(text)
 
-    def _replace_placeholders(self, doc: Document, fields: Dict, mapping: Dict[str, str]) -> None:
-        replacements = {
+    def cache_key(self, nda_type: NDAType, fields: Dict) -> str:
+        """
+        Ключ результата генерации: ETag шаблона, движок, тип и только те поля,
+        которые реально попадают в документ.
+        """
+        template = self.template_cache.get(self.TEMPLATE_MAP[nda_type])
+        field_mapping = self._get_field_mapping(nda_type)
+        used_fields = {
+            field_name: str(fields[field_name])
+            for field_name in field_mapping.values()
+            if field_name in fields and fields[field_name] is not None
+        }
+        payload = json.dumps(
+            [template.etag, settings.DOCX_RENDER_ENGINE, nda_type.value, used_fields],
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @staticmethod
+    def _build_replacements(fields: Dict, mapping: Dict[str, str]) -> Dict[str, str]:
+        return {
             f"[{placeholder}]": str(fields[field_name])
             for placeholder, field_name in mapping.items()
             if field_name in fields and fields[field_name] is not None
         }
 
+    def _replace_placeholders(self, doc: Document, fields: Dict, mapping: Dict[str, str]) -> None:
+        """Эталонный алгоритм подстановки; на горячем пути используется PlaceholderPlan"""
+        replacements = self._build_replacements(fields, mapping)
+
         def replace_in_paragraph(paragraph):
             if not paragraph.runs:
                 return
@@ -146,38 +174,40 @@ class DOCXGenerator:
             for i, run in enumerate(paragraph.runs):
                 run.text = new_run_texts[i]
 
-        for paragraph in doc.paragraphs:
+        for paragraph in iter_paragraphs(doc):
             replace_in_paragraph(paragraph)
 
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for paragraph in cell.paragraphs:
-                        replace_in_paragraph(paragraph)
-
     def generate(self, nda_id: UUID, nda_type: NDAType, fields: Dict) -> bytes:
         template_name = self.TEMPLATE_MAP.get(nda_type)
         if not template_name:
             raise ValueError(f"No template found for NDA type: {nda_type}")
 
-        template_bytes = minio_service.get_template(template_name)
-        
-        doc = Document(BytesIO(template_bytes))
+        with stage("template_fetch"):
+            template = self.template_cache.get(template_name)
         
         field_mapping = self._get_field_mapping(nda_type)
         
         processed_fields = fields.copy()
         
         if nda_type == NDAType.RU_EN and "signatory_name_ru" in processed_fields:
-            processed_fields["signatory_name_ru"] = self._to_genitive(processed_fields["signatory_name_ru"])
+            with stage("inflection"):
+                processed_fields["signatory_name_ru"] = self._to_genitive(processed_fields["signatory_name_ru"])
         
-        self._replace_placeholders(doc, processed_fields, field_mapping)
+        replacements = self._build_replacements(processed_fields, field_mapping)
         
-        output = BytesIO()
-        doc.save(output)
-        output.seek(0)
+        if settings.DOCX_RENDER_ENGINE == "ooxml":
+            with stage("ooxml_render"):
+                return template.ooxml(field_mapping).render(replacements)
         
-        return output.read()
-
+        with stage("placeholders"):
+            doc = copy.deepcopy(template.document)
+            template.plan(field_mapping).apply(doc, replacements)
+        
+        with stage("doc_save"):
+            output = BytesIO()
+            doc.save(output)
+        
+        # getvalue отдаёт внутренний буфер BytesIO без копирования, в отличие от seek + read
+        return output.getvalue()
 
 docx_generator = DOCXGenerator()
\ No newline at end of file
@@ -0,0 +1,109 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+from app.config import settings
+from app.services.profiler import profiled
+
+
+class ExecutorSaturated(Exception):
+    """Очередь пула переполнена; запрос нужно повторить позже (HTTP 503)"""
+
+    def __init__(self, name: str, retry_after: int):
+        super().__init__(f"Service is busy ({name} queue is full), retry later")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    """
+    Пул потоков с ограниченной очередью для блокирующей работы вне event loop.
+
+    Если все воркеры заняты и в очереди уже max_queue задач, новые задачи
+    отклоняются с ExecutorSaturated вместо бесконечного накопления.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self.active = 0
+        self.completed = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+
+    def _call(self, fn: Callable) -> Any:
+        with self._lock:
+            self.active += 1
+        try:
+            return fn()
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        if self.pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise ExecutorSaturated(self.name, settings.BACKPRESSURE_RETRY_AFTER_SECONDS)
+
+        context = contextvars.copy_context()
+        call = partial(context.run, profiled(fn), *args, **kwargs)
+        with self._lock:
+            self.pending += 1
+        try:
+            future = self._executor.submit(self._call, call)
+        except BaseException:
+            self._release()
+            raise
+        # Задача освобождает место, когда закончит работу в потоке, а не когда
+        # ожидающий запрос отменён (клиент отключился): иначе очередь недосчитывается
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, _future: Optional[Future] = None) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queued": max(self.pending - self.active, 0),
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+class AsyncFacade:
+    """Асинхронная обёртка над синхронным сервисом: методы выполняются в BoundedExecutor"""
+
+    def __init__(self, target: Any, executor: BoundedExecutor):
+        self._target = target
+        self._executor = executor
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return await self._executor.run(attr, *args, **kwargs)
+
+        return call
+
+
+storage_executor = BoundedExecutor(
+    "storage", settings.STORAGE_WORKERS, settings.STORAGE_QUEUE_SIZE
+)
+render_executor = BoundedExecutor(
+    "render", settings.RENDER_WORKERS, settings.RENDER_QUEUE_SIZE
+)
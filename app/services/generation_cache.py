@@ -0,0 +1,58 @@
+import logging
+from typing import Any, Dict, Optional
+from app.config import settings
+from app.services.cache import LRUCache
+from app.services.storage import storage
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationCache:
+    """
+    Кэш сгенерированных DOCX по ключу DOCXGenerator.cache_key.
+
+    Первый уровень - LRU в памяти, второй - объекты cache/generated/ в MinIO.
+    Ключ включает ETag шаблона, поэтому после замены шаблона старые записи
+    просто перестают находиться.
+    """
+
+    def __init__(self, storage, maxsize: int, ttl_seconds: int, storage_tier: bool):
+        self.storage = storage
+        self.ttl_seconds = ttl_seconds
+        self.storage_tier = storage_tier
+        self.storage_hits = 0
+        self._memory = LRUCache(maxsize, ttl=ttl_seconds)
+
+    def get(self, key: str) -> Optional[bytes]:
+        data = self._memory.get(key)
+        if data is None and self.storage_tier:
+            data = self.storage.get_cached_generation(key, self.ttl_seconds)
+            if data is not None:
+                self.storage_hits += 1
+                self._memory.set(key, data)
+        return data
+
+    def put(self, key: str, data: bytes, stored_path: str) -> None:
+        """Сохраняет результат; во второй уровень он копируется из stored_path на стороне хранилища"""
+        self._memory.set(key, data)
+        if not self.storage_tier:
+            return
+        try:
+            self.storage.cache_generated_docx(key, stored_path)
+        except Exception:
+            logger.warning("Failed to store generation cache entry %s", key, exc_info=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._memory.stats(),
+            "storage_tier": self.storage_tier,
+            "storage_hits": self.storage_hits,
+        }
+
+
+generation_cache = GenerationCache(
+    storage,
+    maxsize=settings.GENERATION_CACHE_SIZE,
+    ttl_seconds=settings.GENERATION_CACHE_TTL_SECONDS,
+    storage_tier=settings.GENERATION_CACHE_STORAGE
+)
@@ -0,0 +1,95 @@
+import os
+import socket
+import threading
+from typing import Any, Dict, Optional
+import certifi
+import urllib3
+from urllib3.connection import HTTPConnection
+from urllib3.util import Retry, Timeout
+
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class RetryCounter:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def add(self) -> None:
+        with self._lock:
+            self.value += 1
+
+
+class CountingRetry(Retry):
+    """Retry, который считает повторы в общем счётчике (urllib3 создаёт новый Retry на каждую попытку)"""
+
+    def __init__(self, *args, counter: Optional[RetryCounter] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.counter = counter if counter is not None else RetryCounter()
+
+    def new(self, **kwargs) -> "CountingRetry":
+        retry = super().new(**kwargs)
+        retry.counter = self.counter
+        return retry
+
+    def increment(self, *args, **kwargs) -> "CountingRetry":
+        retry = super().increment(*args, **kwargs)
+        self.counter.add()
+        return retry
+
+
+class HttpPool:
+    """
+    Пул HTTP-соединений для клиента MinIO.
+
+    Размер пула должен покрывать все потоки, которые одновременно ходят в
+    хранилище (STORAGE_WORKERS + RENDER_WORKERS), иначе лишние соединения
+    закрываются после каждого запроса и открываются заново.
+    """
+
+    def __init__(self, maxsize: int, connect_timeout: float, read_timeout: float,
+                 retries: int, backoff_factor: float, backoff_jitter: float,
+                 tcp_keepalive: bool = True):
+        self.maxsize = maxsize
+        self.retries = RetryCounter()
+
+        socket_options = list(HTTPConnection.default_socket_options)
+        if tcp_keepalive:
+            socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+
+        self.manager = urllib3.PoolManager(
+            maxsize=maxsize,
+            block=False,
+            timeout=Timeout(connect=connect_timeout, read=read_timeout),
+            retries=CountingRetry(
+                total=retries,
+                backoff_factor=backoff_factor,
+                backoff_jitter=backoff_jitter,
+                status_forcelist=RETRY_STATUSES,
+                counter=self.retries
+            ),
+            socket_options=socket_options,
+            cert_reqs="CERT_REQUIRED",
+            ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where()
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        in_use = idle = created = requests = 0
+        for key in list(self.manager.pools.keys()):
+            pool = self.manager.pools.get(key)
+            if pool is None or pool.pool is None:
+                continue
+            # Очередь пула заполнена None-заглушками до maxsize; выданные соединения из неё изъяты
+            queued = list(pool.pool.queue)
+            idle += sum(1 for conn in queued if conn is not None)
+            in_use += pool.pool.maxsize - len(queued)
+            created += pool.num_connections
+            requests += pool.num_requests
+        return {
+            "maxsize": self.maxsize,
+            "in_use": in_use,
+            "idle": idle,
+            "created": created,
+            "requests": requests,
+            "retries": self.retries.value,
+        }
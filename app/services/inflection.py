@@ -0,0 +1,118 @@
+import json
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+import pymorphy3
+from app.services.cache import LRUCache
+
+
+class GenitiveInflector:
+    """
+    Склонение ФИО в родительный падеж с LRU-кэшем по словам.
+
+    Одни и те же подписанты встречаются постоянно, поэтому разбор pymorphy3
+    выполняется один раз на слово. Кэш можно сохранять на диск, чтобы новый
+    воркер не пересчитывал частые фамилии. Словари pymorphy3 загружаются
+    при первом обращении.
+    """
+
+    def __init__(self, maxsize: int, cache_file: Optional[str] = None):
+        self.cache_file = cache_file
+        self._morph = None
+        self._morph_lock = threading.Lock()
+        self._cache = LRUCache(maxsize)
+        self._dirty = False
+        self._save_lock = threading.Lock()
+        if cache_file:
+            self.load(cache_file)
+
+    @property
+    def morph(self) -> pymorphy3.MorphAnalyzer:
+        if self._morph is None:
+            with self._morph_lock:
+                if self._morph is None:
+                    self._morph = pymorphy3.MorphAnalyzer()
+        return self._morph
+
+    def warm_up(self) -> None:
+        """Загружает словари pymorphy3 заранее, а не на первом запросе"""
+        _ = self.morph
+
+    def _inflect(self, word: str) -> str:
+        parses = self.morph.parse(word)
+        target_parse = None
+        
+        for p in parses:
+            if 'nomn' in p.tag:
+                target_parse = p
+                break
+        
+        if not target_parse:
+            target_parse = parses[0]
+        
+        inflected = target_parse.inflect({'gent'})
+        
+        if not inflected:
+            return word
+
+        result_word = inflected.word
+        if word.istitle():
+            result_word = result_word.capitalize()
+        elif word.isupper():
+            result_word = result_word.upper()
+        return result_word
+
+    def inflect_word(self, word: str) -> str:
+        result = self._cache.get(word)
+        if result is None:
+            result = self._inflect(word)
+            self._cache.set(word, result)
+            self._dirty = True
+        return result
+
+    def to_genitive(self, text: str) -> str:
+        if not text:
+            return text
+        return " ".join(self.inflect_word(word) for word in text.split())
+
+    def to_genitive_many(self, texts: Iterable[str]) -> List[str]:
+        """Склоняет сразу несколько строк; каждое уникальное слово разбирается один раз"""
+        texts = list(texts)
+        words = {word for text in texts if text for word in text.split()}
+        inflected = {word: self.inflect_word(word) for word in words}
+        return [
+            " ".join(inflected[word] for word in text.split()) if text else text
+            for text in texts
+        ]
+
+    def load(self, path: str) -> None:
+        try:
+            with open(path, encoding="utf-8") as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return
+        for word, result in entries.items():
+            self._cache.set(word, result)
+
+    def save(self, path: Optional[str] = None) -> None:
+        path = path or self.cache_file
+        if not path or not self._dirty:
+            return
+
+        with self._save_lock:
+            entries = self._cache.items()
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(entries, f, ensure_ascii=False)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+            self._dirty = False
+
+    def stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
@@ -0,0 +1,266 @@
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Optional
+from app.config import settings
+from app.services.cache import LRUCache
+from app.services.metrics import Counter as MetricCounter, registry
+
+lead_rejections = registry.register(MetricCounter(
+    "lead_rejections_total", "Lead submissions rejected by the guard", ("reason",)
+))
+
+_LINK_RE = re.compile(r"https?://|www\.|\[url", re.IGNORECASE)
+_MARKUP_RE = re.compile(r"https?://|www\.|<[a-z/!]|\[/?url", re.IGNORECASE)
+_SPACES_RE = re.compile(r"\s+")
+_PRUNE_EVERY = 1000
+
+
+class LeadRejected(Exception):
+    """Заявка отклонена ограничением частоты (HTTP 429)"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(f"Too many requests ({reason}), retry later")
+        self.reason = reason
+        self.retry_after = max(int(retry_after + 0.999), 1)
+
+
+def spam_reason(lead: Dict[str, Any]) -> Optional[str]:
+    """Дешёвые эвристики по содержимому заявки; None, если подозрений нет"""
+    if lead.get("website_url"):
+        return "honeypot"
+    if _MARKUP_RE.search(lead["name"]) or _MARKUP_RE.search(lead["phone"]):
+        return "markup"
+    if len(_LINK_RE.findall(lead["details"])) > settings.LEAD_MAX_LINKS:
+        return "links"
+    return None
+
+
+def content_hash(lead: Dict[str, Any]) -> str:
+    """Хэш заявки без учёта регистра и пробелов: повторная отправка формы даёт тот же хэш"""
+    parts = (
+        lead["email"].lower(),
+        _SPACES_RE.sub(" ", lead["name"]).strip().lower(),
+        "".join(ch for ch in lead["phone"] if ch.isdigit()),
+        _SPACES_RE.sub(" ", lead["details"]).strip().lower(),
+    )
+    return hashlib.blake2b("\x00".join(parts).encode(), digest_size=16).hexdigest()
+
+
+class MemoryLimiter:
+    """
+    Token bucket и окно дубликатов в памяти процесса.
+    Память ограничена LRU; ведро, которое успело наполниться, можно забыть,
+    поэтому TTL записи равен времени полного восполнения.
+    """
+
+    name = "memory"
+    blocking = False
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, LRUCache] = {}
+        self._seen = LRUCache(max_keys, ttl=settings.LEAD_DUPLICATE_WINDOW_SECONDS)
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        """Забирает токен; возвращает 0 или сколько секунд ждать следующего"""
+        scope = key.split(":", 1)[0]
+        with self._lock:
+            buckets = self._buckets.get(scope)
+            if buckets is None:
+                buckets = self._buckets[scope] = LRUCache(self.max_keys, ttl=burst / rate)
+
+            now = time.monotonic()
+            tokens, updated_at = buckets.peek(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            if tokens < 1:
+                buckets.set(key, (tokens, now))
+                return (1 - tokens) / rate
+            buckets.set(key, (tokens - 1, now))
+            return 0
+
+    def seen(self, digest: str) -> bool:
+        """Принималась ли такая заявка за последние LEAD_DUPLICATE_WINDOW_SECONDS"""
+        return self._seen.peek(digest) is not None
+
+    def remember(self, digest: str) -> None:
+        self._seen.set(digest, True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "tracked_keys": {scope: len(buckets) for scope, buckets in self._buckets.items()},
+            "tracked_hashes": len(self._seen),
+        }
+
+
+class SQLiteLimiter:
+    """Те же ведра и хэши в SQLite: лимиты общие для всех воркеров на узле"""
+
+    name = "sqlite"
+    blocking = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._operations = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS buckets (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS seen (
+                    digest TEXT PRIMARY KEY,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            self._conn = conn
+        return self._conn
+
+    def _transaction(self, fn):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn, time.time())
+                self._operations += 1
+                if self._operations % _PRUNE_EVERY == 0:
+                    conn.execute("DELETE FROM buckets WHERE expires_at < ?", (time.time(),))
+                    conn.execute("DELETE FROM seen WHERE expires_at < ?", (time.time(),))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def take(self, key: str, rate: float, burst: int) -> float:
+        def take(conn: sqlite3.Connection, now: float) -> float:
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)
+            ).fetchone()
+            tokens, updated_at = row if row else (burst, now)
+            tokens = min(burst, tokens + (now - updated_at) * rate)
+            wait = (1 - tokens) / rate if tokens < 1 else 0
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets (key, tokens, updated_at, expires_at)"
+                " VALUES (?, ?, ?, ?)",
+                (key, tokens if wait else tokens - 1, now, now + burst / rate)
+            )
+            return wait
+
+        return self._transaction(take)
+
+    def seen(self, digest: str) -> bool:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT 1 FROM seen WHERE digest = ? AND expires_at > ?", (digest, time.time())
+            ).fetchone()
+        return row is not None
+
+    def remember(self, digest: str) -> None:
+        self._transaction(lambda conn, now: conn.execute(
+            "INSERT OR REPLACE INTO seen (digest, expires_at) VALUES (?, ?)",
+            (digest, now + settings.LEAD_DUPLICATE_WINDOW_SECONDS)
+        ))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            conn = self._connection()
+            now = time.time()
+            buckets = conn.execute("SELECT COUNT(*) FROM buckets WHERE expires_at > ?", (now,)).fetchone()
+            hashes = conn.execute("SELECT COUNT(*) FROM seen WHERE expires_at > ?", (now,)).fetchone()
+        return {"tracked_keys": buckets[0], "tracked_hashes": hashes[0]}
+
+
+class LeadGuard:
+    """
+    Защита /api/v1/leads от флуда: лимиты по IP и email, повторные отправки
+    и явный спам отсекаются до записи в очередь писем.
+
+    check возвращает None для заявки, которую надо принять, или причину,
+    по которой её молча отбрасываем (как honeypot, чтобы не подсказывать ботам).
+    Превышение лимита поднимает LeadRejected.
+    """
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.accepted = 0
+        self.rejected = Counter()
+
+    def client_ip(self, peer: Optional[str], forwarded_for: Optional[str]) -> str:
+        if settings.LEAD_TRUST_FORWARDED_FOR and forwarded_for:
+            # Последний адрес добавлен нашим прокси, остальные мог подставить клиент
+            return forwarded_for.split(",")[-1].strip()
+        return peer or "unknown"
+
+    def _check(self, lead: Dict[str, Any], ip: str) -> Optional[str]:
+        wait = self.limiter.take(
+            f"ip:{ip}", settings.LEAD_IP_RATE_PER_MINUTE / 60, settings.LEAD_IP_BURST
+        )
+        if wait:
+            self.rejected["ip_rate"] += 1
+            lead_rejections.inc(reason="ip_rate")
+            raise LeadRejected("ip_rate", wait)
+
+        digest = content_hash(lead)
+        reason = spam_reason(lead)
+        if reason is None and self.limiter.seen(digest):
+            reason = "duplicate"
+        if reason is not None:
+            self.rejected[reason] += 1
+            lead_rejections.inc(reason=reason)
+            return reason
+
+        wait = self.limiter.take(
+            f"email:{lead['email'].lower()}",
+            settings.LEAD_EMAIL_RATE_PER_HOUR / 3600,
+            settings.LEAD_EMAIL_BURST
+        )
+        if wait:
+            self.rejected["email_rate"] += 1
+            lead_rejections.inc(reason="email_rate")
+            raise LeadRejected("email_rate", wait)
+
+        # Хэш запоминается только для принятых заявок, иначе повтор после 429 сочли бы дубликатом
+        self.limiter.remember(digest)
+        self.accepted += 1
+        return None
+
+    async def check(self, lead: Dict[str, Any], ip: str) -> Optional[str]:
+        if self.limiter.blocking:
+            return await asyncio.to_thread(self._check, lead, ip)
+        return self._check(lead, ip)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.limiter.name,
+            "accepted": self.accepted,
+            "rejected": dict(self.rejected),
+            **self.limiter.stats(),
+        }
+
+
+def _create_limiter():
+    if settings.LEAD_RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteLimiter(settings.LEAD_RATE_LIMIT_PATH)
+    return MemoryLimiter(settings.LEAD_RATE_LIMIT_MAX_KEYS)
+
+
+lead_guard = LeadGuard(_create_limiter())
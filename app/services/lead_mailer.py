@@ -0,0 +1,373 @@
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from email.message import EmailMessage
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import aiosmtplib
+from app.config import settings
+from app.services.metrics import Gauge, Histogram, registry
+
+logger = logging.getLogger(__name__)
+
+lead_mail_send_duration = registry.register(Histogram(
+    "lead_mail_send_duration_seconds", "Successful lead email sends, including SMTP connect", ("kind",)
+))
+
+# (id, лид, число прошлых попыток)
+SpooledLead = Tuple[int, Dict[str, Any], int]
+
+
+def format_lead(lead: Dict[str, Any]) -> str:
+    return f"""
+New Lead Received:
+
+Name: {lead["name"]}
+Email: {lead["email"]}
+Phone: {lead["phone"]}
+
+Details:
+{lead["details"]}
+        """
+
+
+def lead_message(lead: Dict[str, Any]) -> EmailMessage:
+    message = EmailMessage()
+    message["Subject"] = "New Lead from Mitra Website"
+    message["From"] = settings.MAIL_FROM
+    message["To"] = settings.ADMIN_EMAIL
+    message.set_content(format_lead(lead))
+    return message
+
+
+def digest_message(leads: List[Dict[str, Any]]) -> EmailMessage:
+    message = EmailMessage()
+    message["Subject"] = f"{len(leads)} new leads from Mitra Website"
+    message["From"] = settings.MAIL_FROM
+    message["To"] = settings.ADMIN_EMAIL
+    message.set_content(("\n" + "-" * 40 + "\n").join(format_lead(lead) for lead in leads))
+    return message
+
+
+class LeadSpool:
+    """
+    Очередь исходящих писем о лидах в SQLite.
+
+    Лид записывается до ответа клиенту и удаляется только после успешной
+    отправки, поэтому рестарт воркера или недоступный SMTP не теряют заявки.
+    Выборка продлевает next_attempt_at на время отправки (аренда), так что
+    одну очередь могут разбирать несколько процессов.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    last_error TEXT,
+                    dead INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (dead, next_attempt_at)")
+            self._conn = conn
+        return self._conn
+
+    def enqueue(self, lead: Dict[str, Any]) -> int:
+        now = time.time()
+        with self._lock:
+            cursor = self._connection().execute(
+                "INSERT INTO outbox (payload, created_at, next_attempt_at) VALUES (?, ?, ?)",
+                (json.dumps(lead), now, now)
+            )
+            return cursor.lastrowid
+
+    def claim(self, limit: int, lease_seconds: float) -> List[SpooledLead]:
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT id, payload, attempts FROM outbox"
+                    " WHERE dead = 0 AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                    (now, limit)
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE outbox SET next_attempt_at = ? WHERE id = ?",
+                    [(now + lease_seconds, row[0]) for row in rows]
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return [(row_id, json.loads(payload), attempts) for row_id, payload, attempts in rows]
+
+    def complete(self, ids: List[int]) -> None:
+        with self._lock:
+            self._connection().executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+
+    def fail(self, leads: List[SpooledLead], error: str) -> None:
+        """Планирует повтор с экспоненциальной задержкой; после LEAD_MAIL_MAX_ATTEMPTS лид помечается dead"""
+        now = time.time()
+        updates = []
+        for row_id, _, attempts in leads:
+            attempts += 1
+            delay = min(
+                settings.LEAD_MAIL_RETRY_BASE_SECONDS * 2 ** (attempts - 1),
+                settings.LEAD_MAIL_RETRY_MAX_SECONDS
+            ) * random.uniform(0.5, 1.5)
+            dead = int(attempts >= settings.LEAD_MAIL_MAX_ATTEMPTS)
+            updates.append((attempts, now + delay, error, dead, row_id))
+        with self._lock:
+            self._connection().executemany(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, last_error = ?, dead = ?"
+                " WHERE id = ?",
+                updates
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending, dead, oldest = self._connection().execute(
+                "SELECT SUM(dead = 0), SUM(dead = 1), MIN(CASE WHEN dead = 0 THEN created_at END)"
+                " FROM outbox"
+            ).fetchone()
+        return {
+            "queue_depth": pending or 0,
+            "dead": dead or 0,
+            "oldest_pending_seconds": round(time.time() - oldest, 1) if oldest else None,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class SMTPPool:
+    """Долгоживущие SMTP-соединения: TLS и авторизация выполняются один раз, а не на каждое письмо"""
+
+    def __init__(self, size: int, idle_timeout: float):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.connects = 0
+        self._idle: List[Tuple[aiosmtplib.SMTP, float]] = []
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        client = aiosmtplib.SMTP(
+            hostname=settings.MAIL_SERVER,
+            port=settings.MAIL_PORT,
+            username=settings.MAIL_USERNAME if settings.USE_CREDENTIALS else None,
+            password=settings.MAIL_PASSWORD if settings.USE_CREDENTIALS else None,
+            use_tls=settings.MAIL_SSL_TLS,
+            start_tls=settings.MAIL_STARTTLS and not settings.MAIL_SSL_TLS,
+            validate_certs=settings.VALIDATE_CERTS,
+            timeout=settings.LEAD_MAIL_TIMEOUT_SECONDS
+        )
+        await client.connect()
+        self.connects += 1
+        return client
+
+    @staticmethod
+    def _discard(client: aiosmtplib.SMTP) -> None:
+        try:
+            client.close()
+        except Exception:
+            pass
+
+    def _take_idle(self) -> Optional[aiosmtplib.SMTP]:
+        while self._idle:
+            client, used_at = self._idle.pop()
+            if client.is_connected and time.monotonic() - used_at < self.idle_timeout:
+                return client
+            self._discard(client)
+        return None
+
+    async def send(self, message: EmailMessage) -> None:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.size)
+
+        async with self._slots:
+            client = self._take_idle()
+            if client is not None:
+                try:
+                    await client.send_message(message)
+                    self._idle.append((client, time.monotonic()))
+                    return
+                except aiosmtplib.SMTPServerDisconnected:
+                    # Сервер закрыл простаивающее соединение - повторяем на новом
+                    self._discard(client)
+                except BaseException:
+                    self._discard(client)
+                    raise
+
+            client = await self._connect()
+            try:
+                await client.send_message(message)
+            except BaseException:
+                self._discard(client)
+                raise
+            self._idle.append((client, time.monotonic()))
+
+    async def close(self) -> None:
+        while self._idle:
+            client, _ = self._idle.pop()
+            try:
+                await client.quit()
+            except Exception:
+                self._discard(client)
+
+
+class LeadMailer:
+    """
+    Фоновая отправка писем о лидах из LeadSpool через SMTPPool.
+
+    Если включён дайджест (LEAD_DIGEST_INTERVAL_SECONDS > 0) и в очереди
+    накопилось не меньше LEAD_DIGEST_THRESHOLD лидов, они уходят одним
+    письмом, и следующее письмо отправляется не раньше чем через интервал.
+    """
+
+    def __init__(self, spool: LeadSpool, pool: SMTPPool):
+        self.spool = spool
+        self.pool = pool
+        self.sent = 0
+        self.failed_attempts = 0
+        self.digests = 0
+        self._latencies = deque(maxlen=256)
+        self._last_digest = float("-inf")
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def enqueue(self, lead: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self.spool.enqueue, lead)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def start(self) -> None:
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.pool.close()
+        self.spool.close()
+
+    def _digest_pause(self) -> float:
+        """Сколько ещё ждать до следующего письма после дайджеста"""
+        if settings.LEAD_DIGEST_INTERVAL_SECONDS <= 0:
+            return 0
+        elapsed = time.monotonic() - self._last_digest
+        return max(settings.LEAD_DIGEST_INTERVAL_SECONDS - elapsed, 0)
+
+    async def _run(self) -> None:
+        while True:
+            processed = 0
+            try:
+                processed = await self.process_due()
+            except Exception:
+                logger.exception("Lead mail delivery failed")
+
+            if processed:
+                continue
+            timeout = settings.LEAD_MAIL_POLL_SECONDS
+            if self._digest_pause():
+                timeout = min(timeout, self._digest_pause())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def process_due(self) -> int:
+        """Отправляет лиды, у которых подошло время; возвращает число обработанных"""
+        if self._digest_pause():
+            return 0
+
+        leads = await asyncio.to_thread(
+            self.spool.claim, settings.LEAD_MAIL_BATCH_SIZE, settings.LEAD_MAIL_TIMEOUT_SECONDS * 4
+        )
+        if not leads:
+            return 0
+
+        if settings.LEAD_DIGEST_INTERVAL_SECONDS > 0 and len(leads) >= settings.LEAD_DIGEST_THRESHOLD:
+            if await self._deliver(leads, digest_message([lead for _, lead, _ in leads]), "digest"):
+                self.digests += 1
+            self._last_digest = time.monotonic()
+        else:
+            await asyncio.gather(*(
+                self._deliver([entry], lead_message(entry[1]), "single") for entry in leads
+            ))
+        return len(leads)
+
+    async def _deliver(self, leads: List[SpooledLead], message: EmailMessage, kind: str) -> bool:
+        started = time.perf_counter()
+        try:
+            await self.pool.send(message)
+        except Exception as e:
+            self.failed_attempts += 1
+            logger.warning("Failed to send lead email (%d leads): %s", len(leads), e)
+            await asyncio.to_thread(self.spool.fail, leads, str(e) or type(e).__name__)
+            return False
+
+        elapsed = time.perf_counter() - started
+        self._latencies.append(elapsed * 1000)
+        lead_mail_send_duration.observe(elapsed, kind=kind)
+        self.sent += len(leads)
+        await asyncio.to_thread(self.spool.complete, [row_id for row_id, _, _ in leads])
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = sorted(self._latencies)
+        return {
+            **self.spool.stats(),
+            "sent": self.sent,
+            "failed_attempts": self.failed_attempts,
+            "digests": self.digests,
+            "smtp_connects": self.pool.connects,
+            "send_latency_ms": {
+                "avg": round(sum(latencies) / len(latencies), 2) if latencies else None,
+                "p95": round(latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)], 2) if latencies else None,
+                "max": round(latencies[-1], 2) if latencies else None,
+            },
+        }
+
+
+lead_mailer = LeadMailer(
+    LeadSpool(settings.LEAD_SPOOL_PATH),
+    SMTPPool(settings.LEAD_MAIL_POOL_SIZE, settings.LEAD_MAIL_IDLE_TIMEOUT_SECONDS)
+)
+
+
+def _spool_depth() -> Dict[Tuple[str, ...], float]:
+    stats = lead_mailer.spool.stats()
+    return {("pending",): stats["queue_depth"], ("dead",): stats["dead"]}
+
+
+registry.register(Gauge(
+    "lead_mail_spool_depth", "Leads in the mail spool by state", ("state",), collect=_spool_depth
+))
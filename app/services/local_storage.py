@@ -0,0 +1,329 @@
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+from uuid import UUID
+from app.models import NDAMetadata, NDAType
+from app.services.storage import SignedURLStorage, StaleMetadata, StoredObject
+
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def _md5(data: bytes) -> str:
+    return hashlib.md5(data).hexdigest()
+
+
+class LocalStorage(SignedURLStorage):
+    """
+    Хранилище на локальном диске для развёртывания на одном узле.
+
+    Объекты лежат в root по тем же ключам, что и в MinIO. Запись атомарная
+    (временный файл + os.replace), шаблоны читаются через mmap и разделяют
+    page cache между процессами. Шаблоны нужно заменять атомарно, а не
+    перезаписывать на месте.
+    """
+
+    name = "local"
+
+    def __init__(self, root: str, templates_dir: Optional[str] = None):
+        super().__init__()
+        self.root = Path(root).resolve()
+        self.templates_dir = Path(templates_dir).resolve() if templates_dir else None
+
+    def ensure_ready(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def file_path(self, object_path: str) -> Path:
+        path = (self.root / object_path).resolve()
+        if not path.is_relative_to(self.root):
+            raise FileNotFoundError(f"Object '{object_path}' is outside of storage root")
+        return path
+
+    def _template_file(self, template_name: str) -> Path:
+        if self.templates_dir is not None:
+            path = (self.templates_dir / template_name).resolve()
+            if path.is_relative_to(self.templates_dir):
+                return path
+        return self.file_path(self._get_template_path(template_name))
+
+    def _atomic_write(self, object_path: str, write: Callable[[BinaryIO], None]) -> str:
+        path = self.file_path(object_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return object_path
+
+    @contextmanager
+    def _metadata_file_lock(self, nda_id: UUID) -> Iterator[None]:
+        """Межпроцессная блокировка meta.json на время сравнения ETag и записи"""
+        path = self.file_path(self._get_meta_path(nda_id)).with_suffix(".lock")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load_metadata(self, nda_id: UUID) -> Optional[Tuple[NDAMetadata, str]]:
+        try:
+            data = self.file_path(self._get_meta_path(nda_id)).read_bytes()
+        except FileNotFoundError:
+            return None
+        return NDAMetadata(**json.loads(data)), _md5(data)
+
+    def list_nda_ids(self, prefix: str = "") -> Iterator[UUID]:
+        for meta_file in (self.root / "nda").glob(f"{prefix}*/meta.json"):
+            try:
+                yield UUID(meta_file.parent.name)
+            except ValueError:
+                continue
+
+    def _store_metadata(self, metadata: NDAMetadata, if_match: Optional[str]) -> str:
+        meta_path = self._get_meta_path(metadata.nda_id)
+        meta_json = metadata.model_dump_json(indent=2).encode()
+
+        with self._metadata_file_lock(metadata.nda_id):
+            if if_match is not None:
+                try:
+                    current = _md5(self.file_path(meta_path).read_bytes())
+                except FileNotFoundError:
+                    current = None
+                if current != if_match:
+                    raise StaleMetadata(f"meta.json of NDA {metadata.nda_id} has changed")
+            self._atomic_write(meta_path, lambda f: f.write(meta_json))
+
+        return _md5(meta_json)
+
+    def list_objects(self, prefix: str) -> Iterator[StoredObject]:
+        # prefix может обрываться на середине имени (nda/3): обходим только подходящие записи родителя
+        directory, _, name_prefix = prefix.rpartition("/")
+        try:
+            entries = [e for e in os.scandir(self.file_path(directory)) if e.name.startswith(name_prefix)]
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry.is_file():
+                walked = [(os.path.dirname(entry.path), [entry.name])]
+            else:
+                walked = ((dirpath, filenames) for dirpath, _, filenames in os.walk(entry.path))
+            for dirpath, filenames in walked:
+                for filename in filenames:
+                    path = Path(dirpath) / filename
+                    try:
+                        st = path.stat()
+                    except FileNotFoundError:
+                        continue
+                    yield StoredObject(path.relative_to(self.root).as_posix(), st.st_size, st.st_mtime)
+
+    def put_object(self, object_path: str, data: bytes,
+                   content_type: str = "application/octet-stream") -> str:
+        return self._atomic_write(object_path, lambda f: f.write(data))
+
+    def move_object(self, source_path: str, target_path: str) -> None:
+        target = self.file_path(target_path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self.file_path(source_path), target)
+        self._remove_empty_dirs(self.file_path(source_path).parent)
+
+    def _remove_empty_dirs(self, directory: Path) -> None:
+        while directory != self.root and directory.is_relative_to(self.root):
+            try:
+                directory.rmdir()
+            except OSError:
+                return
+            directory = directory.parent
+
+    def delete_objects(self, object_paths: List[str]) -> int:
+        deleted = 0
+        for object_path in object_paths:
+            path = self.file_path(object_path)
+            try:
+                path.unlink()
+                deleted += 1
+            except FileNotFoundError:
+                continue
+            self._remove_empty_dirs(path.parent)
+        return deleted
+
+    def save_generated_docx_by_type(self, nda_id: UUID, docx_bytes: bytes, nda_type: NDAType) -> str:
+        return self._atomic_write(
+            self._get_generated_path(nda_id, nda_type), lambda f: f.write(docx_bytes)
+        )
+
+    def cache_generated_docx(self, key: str, source_path: str) -> None:
+        """Кладёт в кэш жёсткую ссылку на уже сохранённый файл, без копирования данных"""
+        cache_file = self.file_path(self._get_generation_cache_path(key))
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_file.with_name(f".{cache_file.name}.{os.getpid()}.{threading.get_ident()}")
+        try:
+            os.link(self.file_path(source_path), tmp_path)
+        except OSError:
+            shutil.copyfile(self.file_path(source_path), tmp_path)
+        os.replace(tmp_path, cache_file)
+
+    def get_cached_generation(self, key: str, max_age_seconds: int) -> Optional[bytes]:
+        cache_file = self.file_path(self._get_generation_cache_path(key))
+        try:
+            if time.time() - cache_file.stat().st_mtime > max_age_seconds:
+                return None
+            return cache_file.read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def save_signed_stream(self, nda_id: UUID, stream: BinaryIO, filename: str,
+                           content_type: str = "application/octet-stream") -> str:
+        return self._atomic_write(
+            self._get_signed_path(nda_id, filename),
+            lambda f: shutil.copyfileobj(stream, f, _COPY_CHUNK_SIZE)
+        )
+
+    def get_object(self, object_path: str) -> bytes:
+        return self.file_path(object_path).read_bytes()
+
+    def stat_template(self, template_name: str) -> str:
+        try:
+            st = self._template_file(template_name).stat()
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Template '{template_name}' not found in {self.name} storage")
+        # os.replace создаёт новый inode, поэтому замена шаблона всегда меняет ETag
+        return f"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"
+
+    def get_template(self, template_name: str) -> Union[bytes, memoryview]:
+        """Отображает шаблон в память; memoryview держит mmap открытым, пока шаблон в кэше"""
+        try:
+            with open(self._template_file(template_name), "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return b""
+                return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Template '{template_name}' not found in {self.name} storage")
+
+
+class MemoryStorage(SignedURLStorage):
+    """Хранилище в памяти процесса: для бенчмарков и проверок без сети и диска"""
+
+    name = "memory"
+
+    def __init__(self, templates_dir: Optional[str] = None):
+        super().__init__()
+        self._objects: Dict[str, Tuple[bytes, float]] = {}
+        self._lock = threading.Lock()
+        if templates_dir:
+            for path in Path(templates_dir).iterdir():
+                if path.is_file():
+                    self.put_object(self._get_template_path(path.name), path.read_bytes())
+
+    def put_object(self, object_path: str, data: bytes,
+                   content_type: str = "application/octet-stream") -> str:
+        with self._lock:
+            self._objects[object_path] = (bytes(data), time.time())
+        return object_path
+
+    def list_objects(self, prefix: str) -> Iterator[StoredObject]:
+        with self._lock:
+            entries = [
+                StoredObject(path, len(data), modified)
+                for path, (data, modified) in self._objects.items() if path.startswith(prefix)
+            ]
+        return iter(entries)
+
+    def move_object(self, source_path: str, target_path: str) -> None:
+        with self._lock:
+            if source_path not in self._objects:
+                raise FileNotFoundError(f"Object '{source_path}' not found in memory storage")
+            self._objects[target_path] = self._objects.pop(source_path)
+
+    def delete_objects(self, object_paths: List[str]) -> int:
+        with self._lock:
+            return sum(self._objects.pop(path, None) is not None for path in object_paths)
+
+    def get_object(self, object_path: str) -> bytes:
+        with self._lock:
+            entry = self._objects.get(object_path)
+        if entry is None:
+            raise FileNotFoundError(f"Object '{object_path}' not found in memory storage")
+        return entry[0]
+
+    def _load_metadata(self, nda_id: UUID) -> Optional[Tuple[NDAMetadata, str]]:
+        try:
+            data = self.get_object(self._get_meta_path(nda_id))
+        except FileNotFoundError:
+            return None
+        return NDAMetadata(**json.loads(data)), _md5(data)
+
+    def list_nda_ids(self, prefix: str = "") -> Iterator[UUID]:
+        with self._lock:
+            paths = [path for path in self._objects if path.startswith(f"nda/{prefix}")]
+        for path in paths:
+            parts = path.split("/")
+            if len(parts) != 3 or parts[2] != "meta.json":
+                continue
+            try:
+                yield UUID(parts[1])
+            except ValueError:
+                continue
+
+    def _store_metadata(self, metadata: NDAMetadata, if_match: Optional[str]) -> str:
+        meta_path = self._get_meta_path(metadata.nda_id)
+        meta_json = metadata.model_dump_json(indent=2).encode()
+
+        with self._lock:
+            if if_match is not None:
+                current = self._objects.get(meta_path)
+                if current is None or _md5(current[0]) != if_match:
+                    raise StaleMetadata(f"meta.json of NDA {metadata.nda_id} has changed")
+            self._objects[meta_path] = (meta_json, time.time())
+
+        return _md5(meta_json)
+
+    def save_generated_docx_by_type(self, nda_id: UUID, docx_bytes: bytes, nda_type: NDAType) -> str:
+        return self.put_object(self._get_generated_path(nda_id, nda_type), docx_bytes)
+
+    def cache_generated_docx(self, key: str, source_path: str) -> None:
+        self.put_object(self._get_generation_cache_path(key), self.get_object(source_path))
+
+    def get_cached_generation(self, key: str, max_age_seconds: int) -> Optional[bytes]:
+        with self._lock:
+            entry = self._objects.get(self._get_generation_cache_path(key))
+        if entry is None or time.time() - entry[1] > max_age_seconds:
+            return None
+        return entry[0]
+
+    def save_signed_stream(self, nda_id: UUID, stream: BinaryIO, filename: str,
+                           content_type: str = "application/octet-stream") -> str:
+        chunks = []
+        while True:
+            chunk = stream.read(_COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return self.put_object(self._get_signed_path(nda_id, filename), b"".join(chunks), content_type)
+
+    def stat_template(self, template_name: str) -> str:
+        try:
+            return _md5(self.get_object(self._get_template_path(template_name)))
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Template '{template_name}' not found in {self.name} storage")
+
+    def get_template(self, template_name: str) -> bytes:
+        try:
+            return self.get_object(self._get_template_path(template_name))
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Template '{template_name}' not found in {self.name} storage")
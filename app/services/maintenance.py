@@ -0,0 +1,311 @@
+import fcntl
+import io
+import logging
+import tarfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+from app.config import settings
+from app.models import NDAStatus
+from app.services.executors import render_executor, storage_executor
+from app.services.metrics import Counter, registry
+from app.services.nda_index import nda_index
+from app.services.storage import StorageBackend, StoredObject, storage
+
+logger = logging.getLogger(__name__)
+
+_SHARDS = "0123456789abcdef"
+_DAY = 86400
+# Сколько stop() ждёт текущую пачку удаления или загрузку архива
+_STOP_TIMEOUT_SECONDS = 30
+
+maintenance_reclaimed = registry.register(Counter(
+    "maintenance_reclaimed_total", "Storage reclaimed by the maintenance job", ("kind", "unit")
+))
+
+
+def cache_ttls() -> Dict[str, float]:
+    """Префиксы кэшей в хранилище и возраст, после которого записи уже не используются"""
+    return {
+        "cache/generated/": settings.GENERATION_CACHE_TTL_SECONDS,
+        "cache/pdf/": settings.PDF_CACHE_TTL_SECONDS,
+    }
+
+
+class Throttle:
+    """
+    Не больше ops_per_second обращений к хранилищу; пока у приложения есть
+    очередь в пулах потоков, обслуживание ждёт, чтобы не конкурировать с запросами.
+    """
+
+    def __init__(self, ops_per_second: float, stop: threading.Event):
+        self.interval = 1 / ops_per_second if ops_per_second > 0 else 0
+        self.stop = stop
+        self.waited_seconds = 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        started = time.monotonic()
+        while storage_executor.pending or render_executor.pending:
+            if self.stop.wait(0.2):
+                break
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(self._next, now) + self.interval
+        if delay > 0:
+            self.stop.wait(delay)
+        self.waited_seconds += time.monotonic() - started
+
+
+class MaintenanceReport:
+    def __init__(self, dry_run: bool):
+        self.dry_run = dry_run
+        self.started_at = datetime.now(timezone.utc)
+        self.scanned_ndas = 0
+        self.counts: Dict[str, Dict[str, int]] = defaultdict(lambda: {"ndas": 0, "objects": 0, "bytes": 0})
+        # Архив остаётся в хранилище: его объекты и байты не освобождены
+        self.archive_objects_written = 0
+        self.archive_bytes_written = 0
+        self.errors = 0
+
+    def add(self, kind: str, objects: List[StoredObject], ndas: int = 1) -> None:
+        entry = self.counts[kind]
+        entry["ndas"] += ndas
+        entry["objects"] += len(objects)
+        entry["bytes"] += sum(obj.size for obj in objects)
+
+    def as_dict(self, duration: float, throttled: float) -> Dict[str, Any]:
+        reclaimed_bytes = sum(c["bytes"] for c in self.counts.values()) - self.archive_bytes_written
+        reclaimed_objects = sum(c["objects"] for c in self.counts.values()) - self.archive_objects_written
+        return {
+            "dry_run": self.dry_run,
+            "started_at": self.started_at.isoformat(),
+            "duration_seconds": round(duration, 2),
+            "throttled_seconds": round(throttled, 2),
+            "scanned_ndas": self.scanned_ndas,
+            **{kind: dict(entry) for kind, entry in self.counts.items()},
+            "archive_objects_written": self.archive_objects_written,
+            "archive_bytes_written": self.archive_bytes_written,
+            "reclaimed_objects": reclaimed_objects,
+            "reclaimed_bytes": reclaimed_bytes,
+            "errors": self.errors,
+        }
+
+
+class MaintenanceJob:
+    """
+    Периодическая уборка хранилища:
+
+    - NDA в статусах MAINTENANCE_EXPIRE_STATUSES без активности дольше
+      MAINTENANCE_DRAFT_TTL_DAYS удаляются целиком (брошенные черновики);
+    - SUBMITTED старше MAINTENANCE_ARCHIVE_AFTER_DAYS переносятся в archive/
+      (tar.gz одним объектом или тем же деревом под префиксом);
+    - записи cache/ старше TTL своего кэша удаляются.
+
+    Активность NDA - время последнего изменения любого объекта в его папке,
+    поэтому meta.json читается только для папок, которые уже достаточно стары.
+    Листинг идёт параллельно по шардам, удаление - пачками.
+    """
+
+    def __init__(self, storage: StorageBackend):
+        self.storage = storage
+        self.last_report: Optional[Dict[str, Any]] = None
+        self.runs = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _list_sharded(self, prefix: str) -> List[StoredObject]:
+        with ThreadPoolExecutor(max_workers=settings.MAINTENANCE_LIST_CONCURRENCY) as pool:
+            shards = pool.map(lambda shard: list(self.storage.list_objects(prefix + shard)), _SHARDS)
+            return [obj for shard in shards for obj in shard]
+
+    def _delete(self, paths: List[str], throttle: Throttle, report: MaintenanceReport) -> None:
+        if report.dry_run:
+            return
+        for start in range(0, len(paths), settings.MAINTENANCE_DELETE_BATCH):
+            batch = paths[start:start + settings.MAINTENANCE_DELETE_BATCH]
+            throttle.wait()
+            report.errors += len(batch) - self.storage.delete_objects(batch)
+
+    def _archive(self, nda_id: UUID, objects: List[StoredObject], throttle: Throttle,
+                 report: MaintenanceReport) -> None:
+        if settings.MAINTENANCE_ARCHIVE_MODE == "prefix":
+            # Перенесённые объекты места не освобождают, и в dry run это известно заранее
+            for obj in objects:
+                if not report.dry_run:
+                    throttle.wait()
+                    self.storage.move_object(obj.path, f"archive/{obj.path}")
+                report.archive_objects_written += 1
+                report.archive_bytes_written += obj.size
+            return
+        if report.dry_run:
+            return
+
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+            for obj in objects:
+                throttle.wait()
+                data = self.storage.get_object(obj.path)
+                info = tarfile.TarInfo(obj.path.split("/", 2)[2])
+                info.size = len(data)
+                info.mtime = obj.modified
+                tar.addfile(info, io.BytesIO(data))
+        archive = buffer.getvalue()
+        throttle.wait()
+        self.storage.put_object(f"archive/nda/{nda_id}.tar.gz", archive, "application/gzip")
+        report.archive_objects_written += 1
+        report.archive_bytes_written += len(archive)
+        self._delete([obj.path for obj in objects], throttle, report)
+
+    def _process_ndas(self, throttle: Throttle, report: MaintenanceReport) -> None:
+        now = time.time()
+        expire_after = settings.MAINTENANCE_DRAFT_TTL_DAYS * _DAY
+        archive_after = settings.MAINTENANCE_ARCHIVE_AFTER_DAYS * _DAY
+        expire_statuses = {NDAStatus(s.strip()) for s in settings.MAINTENANCE_EXPIRE_STATUSES.split(",") if s.strip()}
+        thresholds = [age for age in (expire_after, archive_after) if age > 0]
+        if not thresholds:
+            return
+
+        folders: Dict[str, List[StoredObject]] = defaultdict(list)
+        for obj in self._list_sharded("nda/"):
+            folders[obj.path.split("/")[1]].append(obj)
+
+        removed: List[UUID] = []
+        pending_deletes: List[str] = []
+        for folder, objects in folders.items():
+            if self._stop.is_set():
+                break
+            report.scanned_ndas += 1
+            idle = now - max(obj.modified for obj in objects)
+            if idle < min(thresholds):
+                continue
+            try:
+                nda_id = UUID(folder)
+            except ValueError:
+                continue
+
+            throttle.wait()
+            metadata = self.storage.get_metadata_uncached(nda_id)
+            if metadata is None:
+                # Папка без meta.json: остаток прерванной записи или удаления
+                if expire_after and idle >= expire_after:
+                    report.add("orphaned", objects)
+                    pending_deletes.extend(obj.path for obj in objects)
+                continue
+
+            status = metadata.status
+            if expire_after and status in expire_statuses and idle >= expire_after:
+                report.add("expired", objects)
+                pending_deletes.extend(obj.path for obj in objects)
+                removed.append(nda_id)
+            elif archive_after and status == NDAStatus.SUBMITTED and idle >= archive_after:
+                try:
+                    self._archive(nda_id, objects, throttle, report)
+                except Exception:
+                    report.errors += 1
+                    logger.exception("Failed to archive NDA %s", nda_id)
+                    continue
+                report.add("archived", objects)
+                removed.append(nda_id)
+
+            if len(pending_deletes) >= settings.MAINTENANCE_DELETE_BATCH:
+                self._delete(pending_deletes, throttle, report)
+                pending_deletes = []
+
+        self._delete(pending_deletes, throttle, report)
+        if removed and not report.dry_run:
+            for nda_id in removed:
+                self.storage.metadata_cache.pop(nda_id)
+            if nda_index is not None:
+                nda_index.delete(removed)
+
+    def _process_caches(self, throttle: Throttle, report: MaintenanceReport) -> None:
+        now = time.time()
+        for prefix, ttl in cache_ttls().items():
+            if self._stop.is_set():
+                return
+            stale = [obj for obj in self._list_sharded(prefix) if now - obj.modified > ttl]
+            if stale:
+                report.add("cache", stale, ndas=0)
+                self._delete([obj.path for obj in stale], throttle, report)
+
+    def _run(self, dry_run: bool) -> Dict[str, Any]:
+        started = time.monotonic()
+        report = MaintenanceReport(dry_run)
+        throttle = Throttle(settings.MAINTENANCE_OPS_PER_SECOND, self._stop)
+
+        self._process_ndas(throttle, report)
+        self._process_caches(throttle, report)
+
+        result = report.as_dict(time.monotonic() - started, throttle.waited_seconds)
+        if not dry_run:
+            maintenance_reclaimed.inc(result["reclaimed_bytes"], kind="all", unit="bytes")
+            maintenance_reclaimed.inc(result["reclaimed_objects"], kind="all", unit="objects")
+        self.runs += 1
+        self.last_report = result
+        logger.info("Maintenance finished: %s", result)
+        return result
+
+    def run_once(self, dry_run: bool = False, lock: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Один проход обслуживания. С lock=True запуск идёт под файловой блокировкой,
+        чтобы воркеры uvicorn и ручной запуск не работали одновременно;
+        если блокировку держит другой процесс, возвращает None.
+        """
+        if not lock:
+            return self._run(dry_run)
+        lock_path = Path(settings.MAINTENANCE_LOCK_PATH)
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(lock_path, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                logger.info("Maintenance skipped: another run holds %s", lock_path)
+                return None
+            try:
+                return self._run(dry_run)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _loop(self) -> None:
+        while not self._stop.wait(settings.MAINTENANCE_INTERVAL_SECONDS):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Maintenance run failed")
+
+    def start(self) -> None:
+        if settings.MAINTENANCE_INTERVAL_SECONDS <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="maintenance", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Останавливает цикл и ждёт текущий запуск: он прерывается между NDA,
+        но начатая пачка удаления или загрузка архива доводится до конца.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(_STOP_TIMEOUT_SECONDS)
+            if self._thread.is_alive():
+                logger.warning("Maintenance run did not finish within %ss", _STOP_TIMEOUT_SECONDS)
+        self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": settings.MAINTENANCE_INTERVAL_SECONDS > 0,
+            "runs": self.runs,
+            "last_report": self.last_report,
+        }
+
+
+maintenance_job = MaintenanceJob(storage)
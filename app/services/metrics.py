@@ -0,0 +1,295 @@
+import inspect
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from app.config import settings
+
+# Границы по умолчанию рассчитаны на операции от миллисекунды до десятков секунд
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            *self.samples(),
+        ]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """Текущее значение; с collect значение вычисляется в момент выгрузки метрик"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 collect: Optional[Callable[[], Dict[LabelValues, float]]] = None):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._collect = collect
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    @contextmanager
+    def track(self, **labels: str) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def samples(self) -> Iterator[str]:
+        if self._collect is not None:
+            values = list(self._collect().items())
+        else:
+            with self._lock:
+                values = list(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [счётчики по границам (без накопления), сумма, количество]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = [(key, list(counts), total, count) for key, (counts, total, count) in self._values.items()]
+        for key, counts, total, count in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(float(bound))}"'
+                yield f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.label_names, key)} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus (version 0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", ("method", "route")
+))
+http_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests being processed"
+))
+nda_stage_duration = registry.register(Histogram(
+    "nda_stage_duration_seconds", "Time spent in NDA generation pipeline stages", ("stage",)
+))
+storage_operation_duration = registry.register(Histogram(
+    "storage_operation_duration_seconds", "Storage backend call latency", ("backend", "operation")
+))
+storage_operation_errors = registry.register(Counter(
+    "storage_operation_errors_total", "Storage backend calls that raised", ("backend", "operation")
+))
+storage_in_flight = registry.register(Gauge(
+    "storage_operations_in_flight", "Storage backend calls in progress", ("backend",)
+))
+storage_bytes = registry.register(Counter(
+    "storage_bytes_total", "Bytes transferred to and from storage", ("backend", "direction")
+))
+
+
+def stage(name: str):
+    """Замер стадии генерации NDA: with stage("template_fetch"): ..."""
+    if not settings.METRICS_ENABLED:
+        return nullcontext()
+    return nda_stage_duration.time(stage=name)
+
+
+@contextmanager
+def _measure_storage(backend: str, operation: str) -> Iterator[None]:
+    storage_in_flight.inc(backend=backend)
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        storage_operation_errors.inc(backend=backend, operation=operation)
+        raise
+    finally:
+        storage_operation_duration.observe(
+            time.perf_counter() - started, backend=backend, operation=operation
+        )
+        storage_in_flight.dec(backend=backend)
+
+
+def storage_operation(fn: Callable) -> Callable:
+    """
+    Время, ошибки и число одновременных вызовов метода бэкенда хранилища.
+    У генераторов (листинги) замеряется весь обход, а не создание генератора.
+    """
+    operation = fn.__name__.lstrip("_")
+
+    if inspect.isgeneratorfunction(fn):
+        @wraps(fn)
+        def generator_wrapper(self, *args, **kwargs):
+            if not settings.METRICS_ENABLED:
+                yield from fn(self, *args, **kwargs)
+                return
+            with _measure_storage(self.name, operation):
+                yield from fn(self, *args, **kwargs)
+
+        return generator_wrapper
+
+    @wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        if not settings.METRICS_ENABLED:
+            return fn(self, *args, **kwargs)
+        with _measure_storage(self.name, operation):
+            return fn(self, *args, **kwargs)
+
+    return wrapper
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: латентность, статусы и число запросов в обработке.
+
+    Маршрут берётся из шаблона пути (/nda/{nda_id}), а не из URL, чтобы
+    число рядов не росло с каждым новым ID; запросы мимо маршрутов
+    попадают в "unmatched".
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            http_in_flight.dec()
+            route = scope.get("route")
+            route_name = getattr(route, "path_format", None) or "unmatched"
+            http_request_duration.observe(elapsed, method=scope["method"], route=route_name)
+            http_requests.inc(method=scope["method"], route=route_name, status=str(status_code))
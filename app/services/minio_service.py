@@ -1,106 +1,259 @@
 import json
+import logging
+from datetime import datetime, timedelta, timezone
 from io import BytesIO
-from typing import Optional
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
 from uuid import UUID
+import urllib3
 from minio import Minio
+from minio.commonconfig import CopySource
+from minio.deleteobjects import DeleteObject
 from minio.error import S3Error
 from app.config import settings
 from app.models import NDAMetadata, NDAType
+from app.services.http_pool import HttpPool
+from app.services.metrics import storage_bytes, storage_operation
+from app.services.storage import DOCX_CONTENT_TYPE, StaleMetadata, StorageBackend, StoredObject
+from app.services.streams import CountingReader
 
+logger = logging.getLogger(__name__)
+
+# Ответы S3 на не выполненное условие If-Match / параллельную условную запись
+_PRECONDITION_CODES = {"PreconditionFailed", "ConditionalRequestConflict"}
+
+
+class MinIOService(StorageBackend):
+    name = "minio"
 
-class MinIOService:
     def __init__(self):
-        self.client = Minio(
-            settings.MINIO_ENDPOINT,
+        super().__init__()
+        self.http_pool = HttpPool(
+            maxsize=settings.MINIO_POOL_SIZE,
+            connect_timeout=settings.MINIO_CONNECT_TIMEOUT_SECONDS,
+            read_timeout=settings.MINIO_READ_TIMEOUT_SECONDS,
+            retries=settings.MINIO_RETRIES,
+            backoff_factor=settings.MINIO_RETRY_BACKOFF_SECONDS,
+            backoff_jitter=settings.MINIO_RETRY_JITTER_SECONDS,
+            tcp_keepalive=settings.MINIO_TCP_KEEPALIVE
+        )
+        self.client = self._create_client(
+            settings.MINIO_ENDPOINT, settings.MINIO_SECURE, self.http_pool.manager
+        )
+        # Подпись presigned URL не требует сети, но хост должен быть доступен клиенту
+        self.presign_client = self._create_client(
+            settings.MINIO_PUBLIC_ENDPOINT or settings.MINIO_ENDPOINT,
+            settings.MINIO_SECURE if settings.MINIO_PUBLIC_SECURE is None
+            else settings.MINIO_PUBLIC_SECURE
+        )
+        self.bucket_name = settings.MINIO_BUCKET
+
+    def _count_bytes(self, direction: str, amount: int) -> None:
+        storage_bytes.inc(amount, backend=self.name, direction=direction)
+
+    @staticmethod
+    def _create_client(endpoint: str, secure: bool,
+                       http_client: Optional[urllib3.PoolManager] = None) -> Minio:
+        return Minio(
+            endpoint,
             access_key=settings.MINIO_ACCESS_KEY,
             secret_key=settings.MINIO_SECRET_KEY,
-            secure=settings.MINIO_SECURE
+            secure=secure,
+            region=settings.MINIO_REGION,
+            http_client=http_client
         )
-        self.bucket_name = settings.MINIO_BUCKET
-        self._ensure_bucket()
 
-    def _ensure_bucket(self):
+    def ensure_ready(self) -> None:
+        self.ensure_bucket()
+        self.check_conditional_writes()
+
+    @storage_operation
+    def check_conditional_writes(self) -> bool:
+        """
+        Проверяет, что сервер выполняет If-Match на PutObject. Старые MinIO
+        заголовок молча игнорируют, и тогда от потерянных обновлений meta.json
+        защищает только блокировка внутри процесса.
+        """
+        probe_path = ".probe/conditional-put"
+        self._put_with_headers(probe_path, b"", {})
         try:
-            if not self.client.bucket_exists(self.bucket_name):
-                self.client.make_bucket(self.bucket_name)
+            self._put_with_headers(probe_path, b"", {"If-Match": f'"{"0" * 32}"'})
         except S3Error as e:
-            raise Exception(f"MinIO bucket error: {str(e)}")
-
-    def _get_meta_path(self, nda_id: UUID) -> str:
-        return f"nda/{nda_id}/meta.json"
+            if e.code in _PRECONDITION_CODES:
+                return True
+            raise
+        finally:
+            self.client.remove_object(self.bucket_name, probe_path)
+        logger.warning(
+            "MinIO ignores If-Match on PutObject: concurrent meta.json updates from "
+            "several processes can be lost. Use the server release from docker-compose.yml"
+        )
+        return False
 
-    def _get_generated_path(self, nda_id: UUID) -> str:
-        return f"nda/{nda_id}/nda_generated/NDA_{nda_id}.docx"
+    def _put_with_headers(self, object_path: str, data: bytes, headers: Dict[str, str]) -> str:
+        """
+        PutObject с заголовками запроса как есть; возвращает ETag.
 
-    def _get_signed_path(self, nda_id: UUID, filename: str) -> str:
-        return f"nda/{nda_id}/nda_signed/{filename}"
+        Публичный Minio.put_object превращает нестандартные заголовки в
+        x-amz-meta-*, поэтому используется Minio._put_object(bucket, object,
+        data, headers) из minio==7.2.x - версия закреплена в requirements.txt.
+        """
+        return self.client._put_object(self.bucket_name, object_path, data, headers).etag
 
-    def save_metadata(self, metadata: NDAMetadata) -> None:
-        meta_path = self._get_meta_path(metadata.nda_id)
-        meta_json = metadata.model_dump_json(indent=2)
-        
-        self.client.put_object(
-            self.bucket_name,
-            meta_path,
-            BytesIO(meta_json.encode()),
-            length=len(meta_json.encode()),
-            content_type="application/json"
-        )
+    @storage_operation
+    def ensure_bucket(self):
+        try:
+            if not self.client.bucket_exists(self.bucket_name):
+                self.client.make_bucket(self.bucket_name)
+        except S3Error as e:
+            raise Exception(f"MinIO bucket error: {str(e)}")
 
-    def get_metadata(self, nda_id: UUID) -> Optional[NDAMetadata]:
-        meta_path = self._get_meta_path(nda_id)
-        
+    @storage_operation
+    def _load_metadata(self, nda_id: UUID) -> Optional[Tuple[NDAMetadata, str]]:
+        response = None
         try:
-            response = self.client.get_object(self.bucket_name, meta_path)
-            data = json.loads(response.read().decode())
-            return NDAMetadata(**data)
+            response = self.client.get_object(self.bucket_name, self._get_meta_path(nda_id))
+            data = response.read()
+            self._count_bytes("download", len(data))
+            metadata = NDAMetadata(**json.loads(data.decode()))
+            return metadata, response.headers.get("etag", "").strip('"')
         except S3Error:
             return None
         finally:
-            if 'response' in locals():
+            if response is not None:
                 response.close()
                 response.release_conn()
 
-    def save_generated_docx(self, nda_id: UUID, docx_bytes: bytes) -> str:
-        docx_path = self._get_generated_path(nda_id)
+    @storage_operation
+    def _store_metadata(self, metadata: NDAMetadata, if_match: Optional[str]) -> str:
+        meta_path = self._get_meta_path(metadata.nda_id)
+        meta_json = metadata.model_dump_json(indent=2).encode()
+        
+        headers = {"Content-Type": "application/json"}
+        if if_match is not None:
+            headers["If-Match"] = f'"{if_match}"'
         
+        try:
+            etag = self._put_with_headers(meta_path, meta_json, headers)
+            self._count_bytes("upload", len(meta_json))
+            return etag
+        except S3Error as e:
+            if e.code in _PRECONDITION_CODES:
+                raise StaleMetadata(str(e))
+            raise
+
+    @storage_operation
+    def list_nda_ids(self, prefix: str = "") -> Iterator[UUID]:
+        objects = self.client.list_objects(self.bucket_name, prefix=f"nda/{prefix}", recursive=False)
+        for obj in objects:
+            try:
+                yield UUID(obj.object_name.split("/")[1])
+            except (IndexError, ValueError):
+                continue
+
+    @storage_operation
+    def list_objects(self, prefix: str) -> Iterator[StoredObject]:
+        for obj in self.client.list_objects(self.bucket_name, prefix=prefix, recursive=True):
+            yield StoredObject(obj.object_name, obj.size or 0, obj.last_modified.timestamp())
+
+    @storage_operation
+    def put_object(self, object_path: str, data: bytes,
+                   content_type: str = "application/octet-stream") -> str:
         self.client.put_object(
-            self.bucket_name,
-            docx_path,
-            BytesIO(docx_bytes),
-            length=len(docx_bytes),
-            content_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+            self.bucket_name, object_path, BytesIO(data), length=len(data), content_type=content_type
         )
-        
-        return docx_path
-    
+        self._count_bytes("upload", len(data))
+        return object_path
+
+    @storage_operation
+    def move_object(self, source_path: str, target_path: str) -> None:
+        """Серверное копирование и удаление исходника (объекты NDA меньше 5 ГБ)"""
+        self.client.copy_object(self.bucket_name, target_path, CopySource(self.bucket_name, source_path))
+        self.client.remove_object(self.bucket_name, source_path)
+
+    @storage_operation
+    def delete_objects(self, object_paths: List[str]) -> int:
+        """Один DeleteObjects-запрос на пачку (до 1000 ключей)"""
+        errors = list(self.client.remove_objects(
+            self.bucket_name, (DeleteObject(path) for path in object_paths)
+        ))
+        for error in errors:
+            logger.warning("Failed to delete %s: %s", error.name, error.message)
+        return len(object_paths) - len(errors)
+
+    @storage_operation
     def save_generated_docx_by_type(self, nda_id: UUID, docx_bytes: bytes, nda_type: NDAType) -> str:
         """Сохраняет DOCX документ с указанием типа (eng или ru_en)"""
-        docx_path = f"nda/{nda_id}/nda_generated/NDA_{nda_type}_{nda_id}.docx"
+        docx_path = self._get_generated_path(nda_id, nda_type)
         
         self.client.put_object(
             self.bucket_name,
             docx_path,
             BytesIO(docx_bytes),
             length=len(docx_bytes),
-            content_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+            content_type=DOCX_CONTENT_TYPE
         )
+        self._count_bytes("upload", len(docx_bytes))
         
         return docx_path
 
-    def get_presigned_url(self, object_path: str, expiry_seconds: Optional[int] = None) -> str:
+    @storage_operation
+    def cache_generated_docx(self, key: str, source_path: str) -> None:
+        """Копирует уже загруженный DOCX в кэш генерации на стороне MinIO, без повторной загрузки"""
+        self.client.copy_object(
+            self.bucket_name,
+            self._get_generation_cache_path(key),
+            CopySource(self.bucket_name, source_path)
+        )
+
+    @storage_operation
+    def get_cached_generation(self, key: str, max_age_seconds: int) -> Optional[bytes]:
+        cache_path = self._get_generation_cache_path(key)
+        
+        try:
+            stat = self.client.stat_object(self.bucket_name, cache_path)
+        except S3Error:
+            return None
+        
+        age = (datetime.now(timezone.utc) - stat.last_modified).total_seconds()
+        if age > max_age_seconds:
+            return None
+        
+        response = None
+        try:
+            response = self.client.get_object(self.bucket_name, cache_path)
+            data = response.read()
+            self._count_bytes("download", len(data))
+            return data
+        except S3Error:
+            return None
+        finally:
+            if response is not None:
+                response.close()
+                response.release_conn()
+
+    @storage_operation
+    def get_presigned_url(self, object_path: str, expiry_seconds: Optional[int] = None,
+                          filename: Optional[str] = None) -> str:
         if expiry_seconds is None:
             expiry_seconds = settings.PRESIGNED_URL_EXPIRY_SECONDS
         
-        from datetime import timedelta
-        url = self.client.presigned_get_object(
+        response_headers = None
+        if filename:
+            response_headers = {
+                "response-content-disposition": f'attachment; filename="{filename}"'
+            }
+        
+        url = self.presign_client.presigned_get_object(
             self.bucket_name,
             object_path,
-            expires=timedelta(seconds=expiry_seconds)
+            expires=timedelta(seconds=expiry_seconds),
+            response_headers=response_headers
         )
         return url
 
-    def save_signed_file(self, nda_id: UUID, file_data: bytes, filename: str) -> str:
+    @storage_operation
+    def save_signed_file(self, nda_id: UUID, file_data: bytes, filename: str,
+                         content_type: str = "application/octet-stream") -> str:
         signed_path = self._get_signed_path(nda_id, filename)
         
         self.client.put_object(
@@ -108,24 +261,79 @@ class MinIOService:
             signed_path,
             BytesIO(file_data),
             length=len(file_data),
-            content_type="application/octet-stream"
+            content_type=content_type
         )
+        self._count_bytes("upload", len(file_data))
         
         return signed_path
 
+    @storage_operation
+    def stat_template(self, template_name: str) -> str:
+        """Возвращает ETag шаблона без скачивания содержимого"""
+        template_path = self._get_template_path(template_name)
+        
+        try:
+            return self.client.stat_object(self.bucket_name, template_path).etag
+        except S3Error as e:
+            raise FileNotFoundError(f"Template '{template_name}' not found in MinIO: {str(e)}")
+
+    @storage_operation
+    def save_signed_stream(self, nda_id: UUID, stream: BinaryIO, filename: str,
+                           content_type: str = "application/octet-stream") -> str:
+        """
+        Загружает подписанный файл из потока частями по UPLOAD_PART_SIZE_MB.
+        Части отправляются последовательно, поэтому в памяти одновременно
+        находится не больше одной части, независимо от размера файла.
+        """
+        signed_path = self._get_signed_path(nda_id, filename)
+        reader = CountingReader(stream)
+        
+        try:
+            self.client.put_object(
+                self.bucket_name,
+                signed_path,
+                reader,
+                length=-1,
+                part_size=settings.UPLOAD_PART_SIZE_MB * 1024 * 1024,
+                num_parallel_uploads=1,
+                content_type=content_type
+            )
+        finally:
+            self._count_bytes("upload", reader.bytes_read)
+        
+        return signed_path
+
+    @storage_operation
+    def get_object(self, object_path: str) -> bytes:
+        response = None
+        try:
+            response = self.client.get_object(self.bucket_name, object_path)
+            data = response.read()
+            self._count_bytes("download", len(data))
+            return data
+        except S3Error as e:
+            raise FileNotFoundError(f"Object '{object_path}' not found in MinIO: {str(e)}")
+        finally:
+            if response is not None:
+                response.close()
+                response.release_conn()
+
+    @storage_operation
     def get_template(self, template_name: str) -> bytes:
-        template_path = f"templates/{template_name}"
+        template_path = self._get_template_path(template_name)
         
+        response = None
         try:
             response = self.client.get_object(self.bucket_name, template_path)
             data = response.read()
+            self._count_bytes("download", len(data))
             return data
         except S3Error as e:
             raise FileNotFoundError(f"Template '{template_name}' not found in MinIO: {str(e)}")
         finally:
-            if 'response' in locals():
+            if response is not None:
                 response.close()
                 response.release_conn()
 
-
-minio_service = MinIOService()
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "pool": self.http_pool.stats()}
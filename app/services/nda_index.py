@@ -0,0 +1,203 @@
+import base64
+import logging
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from uuid import UUID
+from app.config import settings
+from app.models import NDAMetadata, NDAStatus
+
+logger = logging.getLogger(__name__)
+
+# Поля, по которым ищется компания, в порядке приоритета для отображения
+_COMPANY_FIELDS = ("company_name", "company_name_en", "company_name_ru")
+
+
+def _company(metadata: NDAMetadata) -> Tuple[Optional[str], str]:
+    """Название для ответа и строка поиска (все варианты названия в нижнем регистре)"""
+    names = [str(metadata.fields[f]) for f in _COMPANY_FIELDS if metadata.fields.get(f)]
+    return (names[0] if names else None), "\n".join(names).casefold()
+
+
+def _timestamp(value: Union[date, datetime], end_of_day: bool = False) -> str:
+    """
+    created_at хранится как naive UTC в ISO, чтобы строки сравнивались как даты.
+    Дата без времени - начало дня, с end_of_day - начало следующего (граница "to" включает день).
+    """
+    if not isinstance(value, datetime):
+        value = datetime.combine(value + timedelta(days=1) if end_of_day else value, dt_time())
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
+
+
+def encode_cursor(created_at: str, nda_id: str) -> str:
+    return base64.urlsafe_b64encode(f"{created_at}|{nda_id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        created_at, nda_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+    except Exception:
+        raise ValueError("Invalid cursor")
+    return created_at, nda_id
+
+
+class NDAIndex:
+    """
+    Вторичный индекс NDA по статусу, дате и компании в SQLite.
+
+    Хранилище остаётся источником истины: индекс обновляется при каждом
+    save_metadata, а при расхождении (ошибка записи, несколько узлов,
+    ручные правки в бакете) пересобирается scripts/rebuild_index.py.
+    indexed_at защищает от перезаписи свежей строки более старым снимком
+    во время пересборки.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.errors = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS nda_index (
+                    nda_id TEXT PRIMARY KEY,
+                    type TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    company TEXT,
+                    company_search TEXT NOT NULL DEFAULT '',
+                    indexed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS nda_by_status ON nda_index (status, created_at, nda_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS nda_by_date ON nda_index (created_at, nda_id)")
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _row(metadata: NDAMetadata, indexed_at: float) -> tuple:
+        company, search = _company(metadata)
+        return (
+            str(metadata.nda_id), metadata.type.value, metadata.status.value,
+            _timestamp(metadata.created_at), company, search, indexed_at,
+        )
+
+    def upsert_many(self, entries: Iterable[Tuple[NDAMetadata, float]]) -> None:
+        """Записи (metadata, момент чтения); более старый снимок не перезаписывает новый"""
+        rows = [self._row(metadata, indexed_at) for metadata, indexed_at in entries]
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("""
+                    INSERT INTO nda_index (nda_id, type, status, created_at, company, company_search, indexed_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (nda_id) DO UPDATE SET
+                        type = excluded.type, status = excluded.status,
+                        created_at = excluded.created_at, company = excluded.company,
+                        company_search = excluded.company_search, indexed_at = excluded.indexed_at
+                    WHERE excluded.indexed_at >= nda_index.indexed_at
+                """, rows)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def upsert(self, metadata: NDAMetadata) -> None:
+        """Вызывается после записи meta.json; ошибка индекса не должна ломать запрос"""
+        try:
+            self.upsert_many([(metadata, time.time())])
+        except sqlite3.Error:
+            self.errors += 1
+            logger.exception("Failed to index NDA %s", metadata.nda_id)
+
+    def delete(self, nda_ids: Iterable[UUID]) -> None:
+        with self._lock:
+            self._connection().executemany(
+                "DELETE FROM nda_index WHERE nda_id = ?", [(str(nda_id),) for nda_id in nda_ids]
+            )
+
+    def prune(self, older_than: float) -> int:
+        """Удаляет строки, которые не обновлялись с older_than (после пересборки - удалённые NDA)"""
+        with self._lock:
+            return self._connection().execute(
+                "DELETE FROM nda_index WHERE indexed_at < ?", (older_than,)
+            ).rowcount
+
+    def query(self, status: Optional[NDAStatus] = None, date_from: Optional[Union[date, datetime]] = None,
+              date_to: Optional[Union[date, datetime]] = None, company: Optional[str] = None,
+              limit: int = 50, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Страница NDA, новые первыми, и курсор следующей страницы"""
+        conditions, params = [], []
+        if status is not None:
+            conditions.append("status = ?")
+            params.append(status.value)
+        if date_from is not None:
+            conditions.append("created_at >= ?")
+            params.append(_timestamp(date_from))
+        if date_to is not None:
+            conditions.append("created_at < ?")
+            params.append(_timestamp(date_to, end_of_day=True))
+        if company:
+            pattern = company.casefold().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            conditions.append("company_search LIKE ? ESCAPE '\\'")
+            params.append(f"%{pattern}%")
+        if cursor:
+            conditions.append("(created_at, nda_id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            rows = self._connection().execute(
+                f"SELECT nda_id, type, status, created_at, company FROM nda_index {where}"
+                " ORDER BY created_at DESC, nda_id DESC LIMIT ?",
+                (*params, limit + 1)
+            ).fetchall()
+
+        items = [
+            {"nda_id": nda_id, "type": nda_type, "status": nda_status,
+             "created_at": created_at, "company": company_name}
+            for nda_id, nda_type, nda_status, created_at, company_name in rows[:limit]
+        ]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor(last[3], last[0])
+        return items, next_cursor
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._connection().execute(
+                "SELECT status, COUNT(*) FROM nda_index GROUP BY status"
+            ).fetchall())
+        return {"by_status": counts, "total": sum(counts.values()), "errors": self.errors}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _create_index() -> Optional[NDAIndex]:
+    if not settings.NDA_INDEX_ENABLED:
+        return None
+    # Объекты memory-бэкенда живут только в процессе, индекс тоже
+    if settings.STORAGE_BACKEND == "memory":
+        return NDAIndex(":memory:")
+    return NDAIndex(settings.NDA_INDEX_PATH)
+
+
+nda_index = _create_index()
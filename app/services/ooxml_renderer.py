@@ -0,0 +1,215 @@
+import re
+import struct
+import zipfile
+import zlib
+from io import BytesIO
+from typing import Dict, Iterator, List, Tuple, Union
+from docx.oxml.parser import OxmlElement, parse_xml
+from lxml import etree
+from app.services.placeholder_plan import PlannedParagraph, compile_pattern, paragraphs_xpath
+_MARKER = re.compile(rb"<(?:\w+:)?t>\xee\x80\x80(\d+)([SE])\xee\x80\x81</(?:\w+:)?t>")
+_INVALID_XML_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+_TEXT_SPECIAL = re.compile("[\t\r\n]")
+
+
+class _Slot:
+    """Содержимое одного run'а (без w:rPr) внутри параграфа с плейсхолдерами"""
+
+    def __init__(self, paragraph: int, run: int, original: bytes):
+        self.paragraph = paragraph
+        self.run = run
+        self.original = original
+
+
+class _RewrittenPart:
+    def __init__(self, info: zipfile.ZipInfo, prefix: str,
+                 segments: List[Union[bytes, _Slot]], paragraphs: List[PlannedParagraph]):
+        self.info = info
+        self.prefix = prefix
+        self.segments = segments
+        self.paragraphs = paragraphs
+
+    def render(self, replacements: Dict[str, str]) -> bytes:
+        texts = []
+        for planned in self.paragraphs:
+            run_texts = planned.render(replacements)
+            texts.append(None if "".join(run_texts) == planned.full_text else run_texts)
+
+        chunks = []
+        for segment in self.segments:
+            if isinstance(segment, bytes):
+                chunks.append(segment)
+                continue
+            run_texts = texts[segment.paragraph]
+            if run_texts is None:
+                chunks.append(segment.original)
+            else:
+                chunks.append(_run_content_xml(run_texts[segment.run], self.prefix))
+        return b"".join(chunks)
+
+
+def _escape(text: str) -> str:
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _run_content_xml(text: str, prefix: str) -> bytes:
+    """Повторяет сериализацию CT_R.text из python-docx: w:t, w:tab и w:br"""
+    if _INVALID_XML_CHARS.search(text):
+        raise ValueError("Field values must not contain control characters")
+
+    tag = f"{prefix}:" if prefix else ""
+    parts = []
+    pos = 0
+    for match in _TEXT_SPECIAL.finditer(text + "\n"):
+        chunk = text[pos:match.start()]
+        if chunk:
+            space = ' xml:space="preserve"' if len(chunk.strip()) < len(chunk) else ""
+            parts.append(f"<{tag}t{space}>{_escape(chunk)}</{tag}t>")
+        if match.start() < len(text):
+            parts.append(f"<{tag}tab/>" if match.group() == "\t" else f"<{tag}br/>")
+        pos = match.end()
+    return "".join(parts).encode()
+
+
+def _dos_datetime(date_time: Tuple[int, ...]) -> Tuple[int, int]:
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+
+def _local_header(info: zipfile.ZipInfo, name: bytes, compress_type: int,
+                  crc: int, compress_size: int, file_size: int) -> bytes:
+    dos_time, dos_date = _dos_datetime(info.date_time)
+    return struct.pack(
+        "<4s2B4HL2L2H", b"PK\003\004", 20, 0, info.flag_bits & 0x800, compress_type,
+        dos_time, dos_date, crc, compress_size, file_size, len(name), 0
+    ) + name
+
+
+def _central_header(info: zipfile.ZipInfo, name: bytes, compress_type: int,
+                    crc: int, compress_size: int, file_size: int, offset: int) -> bytes:
+    dos_time, dos_date = _dos_datetime(info.date_time)
+    return struct.pack(
+        "<4s4B4HL2L5H2L", b"PK\001\002", 20, info.create_system, 20, 0,
+        info.flag_bits & 0x800, compress_type, dos_time, dos_date, crc, compress_size,
+        file_size, len(name), 0, 0, 0, info.internal_attr, info.external_attr, offset
+    ) + name
+
+
+class _CopiedEntry:
+    """Запись архива, которая копируется как есть, без распаковки и повторного сжатия"""
+
+    def __init__(self, info: zipfile.ZipInfo, data: memoryview):
+        self.info = info
+        self.name = info.filename.encode("utf-8")
+        fields = struct.unpack("<4s2B4HL2L2H", data[info.header_offset:info.header_offset + 30])
+        start = info.header_offset + 30 + fields[10] + fields[11]
+        self.raw = data[start:start + info.compress_size]
+        self.header = _local_header(
+            info, self.name, info.compress_type, info.CRC, info.compress_size, info.file_size
+        )
+
+
+class OOXMLTemplate:
+    """
+    Скомпилированный DOCX шаблон для рендеринга без объектной модели python-docx.
+
+    Переписываются только word/document.xml и колонтитулы: XML разбирается
+    один раз, содержимое run'ов с плейсхолдерами заменяется маркерами, и при
+    генерации подставляются готовые фрагменты. Остальные части архива
+    копируются байт в байт в сжатом виде.
+    """
+
+    def __init__(self, entries: List[Union[_CopiedEntry, _RewrittenPart]]):
+        self.entries = entries
+
+    @classmethod
+    def compile(cls, data: bytes, placeholders: List[str]) -> "OOXMLTemplate":
+        pattern = compile_pattern(placeholders)
+        view = memoryview(data)
+        entries = []
+
+        with zipfile.ZipFile(BytesIO(data)) as archive:
+            for info in archive.infolist():
+                xpath = paragraphs_xpath(info.filename)
+                if xpath:
+                    entries.append(cls._compile_part(info, archive.read(info), pattern, xpath))
+                else:
+                    entries.append(_CopiedEntry(info, view))
+
+        return cls(entries)
+
+    @staticmethod
+    def _compile_part(info: zipfile.ZipInfo, xml: bytes, pattern, xpath: str) -> _RewrittenPart:
+        root = parse_xml(xml)
+        paragraphs = []
+        slot_count = 0
+
+        for p in root.xpath(xpath):
+            planned = PlannedParagraph.from_element(p, pattern)
+            if planned is None:
+                continue
+            for r in p.r_lst:
+                start, end = OxmlElement("w:t"), OxmlElement("w:t")
+                start.text = f"\ue000{slot_count}S\ue001"
+                end.text = f"\ue000{slot_count}E\ue001"
+                r.insert(1 if r.rPr is not None else 0, start)
+                r.append(end)
+                slot_count += 1
+            paragraphs.append(planned)
+
+        serialized = etree.tostring(root, encoding="UTF-8", standalone=True)
+        segments: List[Union[bytes, _Slot]] = []
+        slots = []
+        for p_idx, planned in enumerate(paragraphs):
+            slots.extend((p_idx, r_idx) for r_idx in range(len(planned.run_pieces)))
+
+        pos = 0
+        markers = _MARKER.finditer(serialized)
+        for start in markers:
+            end = next(markers)
+            p_idx, r_idx = slots[int(start.group(1))]
+            segments.append(serialized[pos:start.start()])
+            segments.append(_Slot(p_idx, r_idx, serialized[start.end():end.start()]))
+            pos = end.end()
+        segments.append(serialized[pos:])
+
+        return _RewrittenPart(info, root.prefix or "", segments, paragraphs)
+
+    def stream(self, replacements: Dict[str, str]) -> Iterator[bytes]:
+        offset = 0
+        central = []
+
+        for entry in self.entries:
+            info = entry.info
+            name = info.filename.encode("utf-8")
+            if isinstance(entry, _CopiedEntry):
+                compress_type, crc = info.compress_type, info.CRC
+                compress_size, file_size = info.compress_size, info.file_size
+                chunks = (entry.header, entry.raw)
+            else:
+                xml = entry.render(replacements)
+                compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+                compressed = compressor.compress(xml) + compressor.flush()
+                compress_type, crc = zipfile.ZIP_DEFLATED, zlib.crc32(xml)
+                compress_size, file_size = len(compressed), len(xml)
+                chunks = (
+                    _local_header(info, name, compress_type, crc, compress_size, file_size),
+                    compressed
+                )
+
+            central.append(
+                _central_header(info, name, compress_type, crc, compress_size, file_size, offset)
+            )
+            for chunk in chunks:
+                offset += len(chunk)
+                yield chunk
+
+        directory = b"".join(central)
+        yield directory
+        yield struct.pack(
+            "<4s4H2LH", b"PK\005\006", 0, 0, len(central), len(central),
+            len(directory), offset, 0
+        )
+
+    def render(self, replacements: Dict[str, str]) -> bytes:
+        return b"".join(self.stream(replacements))
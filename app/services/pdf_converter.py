@@ -0,0 +1,406 @@
+import fcntl
+import hashlib
+import logging
+import os
+import signal
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from uuid import UUID
+from app.config import settings
+from app.models import NDAMetadata, NDAType, PDFStatus
+from app.services.metrics import stage
+from app.services.storage import PDF_CONTENT_TYPE, StorageBackend, storage
+
+logger = logging.getLogger(__name__)
+
+
+class ConversionFailed(Exception):
+    """LibreOffice завершился с ошибкой, по таймауту или не создал PDF"""
+
+
+class PDFJob(NamedTuple):
+    nda_id: UUID
+    nda_type: NDAType
+    docx_path: str
+    # Ключ генерации DOCX (generation_keys в meta.json), из которого делается PDF
+    source_key: str
+    # Растёт при каждой постановке в очередь: результат старой генерации не записывается
+    generation: int
+    attempts: int
+
+
+class SofficeConverter:
+    """
+    Конвертер на headless LibreOffice с собственным профилем.
+
+    Профиль (UserInstallation) создаётся при первой конвертации и дальше
+    переиспользуется, поэтому холодный старт с инициализацией профиля
+    оплачивается один раз на воркер. Два процесса soffice с одним профилем
+    мешают друг другу, поэтому профиль закреплён за слотом воркера.
+    """
+
+    def __init__(self, binary: str, profile_dir: Path, timeout: float):
+        self.binary = binary
+        self.profile_dir = profile_dir
+        self.timeout = timeout
+
+    def convert(self, docx_bytes: bytes) -> bytes:
+        with tempfile.TemporaryDirectory(prefix="nda-pdf-") as workdir:
+            source = Path(workdir) / "document.docx"
+            source.write_bytes(docx_bytes)
+            command = [
+                self.binary,
+                f"-env:UserInstallation={self.profile_dir.resolve().as_uri()}",
+                "--headless", "--invisible", "--nologo", "--norestore", "--nolockcheck",
+                "--convert-to", "pdf:writer_pdf_Export", "--outdir", workdir, str(source),
+            ]
+            # Своя группа процессов: по таймауту завершается и дочерний soffice.bin
+            process = subprocess.Popen(
+                command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=True
+            )
+            try:
+                _, stderr = process.communicate(timeout=self.timeout)
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.communicate()
+                raise ConversionFailed(f"Conversion timed out after {self.timeout:.0f}s")
+
+            result = Path(workdir) / "document.pdf"
+            if process.returncode != 0 or not result.is_file():
+                message = stderr.decode(errors="replace").strip()[-500:]
+                raise ConversionFailed(f"soffice exited with code {process.returncode}: {message}")
+            return result.read_bytes()
+
+
+class PDFJobStore:
+    """
+    Очередь конвертаций в SQLite, общая для всех процессов приложения.
+
+    Одна строка на (NDA, тип документа). Выборка продлевает next_attempt_at
+    на время конвертации (аренда): задача упавшего воркера после истечения
+    аренды достаётся другому.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.path != ":memory:":
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pdf_jobs (
+                    nda_id TEXT NOT NULL,
+                    nda_type TEXT NOT NULL,
+                    docx_path TEXT NOT NULL,
+                    source_key TEXT NOT NULL,
+                    generation INTEGER NOT NULL DEFAULT 1,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    pdf_path TEXT,
+                    cached INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (nda_id, nda_type)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS pdf_jobs_due ON pdf_jobs (status, next_attempt_at)")
+            self._conn = conn
+        return self._conn
+
+    def enqueue(self, jobs: List[Tuple[UUID, NDAType, str, str]]) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection().executemany("""
+                INSERT INTO pdf_jobs (nda_id, nda_type, docx_path, source_key, status, next_attempt_at, updated_at)
+                VALUES (?, ?, ?, ?, 'queued', ?, ?)
+                ON CONFLICT (nda_id, nda_type) DO UPDATE SET
+                    docx_path = excluded.docx_path, source_key = excluded.source_key,
+                    generation = pdf_jobs.generation + 1,
+                    status = 'queued', attempts = 0, next_attempt_at = excluded.next_attempt_at,
+                    pdf_path = NULL, cached = 0, error = NULL, updated_at = excluded.updated_at
+            """, [
+                (str(nda_id), nda_type.value, docx_path, source_key, now, now)
+                for nda_id, nda_type, docx_path, source_key in jobs
+            ])
+
+    def claim(self, lease_seconds: float) -> Optional[PDFJob]:
+        """Следующая задача: поставленная в очередь или брошенная воркером с истёкшей арендой"""
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT nda_id, nda_type, docx_path, source_key, generation, attempts FROM pdf_jobs"
+                    " WHERE status IN ('queued', 'running') AND next_attempt_at <= ?"
+                    " ORDER BY next_attempt_at LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE pdf_jobs SET status = 'running', attempts = attempts + 1,"
+                        " next_attempt_at = ?, updated_at = ? WHERE nda_id = ? AND nda_type = ?",
+                        (now + lease_seconds, now, row[0], row[1])
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        nda_id, nda_type, docx_path, source_key, generation, attempts = row
+        return PDFJob(UUID(nda_id), NDAType(nda_type), docx_path, source_key, generation, attempts + 1)
+
+    def _finish(self, job: PDFJob, assignments: str, params: tuple) -> bool:
+        with self._lock:
+            return self._connection().execute(
+                f"UPDATE pdf_jobs SET {assignments}, updated_at = ?"
+                " WHERE nda_id = ? AND nda_type = ? AND generation = ?",
+                (*params, time.time(), str(job.nda_id), job.nda_type.value, job.generation)
+            ).rowcount > 0
+
+    def complete(self, job: PDFJob, pdf_path: str, cached: bool) -> bool:
+        """False, если пока шла конвертация, документ сгенерировали заново"""
+        return self._finish(job, "status = 'done', pdf_path = ?, cached = ?, error = NULL",
+                            (pdf_path, int(cached)))
+
+    def fail(self, job: PDFJob, error: str, retry_at: Optional[float]) -> bool:
+        if retry_at is None:
+            return self._finish(job, "status = 'failed', error = ?", (error,))
+        return self._finish(job, "status = 'queued', next_attempt_at = ?, error = ?", (retry_at, error))
+
+    def get(self, nda_id: UUID, nda_type: NDAType) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT status, source_key, pdf_path, error, attempts FROM pdf_jobs"
+                " WHERE nda_id = ? AND nda_type = ?",
+                (str(nda_id), nda_type.value)
+            ).fetchone()
+        if row is None:
+            return None
+        job_status, source_key, pdf_path, error, attempts = row
+        return {"status": PDFStatus(job_status), "source_key": source_key, "pdf_path": pdf_path,
+                "error": error, "attempts": attempts}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._connection().execute(
+                "SELECT status, COUNT(*) FROM pdf_jobs GROUP BY status"
+            ).fetchall())
+
+
+def pdf_path_for(docx_path: str) -> str:
+    """PDF лежит рядом с DOCX в nda/{id}/nda_generated/ под тем же именем"""
+    return docx_path.rsplit(".", 1)[0] + ".pdf"
+
+
+class PDFConversionService:
+    """
+    Асинхронная конвертация сгенерированных DOCX в PDF.
+
+    /nda/generate только ставит задачу в PDFJobStore; конвертируют
+    PDF_CONVERSION_WORKERS потоков, каждый со своим процессом LibreOffice.
+    Слоты воркеров закреплены файловыми блокировками, поэтому при нескольких
+    процессах uvicorn на хосте работает не больше PDF_CONVERSION_WORKERS
+    конвертеров. Результат кэшируется в cache/pdf/ по SHA-256 содержимого
+    DOCX: одинаковый документ не конвертируется дважды.
+    """
+
+    def __init__(self, storage: StorageBackend, jobs: PDFJobStore, workers: int):
+        self.storage = storage
+        self.jobs = jobs
+        self.workers = workers
+        self.converted = 0
+        self.cache_hits = 0
+        self.failures = 0
+        self.active_slots = 0
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._digest_locks: Dict[str, threading.Lock] = {}
+        self._digest_locks_guard = threading.Lock()
+
+    def enqueue(self, jobs: List[Tuple[UUID, NDAType, str, str]]) -> None:
+        """Задачи (nda_id, тип, путь к DOCX, ключ генерации); повторная постановка заменяет прежнюю задачу"""
+        if jobs:
+            self.jobs.enqueue(jobs)
+            self._wake.set()
+
+    def _digest_lock(self, digest: str) -> threading.Lock:
+        # Одинаковые документы, пришедшие одновременно, конвертирует один воркер
+        with self._digest_locks_guard:
+            return self._digest_locks.setdefault(digest, threading.Lock())
+
+    def _release_digest_lock(self, digest: str) -> None:
+        with self._digest_locks_guard:
+            lock = self._digest_locks.get(digest)
+            if lock is not None and not lock.locked():
+                del self._digest_locks[digest]
+
+    def _convert(self, docx_bytes: bytes, converter: SofficeConverter) -> Tuple[bytes, bool]:
+        """PDF и признак попадания в кэш"""
+        digest = hashlib.sha256(docx_bytes).hexdigest()
+        try:
+            with self._digest_lock(digest):
+                with stage("pdf_cache_lookup"):
+                    cached = self.storage.get_cached_pdf(digest)
+                if cached is not None:
+                    return cached, True
+                with stage("pdf_convert"):
+                    pdf_bytes = converter.convert(docx_bytes)
+                self.storage.cache_pdf(digest, pdf_bytes)
+                return pdf_bytes, False
+        finally:
+            self._release_digest_lock(digest)
+
+    def _process(self, job: PDFJob, converter: SofficeConverter) -> None:
+        docx_bytes = self.storage.get_object(job.docx_path)
+        pdf_bytes, cached = self._convert(docx_bytes, converter)
+        pdf_path = pdf_path_for(job.docx_path)
+        with stage("pdf_upload"):
+            self.storage.put_object(pdf_path, pdf_bytes, PDF_CONTENT_TYPE)
+
+        if not self.jobs.complete(job, pdf_path, cached):
+            return
+        if cached:
+            self.cache_hits += 1
+        else:
+            self.converted += 1
+
+        type_key = str(job.nda_type.value)
+
+        def record_pdf(meta: NDAMetadata) -> None:
+            # DOCX успели перегенерировать: этот PDF уже не соответствует документу
+            if meta.generation_keys.get(type_key) == job.source_key:
+                meta.files.setdefault("pdf", {})[type_key] = pdf_path
+
+        self.storage.update_metadata(job.nda_id, record_pdf)
+
+    def _run_job(self, job: PDFJob, converter: SofficeConverter) -> None:
+        if job.attempts > settings.PDF_CONVERSION_MAX_ATTEMPTS:
+            # Аренда истекала каждый раз: воркер падает или зависает на этом документе
+            self.jobs.fail(job, "Conversion did not finish within the attempt limit", None)
+            return
+        try:
+            self._process(job, converter)
+        except Exception as e:
+            self.failures += 1
+            error = str(e) or type(e).__name__
+            retry_at = None
+            # Без исходного DOCX повтор бессмыслен
+            if not isinstance(e, FileNotFoundError) and job.attempts < settings.PDF_CONVERSION_MAX_ATTEMPTS:
+                retry_at = time.time() + settings.PDF_CONVERSION_RETRY_BASE_SECONDS * 2 ** (job.attempts - 1)
+            self.jobs.fail(job, error, retry_at)
+            logger.warning("PDF conversion of NDA %s (%s) failed, attempt %d: %s",
+                           job.nda_id, job.nda_type.value, job.attempts, error)
+
+    def _acquire_slot(self, slot: int):
+        """Файловая блокировка слота; None, если сервис останавливается"""
+        profile_root = Path(settings.PDF_CONVERSION_PROFILE_DIR)
+        profile_root.mkdir(parents=True, exist_ok=True)
+        lock_file = open(profile_root / f"worker-{slot}.lock", "a")
+        while not self._stop.is_set():
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return lock_file
+            except BlockingIOError:
+                # Слот занят воркером другого процесса
+                self._stop.wait(5)
+        lock_file.close()
+        return None
+
+    def _worker(self, slot: int) -> None:
+        lock_file = self._acquire_slot(slot)
+        if lock_file is None:
+            return
+        self.active_slots += 1
+        converter = SofficeConverter(
+            settings.PDF_CONVERTER_BINARY,
+            Path(settings.PDF_CONVERSION_PROFILE_DIR) / f"worker-{slot}",
+            settings.PDF_CONVERSION_TIMEOUT_SECONDS,
+        )
+        lease = settings.PDF_CONVERSION_TIMEOUT_SECONDS + 60
+        try:
+            while not self._stop.is_set():
+                try:
+                    job = self.jobs.claim(lease)
+                except sqlite3.Error:
+                    logger.exception("Failed to claim PDF conversion job")
+                    job = None
+                if job is None:
+                    self._wake.wait(1)
+                    self._wake.clear()
+                    continue
+                self._run_job(job, converter)
+        finally:
+            self.active_slots -= 1
+            lock_file.close()
+
+    def start(self) -> None:
+        if self._threads:
+            return
+        self._stop.clear()
+        for slot in range(self.workers):
+            thread = threading.Thread(target=self._worker, args=(slot,), name=f"pdf-worker-{slot}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        """Не ждёт текущие конвертации: их задачи после истечения аренды заберёт другой воркер"""
+        self._stop.set()
+        self._wake.set()
+        self._threads = []
+
+    def status(self, nda_id: UUID, nda_type: NDAType,
+               metadata: NDAMetadata) -> Tuple[PDFStatus, Optional[str], Optional[str]]:
+        """
+        Статус, путь к PDF и ошибка. Для DOCX, сгенерированного до включения
+        конвертации (или на узле с другой очередью), задача ставится при первом опросе.
+        """
+        type_key = str(nda_type.value)
+        source_key = metadata.generation_keys.get(type_key, "")
+        pdf_path = metadata.files.get("pdf", {}).get(type_key)
+        job = self.jobs.get(nda_id, nda_type)
+
+        if job is not None and job["source_key"] == source_key:
+            if job["status"] == PDFStatus.DONE:
+                return PDFStatus.DONE, job["pdf_path"], None
+            return job["status"], None, job["error"]
+        if pdf_path is not None:
+            return PDFStatus.DONE, pdf_path, None
+
+        self.enqueue([(nda_id, nda_type, metadata.files["generated"][type_key], source_key)])
+        return PDFStatus.QUEUED, None, None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "active_slots": self.active_slots,
+            "converted": self.converted,
+            "cache_hits": self.cache_hits,
+            "failures": self.failures,
+            "jobs": self.jobs.stats(),
+        }
+
+
+def _create_service() -> Optional[PDFConversionService]:
+    if not settings.PDF_CONVERSION_ENABLED:
+        return None
+    # Объекты memory-бэкенда живут только в процессе, очередь тоже
+    path = ":memory:" if settings.STORAGE_BACKEND == "memory" else settings.PDF_CONVERSION_QUEUE_PATH
+    return PDFConversionService(storage, PDFJobStore(path), settings.PDF_CONVERSION_WORKERS)
+
+
+pdf_conversion = _create_service()
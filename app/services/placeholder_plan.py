@@ -0,0 +1,177 @@
+import re
+from typing import Dict, Iterator, List, Optional, Pattern, Tuple, Union
+from docx import Document
+from docx.text.paragraph import Paragraph
+
+# Кусок текста run'а: либо литерал, либо (плейсхолдер, исходный фрагмент, начало плейсхолдера)
+Piece = Union[str, Tuple[str, str, bool]]
+
+
+# Части DOCX с плейсхолдерами и параграфы в них - одни и те же для обоих движков
+REWRITTEN_PARTS = re.compile(r"^word/(document|header\d*|footer\d*)\.xml$")
+DOCUMENT_PART = "word/document.xml"
+PARAGRAPHS_XPATH = {
+    "document": "./w:body/w:p | ./w:body/w:tbl/w:tr/w:tc/w:p",
+    "part": "./w:p | ./w:tbl/w:tr/w:tc/w:p",
+}
+
+
+def paragraphs_xpath(part_name: str) -> Optional[str]:
+    match = REWRITTEN_PARTS.match(part_name)
+    if match is None:
+        return None
+    return PARAGRAPHS_XPATH["document" if match.group(1) == "document" else "part"]
+
+
+def part_roots(doc: Document) -> Dict[str, object]:
+    """Корневые элементы документа и колонтитулов по имени части"""
+    roots = {}
+    for part in doc.part.package.iter_parts():
+        name = str(part.partname).lstrip("/")
+        if REWRITTEN_PARTS.match(name):
+            roots[name] = part.element
+    return roots
+
+
+def iter_part_paragraphs(doc: Document) -> Iterator[Tuple[str, object, object]]:
+    """(имя части, корень части, w:p): параграфы тела, таблиц верхнего уровня и колонтитулов"""
+    for name, root in part_roots(doc).items():
+        for p in root.xpath(paragraphs_xpath(name)):
+            yield name, root, p
+
+
+def iter_paragraphs(doc: Document) -> Iterator[Paragraph]:
+    """Параграфы, которые обходят DOCXGenerator._replace_placeholders и PlaceholderPlan"""
+    for _, _, p in iter_part_paragraphs(doc):
+        yield Paragraph(p, None)
+
+
+def compile_pattern(placeholders: List[str]) -> Pattern:
+    tokens = sorted((f"[{p}]" for p in placeholders), key=len, reverse=True)
+    return re.compile("|".join(re.escape(t) for t in tokens))
+
+
+def _element_path(root, element) -> Tuple[int, ...]:
+    path = []
+    while element is not root:
+        parent = element.getparent()
+        path.append(parent.index(element))
+        element = parent
+    return tuple(reversed(path))
+
+
+def _run_spans(char_to_run: List[int], start: int, end: int) -> Iterator[Tuple[int, int, int]]:
+    """Разбивает диапазон символов параграфа на отрезки внутри одного run'а"""
+    while start < end:
+        run_idx = char_to_run[start]
+        stop = start
+        while stop < end and char_to_run[stop] == run_idx:
+            stop += 1
+        yield run_idx, start, stop
+        start = stop
+
+
+def _resolve_path(root, path: Tuple[int, ...]):
+    element = root
+    for index in path:
+        element = element[index]
+    return element
+
+
+class PlannedParagraph:
+    def __init__(self, path: Tuple[int, ...], full_text: str, run_pieces: List[List[Piece]],
+                 part: str = DOCUMENT_PART):
+        self.path = path
+        self.part = part
+        self.full_text = full_text
+        self.run_pieces = run_pieces
+
+    @classmethod
+    def from_element(cls, p, pattern: Pattern, path: Tuple[int, ...] = (),
+                     part: str = DOCUMENT_PART) -> Optional["PlannedParagraph"]:
+        run_texts = [r.text for r in p.r_lst]
+        full_text = "".join(run_texts)
+        matches = list(pattern.finditer(full_text))
+        if not matches:
+            return None
+
+        char_to_run = []
+        for run_idx, text in enumerate(run_texts):
+            char_to_run.extend([run_idx] * len(text))
+
+        run_pieces: List[List[Piece]] = [[] for _ in run_texts]
+        pos = 0
+        for match in matches:
+            for run_idx, start, stop in _run_spans(char_to_run, pos, match.start()):
+                run_pieces[run_idx].append(full_text[start:stop])
+            for run_idx, start, stop in _run_spans(char_to_run, match.start(), match.end()):
+                run_pieces[run_idx].append(
+                    (match.group(), full_text[start:stop], start == match.start())
+                )
+            pos = match.end()
+        for run_idx, start, stop in _run_spans(char_to_run, pos, len(full_text)):
+            run_pieces[run_idx].append(full_text[start:stop])
+
+        return cls(path, full_text, run_pieces, part)
+
+    def render(self, replacements: Dict[str, str]) -> List[str]:
+        """
+        Новые тексты run'ов. Значение плейсхолдера попадает в run, где
+        плейсхолдер начинался, остальные его фрагменты удаляются; незаполненные
+        плейсхолдеры остаются как есть.
+        """
+        texts = []
+        for pieces in self.run_pieces:
+            parts = []
+            for piece in pieces:
+                if isinstance(piece, str):
+                    parts.append(piece)
+                    continue
+                placeholder, literal, is_head = piece
+                value = replacements.get(placeholder)
+                if value is None:
+                    parts.append(literal)
+                elif is_head:
+                    parts.append(value)
+            texts.append("".join(parts))
+        return texts
+
+
+class PlaceholderPlan:
+    """
+    Скомпилированный план подстановки для шаблона: какие параграфы и run'ы
+    документа и колонтитулов содержат токены [POINT n]. Строится один раз по
+    мастер-документу, после чего генерация трогает только эти параграфы.
+    Результат совпадает с DOCXGenerator._replace_placeholders и движком ooxml.
+    """
+
+    def __init__(self, paragraphs: List[PlannedParagraph]):
+        self.paragraphs = paragraphs
+
+    @classmethod
+    def compile(cls, doc: Document, placeholders: List[str]) -> "PlaceholderPlan":
+        pattern = compile_pattern(placeholders)
+        paragraphs = []
+
+        for part, root, p in iter_part_paragraphs(doc):
+            planned = PlannedParagraph.from_element(p, pattern, _element_path(root, p), part)
+            if planned is not None:
+                paragraphs.append(planned)
+
+        return cls(paragraphs)
+
+    def apply(self, doc: Document, replacements: Dict[str, str]) -> None:
+        roots = None
+        for planned in self.paragraphs:
+            texts = planned.render(replacements)
+            if "".join(texts) == planned.full_text:
+                continue
+            if planned.part == DOCUMENT_PART:
+                root = doc.element
+            else:
+                # Колонтитулы ищутся по пакету, только если в них есть что подставить
+                roots = roots or part_roots(doc)
+                root = roots[planned.part]
+            p = _resolve_path(root, planned.path)
+            for r, text in zip(p.r_lst, texts):
+                r.text = text
@@ -0,0 +1,201 @@
+import asyncio
+import contextvars
+import cProfile
+import hmac
+import io
+import logging
+import pstats
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_PROFILE_NAME_RE = re.compile(r"^[\w.-]+\.prof$")
+_ROUTE_CHARS_RE = re.compile(r"[^\w]+")
+
+_current: contextvars.ContextVar[Optional["ProfileSession"]] = contextvars.ContextVar(
+    "profile_session", default=None
+)
+
+
+class ProfileSession:
+    """
+    Профиль одного запроса, собранный из нескольких потоков.
+
+    cProfile видит только поток, в котором включён, поэтому каждый вызов
+    в BoundedExecutor профилируется отдельно и добавляется в общую сессию.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def wrap(self, fn: Callable) -> Callable:
+        @wraps(fn)
+        def profiled(*args, **kwargs):
+            profile = _start_profile()
+            if profile is None:
+                return fn(*args, **kwargs)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.disable()
+                self.add(profile)
+
+        return profiled
+
+    def add(self, profile: cProfile.Profile) -> None:
+        with self._lock:
+            self._profiles.append(profile)
+
+    def stats(self) -> Optional[pstats.Stats]:
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+
+def _start_profile() -> Optional[cProfile.Profile]:
+    """Включённый cProfile или None, если профилирование в потоке уже занято другим инструментом"""
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        return None
+    return profile
+
+
+def profiled(fn: Callable) -> Callable:
+    """Для вызова в пуле потоков: профилирует fn, если запрос профилируется"""
+    session = _current.get()
+    return session.wrap(fn) if session is not None else fn
+
+
+class ProfileStore:
+    """Профили в PROFILE_DIR: хранится не больше PROFILE_MAX_FILES последних"""
+
+    def __init__(self, directory: str, max_files: int):
+        self.directory = Path(directory)
+        self.max_files = max_files
+
+    def path(self, name: str) -> Path:
+        if not _PROFILE_NAME_RE.match(name):
+            raise FileNotFoundError(f"Profile '{name}' not found")
+        return self.directory / name
+
+    def save(self, name: str, stats: pstats.Stats) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stats.dump_stats(self.path(name))
+        for stale in self._files()[self.max_files:]:
+            stale.unlink(missing_ok=True)
+
+    def _files(self) -> List[Path]:
+        if not self.directory.is_dir():
+            return []
+        return sorted(self.directory.glob("*.prof"), key=lambda p: p.name, reverse=True)
+
+    def list(self) -> List[Dict[str, Any]]:
+        result = []
+        for path in self._files():
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            result.append({
+                "name": path.name,
+                "size": st.st_size,
+                "created_at": datetime.fromtimestamp(st.st_mtime, timezone.utc).isoformat(),
+            })
+        return result
+
+    def summary(self, name: str, sort: str = "cumulative", limit: int = 50) -> str:
+        output = io.StringIO()
+        pstats.Stats(str(self.path(name)), stream=output).sort_stats(sort).print_stats(limit)
+        return output.getvalue()
+
+
+def admin_token_valid(token: Optional[str]) -> bool:
+    return bool(settings.ADMIN_TOKEN and token and hmac.compare_digest(token, settings.ADMIN_TOKEN))
+
+
+class ProfilingMiddleware:
+    """
+    Профилирует запрос по заголовку X-Profile: 1 (или ?profile=1) вместе с
+    X-Admin-Token либо случайную долю запросов PROFILE_SAMPLE_RATE.
+    Имя профиля возвращается в X-Profile-Id.
+
+    Поток event loop профилируется, только если в нём нет другого профиля,
+    и тогда в профиль попадают и корутины параллельных запросов.
+    Рендер в процессном пуле (RENDER_BACKEND=process) в профиль не попадает.
+    """
+
+    _loop_busy = False
+
+    def __init__(self, app):
+        self.app = app
+
+    def _requested(self, scope) -> bool:
+        headers = dict(scope["headers"])
+        flag = headers.get(b"x-profile") == b"1" or b"profile=1" in scope.get("query_string", b"").split(b"&")
+        if flag and admin_token_valid(headers.get(b"x-admin-token", b"").decode("latin-1")):
+            return True
+        return settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        # Выключенный профайлер стоит одной проверки настроек на запрос
+        if scope["type"] != "http" or not (settings.ADMIN_TOKEN or settings.PROFILE_SAMPLE_RATE > 0):
+            await self.app(scope, receive, send)
+            return
+        if not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        started = datetime.now(timezone.utc)
+        route = _ROUTE_CHARS_RE.sub("-", scope["path"]).strip("-")[:60] or "root"
+        name = f"{started:%Y%m%dT%H%M%S%f}_{scope['method']}_{route}.prof"
+        session = ProfileSession(name)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"x-profile-id", name.encode())]
+            await send(message)
+
+        loop_profile = None
+        if not ProfilingMiddleware._loop_busy:
+            loop_profile = _start_profile()
+            ProfilingMiddleware._loop_busy = loop_profile is not None
+
+        token = _current.set(session)
+        started_at = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            if loop_profile is not None:
+                loop_profile.disable()
+                ProfilingMiddleware._loop_busy = False
+                session.add(loop_profile)
+            elapsed = time.perf_counter() - started_at
+
+            stats = session.stats()
+            if stats is not None:
+                try:
+                    await asyncio.to_thread(profile_store.save, name, stats)
+                    logger.info("Saved profile %s (%.1f ms)", name, elapsed * 1000)
+                except Exception:
+                    logger.exception("Failed to save profile %s", name)
+
+
+profile_store = ProfileStore(settings.PROFILE_DIR, settings.PROFILE_MAX_FILES)
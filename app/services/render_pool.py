@@ -0,0 +1,108 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+from uuid import UUID
+from app.config import settings
+from app.models import NDAType
+from app.services.docx_generator import docx_generator
+
+
+def warm_worker() -> None:
+    """Инициализатор процесса: один раз загружает MorphAnalyzer и шаблоны"""
+    docx_generator.warm_up()
+
+
+def _render(nda_id: UUID, nda_type: NDAType, fields: Dict) -> bytes:
+    return docx_generator.generate(nda_id=nda_id, nda_type=nda_type, fields=fields)
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+class ProcessRenderPool:
+    """
+    Рендеринг DOCX в пуле процессов, чтобы генерация масштабировалась по ядрам.
+
+    В воркеры передаются только поля, обратно возвращаются байты документа.
+    Если воркер упал, пул пересоздаётся, а задача повторяется один раз.
+    Процессы запускаются через spawn: fork из процесса с живыми потоками
+    и соединениями MinIO небезопасен.
+    """
+
+    def __init__(self, workers: int, initializer: Optional[Callable] = warm_worker):
+        self.workers = workers
+        self.initializer = initializer
+        self.restarts = 0
+        self.failed_tasks = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=self.initializer
+                )
+            return self._executor
+
+    def _restart(self, broken: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+                self.restarts += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _submit(self, fn: Callable, *args) -> Any:
+        executor = self._get_executor()
+        try:
+            return executor.submit(fn, *args).result()
+        except BrokenProcessPool:
+            self.failed_tasks += 1
+            self._restart(executor)
+            return self._get_executor().submit(fn, *args).result()
+
+    def start(self) -> None:
+        """Запускает и прогревает все воркеры"""
+        executor = self._get_executor()
+        for future in [executor.submit(_ping) for _ in range(self.workers)]:
+            future.result()
+
+    def generate(self, nda_id: UUID, nda_type: NDAType, fields: Dict) -> bytes:
+        return self._submit(_render, nda_id, nda_type, fields)
+
+    def is_healthy(self) -> bool:
+        try:
+            self._submit(_ping)
+            return True
+        except Exception:
+            return False
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "process",
+            "workers": self.workers,
+            "running": self._executor is not None,
+            "restarts": self.restarts,
+            "failed_tasks": self.failed_tasks,
+        }
+
+
+def _create_renderer():
+    if settings.RENDER_BACKEND == "process":
+        return ProcessRenderPool(settings.RENDER_PROCESSES)
+    return docx_generator
+
+
+renderer = _create_renderer()
@@ -0,0 +1,279 @@
+import hashlib
+import hmac
+import random
+import secrets
+import threading
+import time
+from abc import ABC, abstractmethod
+from io import BytesIO
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+from urllib.parse import quote, urlencode
+from uuid import UUID
+from app.config import settings
+from app.models import NDAMetadata, NDAType
+from app.services.cache import LRUCache
+from app.services.executors import AsyncFacade, storage_executor
+from app.services.nda_index import nda_index
+
+_METADATA_LOCK_STRIPES = 64
+DOCX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+PDF_CONTENT_TYPE = "application/pdf"
+
+
+class MetadataConflict(Exception):
+    """meta.json менялся параллельно, и обновление не удалось применить за отведённые попытки"""
+
+    def __init__(self, nda_id: UUID):
+        super().__init__(f"NDA {nda_id} was modified concurrently, retry later")
+        self.nda_id = nda_id
+
+
+class StaleMetadata(Exception):
+    """Условная запись meta.json отклонена: ETag уже не совпадает"""
+
+
+class StoredObject(NamedTuple):
+    path: str
+    size: int
+    # Время последнего изменения, unix timestamp
+    modified: float
+
+
+class StorageBackend(ABC):
+    """
+    Хранилище NDA: метаданные, шаблоны, сгенерированные и подписанные файлы.
+
+    Раскладка ключей общая для всех реализаций (nda/{id}/meta.json,
+    templates/{name}, cache/generated/{key}.docx, cache/pdf/{sha256}.pdf).
+    Кэш метаданных и обновление meta.json с повтором при конфликте
+    реализованы здесь, бэкенду достаточно чтения и условной записи.
+    """
+
+    name = "abstract"
+
+    def __init__(self):
+        # nda_id -> (NDAMetadata, ETag); наружу отдаются только копии
+        self.metadata_cache = LRUCache(
+            settings.METADATA_CACHE_SIZE, ttl=settings.METADATA_CACHE_TTL_SECONDS
+        )
+        self.metadata_conflicts = 0
+        self._metadata_locks = [threading.Lock() for _ in range(_METADATA_LOCK_STRIPES)]
+
+    def ensure_ready(self) -> None:
+        """Готовит хранилище к работе при старте приложения"""
+
+    def _get_meta_path(self, nda_id: UUID) -> str:
+        return f"nda/{nda_id}/meta.json"
+
+    def _get_generated_path(self, nda_id: UUID, nda_type: NDAType) -> str:
+        return f"nda/{nda_id}/nda_generated/NDA_{nda_type}_{nda_id}.docx"
+
+    def _get_signed_path(self, nda_id: UUID, filename: str) -> str:
+        return f"nda/{nda_id}/nda_signed/{filename}"
+
+    def _get_generation_cache_path(self, key: str) -> str:
+        return f"cache/generated/{key}.docx"
+
+    def _get_pdf_cache_path(self, digest: str) -> str:
+        return f"cache/pdf/{digest}.pdf"
+
+    def _get_template_path(self, template_name: str) -> str:
+        return f"templates/{template_name}"
+
+    @abstractmethod
+    def _load_metadata(self, nda_id: UUID) -> Optional[Tuple[NDAMetadata, str]]:
+        """meta.json и его ETag, минуя кэш; None, если NDA нет"""
+
+    @abstractmethod
+    def _store_metadata(self, metadata: NDAMetadata, if_match: Optional[str]) -> str:
+        """Записывает meta.json и возвращает ETag; при несовпадении if_match - StaleMetadata"""
+
+    def _read_metadata(self, nda_id: UUID) -> Optional[Tuple[NDAMetadata, str]]:
+        cached = self.metadata_cache.get(nda_id)
+        if cached is not None:
+            metadata, etag = cached
+            return metadata.model_copy(deep=True), etag
+
+        entry = self._load_metadata(nda_id)
+        if entry is not None:
+            metadata, etag = entry
+            self.metadata_cache.set(nda_id, (metadata.model_copy(deep=True), etag))
+        return entry
+
+    def save_metadata(self, metadata: NDAMetadata, if_match: Optional[str] = None) -> str:
+        """
+        Записывает meta.json и возвращает новый ETag.
+        С if_match запись выполняется, только если объект в хранилище не менялся.
+        """
+        try:
+            etag = self._store_metadata(metadata, if_match)
+        except Exception:
+            self.metadata_cache.pop(metadata.nda_id)
+            raise
+
+        self.metadata_cache.set(metadata.nda_id, (metadata.model_copy(deep=True), etag))
+        if nda_index is not None:
+            nda_index.upsert(metadata)
+        return etag
+
+    def get_metadata(self, nda_id: UUID) -> Optional[NDAMetadata]:
+        entry = self._read_metadata(nda_id)
+        return entry[0] if entry is not None else None
+
+    def get_metadata_uncached(self, nda_id: UUID) -> Optional[NDAMetadata]:
+        """meta.json прямо из хранилища, не читая и не заполняя кэш (обход всех NDA)"""
+        entry = self._load_metadata(nda_id)
+        return entry[0] if entry is not None else None
+
+    def update_metadata(self, nda_id: UUID,
+                        mutate: Callable[[NDAMetadata], None]) -> Optional[NDAMetadata]:
+        """
+        Читает meta.json, применяет mutate и записывает с If-Match по ETag.
+        Если объект успели изменить, перечитывает актуальную версию и применяет
+        mutate заново, поэтому параллельные изменения разных полей не теряются.
+        """
+        lock = self._metadata_locks[hash(nda_id) % _METADATA_LOCK_STRIPES]
+        with lock:
+            for attempt in range(settings.METADATA_UPDATE_RETRIES + 1):
+                entry = self._read_metadata(nda_id)
+                if entry is None:
+                    return None
+
+                metadata, etag = entry
+                mutate(metadata)
+                try:
+                    self.save_metadata(metadata, if_match=etag)
+                    return metadata
+                except StaleMetadata:
+                    self.metadata_conflicts += 1
+                    time.sleep(random.uniform(0, 0.01 * 2 ** attempt))
+
+        raise MetadataConflict(nda_id)
+
+    @abstractmethod
+    def list_nda_ids(self, prefix: str = "") -> Iterator[UUID]:
+        """ID всех NDA, чей ID начинается с prefix (для параллельного обхода по шардам)"""
+
+    @abstractmethod
+    def list_objects(self, prefix: str) -> Iterator[StoredObject]:
+        """Все объекты, чей ключ начинается с prefix, рекурсивно"""
+
+    @abstractmethod
+    def put_object(self, object_path: str, data: bytes,
+                   content_type: str = "application/octet-stream") -> str:
+        ...
+
+    @abstractmethod
+    def move_object(self, source_path: str, target_path: str) -> None:
+        """Переносит объект внутри хранилища без передачи данных через приложение"""
+
+    @abstractmethod
+    def delete_objects(self, object_paths: List[str]) -> int:
+        """Удаляет пачку объектов; возвращает число удалённых"""
+
+    @abstractmethod
+    def save_generated_docx_by_type(self, nda_id: UUID, docx_bytes: bytes, nda_type: NDAType) -> str:
+        """Сохраняет DOCX документ с указанием типа (eng или ru_en)"""
+
+    @abstractmethod
+    def cache_generated_docx(self, key: str, source_path: str) -> None:
+        """Копирует уже сохранённый DOCX в кэш генерации"""
+
+    @abstractmethod
+    def get_cached_generation(self, key: str, max_age_seconds: int) -> Optional[bytes]:
+        ...
+
+    def get_cached_pdf(self, digest: str) -> Optional[bytes]:
+        """PDF из кэша конвертации по SHA-256 исходного DOCX; None, если его нет"""
+        try:
+            return self.get_object(self._get_pdf_cache_path(digest))
+        except FileNotFoundError:
+            return None
+
+    def cache_pdf(self, digest: str, pdf_bytes: bytes) -> str:
+        return self.put_object(self._get_pdf_cache_path(digest), pdf_bytes, PDF_CONTENT_TYPE)
+
+    @abstractmethod
+    def save_signed_stream(self, nda_id: UUID, stream: BinaryIO, filename: str,
+                           content_type: str = "application/octet-stream") -> str:
+        ...
+
+    def save_signed_file(self, nda_id: UUID, file_data: bytes, filename: str,
+                         content_type: str = "application/octet-stream") -> str:
+        return self.save_signed_stream(nda_id, BytesIO(file_data), filename, content_type)
+
+    @abstractmethod
+    def get_object(self, object_path: str) -> bytes:
+        """Содержимое объекта; FileNotFoundError, если его нет"""
+
+    @abstractmethod
+    def stat_template(self, template_name: str) -> str:
+        """Возвращает ETag шаблона без чтения содержимого"""
+
+    @abstractmethod
+    def get_template(self, template_name: str) -> Union[bytes, memoryview]:
+        ...
+
+    @abstractmethod
+    def get_presigned_url(self, object_path: str, expiry_seconds: Optional[int] = None,
+                          filename: Optional[str] = None) -> str:
+        """Временная ссылка на объект, по которой клиент скачивает его без участия API"""
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.name,
+            "metadata_cache": {**self.metadata_cache.stats(), "conflicts": self.metadata_conflicts},
+        }
+
+
+class SignedURLStorage(StorageBackend):
+    """
+    Хранилище без собственного HTTP-сервера: ссылки на объекты подписываются
+    HMAC и отдаются приложением через GET /files/{path}.
+    """
+
+    def __init__(self):
+        super().__init__()
+        # Без STORAGE_SIGNING_KEY ссылки действительны только в этом процессе
+        key = settings.STORAGE_SIGNING_KEY or secrets.token_hex(32)
+        self._signing_key = key.encode()
+
+    def _signature(self, object_path: str, expires: int, filename: str) -> str:
+        message = f"{object_path}\n{expires}\n{filename}".encode()
+        return hmac.new(self._signing_key, message, hashlib.sha256).hexdigest()
+
+    def get_presigned_url(self, object_path: str, expiry_seconds: Optional[int] = None,
+                          filename: Optional[str] = None) -> str:
+        if expiry_seconds is None:
+            expiry_seconds = settings.PRESIGNED_URL_EXPIRY_SECONDS
+
+        expires = int(time.time()) + expiry_seconds
+        query = {"expires": expires, "filename": filename or ""}
+        query["signature"] = self._signature(object_path, expires, query["filename"])
+        return f"{settings.PUBLIC_BASE_URL}/files/{quote(object_path)}?{urlencode(query)}"
+
+    def file_path(self, object_path: str) -> Optional[Path]:
+        """Путь к объекту на диске, если его можно отдать файлом напрямую"""
+        return None
+
+    def verify_url(self, object_path: str, expires: int, filename: str, signature: str) -> bool:
+        if expires < time.time():
+            return False
+        return hmac.compare_digest(self._signature(object_path, expires, filename), signature)
+
+
+def _create_storage() -> StorageBackend:
+    if settings.STORAGE_BACKEND == "local":
+        from app.services.local_storage import LocalStorage
+        return LocalStorage(settings.LOCAL_STORAGE_PATH, settings.LOCAL_TEMPLATES_PATH)
+    if settings.STORAGE_BACKEND == "memory":
+        from app.services.local_storage import MemoryStorage
+        return MemoryStorage(settings.LOCAL_TEMPLATES_PATH)
+
+    from app.services.minio_service import MinIOService
+    return MinIOService()
+
+
+storage = _create_storage()
+async_storage = AsyncFacade(storage, storage_executor)
@@ -0,0 +1,78 @@
+import io
+from typing import AsyncIterator, BinaryIO, List
+
+# Размер части тела ответа: uvicorn ждёт клиента между частями,
+# поэтому в буфере транспорта не оказывается копия всего документа
+RESPONSE_CHUNK_SIZE = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class CountingReader:
+    """Файловый объект поверх потока, который считает прочитанные байты"""
+
+    def __init__(self, raw: BinaryIO):
+        self.raw = raw
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.raw.read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+class LimitedReader(CountingReader):
+    """
+    Файловый объект поверх потока загрузки, который считает прочитанные байты
+    и прерывает чтение, как только превышен лимит.
+    """
+
+    def __init__(self, raw: BinaryIO, limit: int):
+        super().__init__(raw)
+        self.limit = limit
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = super().read(size)
+        if self.bytes_read > self.limit:
+            raise UploadTooLarge(f"Upload exceeds {self.limit} bytes")
+        return chunk
+
+
+class ChunkSink(io.RawIOBase):
+    """
+    Несмещаемый поток для zipfile: записанные байты копятся до drain().
+    zipfile сам переходит на data descriptor'ы, поэтому архив можно
+    отдавать клиенту по частям, не держа его целиком в памяти.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def iter_chunks(data: bytes, chunk_size: int = RESPONSE_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """
+    Отдаёт готовый документ частями; в памяти одновременно только сам документ и одна часть.
+    Асинхронный генератор: синхронный StreamingResponse гонял бы каждую часть через пул потоков.
+    """
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
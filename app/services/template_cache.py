@@ -0,0 +1,97 @@
+import threading
+import time
+from io import BytesIO
+from typing import Any, Dict, Iterable
+from docx import Document
+from app.services.cache import LRUCache
+from app.services.ooxml_renderer import OOXMLTemplate
+from app.services.placeholder_plan import PlaceholderPlan
+
+
+class CachedTemplate:
+    def __init__(self, name: str, data: bytes, etag: str):
+        self.name = name
+        self.data = data
+        self.etag = etag
+        self.checked_at = time.monotonic()
+        self._document = None
+        self._plans: Dict[frozenset, PlaceholderPlan] = {}
+        self._ooxml: Dict[frozenset, OOXMLTemplate] = {}
+
+    @property
+    def document(self) -> Document:
+        """Мастер-документ. Не изменяется: для генерации используйте копию."""
+        if self._document is None:
+            self._document = Document(BytesIO(self.data))
+        return self._document
+
+    def plan(self, placeholders: Iterable[str]) -> PlaceholderPlan:
+        key = frozenset(placeholders)
+        plan = self._plans.get(key)
+        if plan is None:
+            plan = PlaceholderPlan.compile(self.document, list(key))
+            self._plans[key] = plan
+        return plan
+
+    def ooxml(self, placeholders: Iterable[str]) -> OOXMLTemplate:
+        key = frozenset(placeholders)
+        compiled = self._ooxml.get(key)
+        if compiled is None:
+            compiled = OOXMLTemplate.compile(self.data, list(key))
+            self._ooxml[key] = compiled
+        return compiled
+
+
+class TemplateCache:
+    """
+    Кэш DOCX шаблонов в памяти процесса.
+
+    Хранит исходные байты и разобранный мастер-документ. Раз в
+    revalidate_seconds сверяет ETag объекта в хранилище, поэтому повторная
+    загрузка шаблонов (scripts/upload_templates.py) подхватывается без рестарта.
+    """
+
+    def __init__(self, source, maxsize: int, revalidate_seconds: int):
+        self.source = source
+        self.revalidate_seconds = revalidate_seconds
+        self.revalidations = 0
+        self.reloads = 0
+        self._entries = LRUCache(maxsize)
+        self._load_lock = threading.Lock()
+
+    def get(self, template_name: str) -> CachedTemplate:
+        entry = self._entries.get(template_name)
+        if entry is None:
+            return self._load(template_name)
+
+        now = time.monotonic()
+        if now - entry.checked_at >= self.revalidate_seconds:
+            self.revalidations += 1
+            if self.source.stat_template(template_name) != entry.etag:
+                self.reloads += 1
+                return self._load(template_name)
+            entry.checked_at = now
+
+        return entry
+
+    def invalidate(self) -> None:
+        self._entries.clear()
+
+    def _load(self, template_name: str) -> CachedTemplate:
+        with self._load_lock:
+            etag = self.source.stat_template(template_name)
+            entry = self._entries.peek(template_name)
+            if entry is not None and entry.etag == etag:
+                entry.checked_at = time.monotonic()
+                return entry
+
+            entry = CachedTemplate(template_name, self.source.get_template(template_name), etag)
+            self._entries.set(template_name, entry)
+            return entry
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self._entries.stats(),
+            "revalidations": self.revalidations,
+            "reloads": self.reloads,
+        }
@@ -0,0 +1,60 @@
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from app.config import settings
+
+# Заголовки частей multipart и граница поверх самого файла
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+def _too_large_detail() -> str:
+    return f"File size exceeds maximum allowed size of {settings.MAX_FILE_SIZE_MB}MB"
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Ограничивает тело загрузки подписанного NDA до разбора multipart.
+
+    Starlette записывает всё тело во временный файл ещё до вызова
+    обработчика, поэтому проверка размера в эндпоинте срабатывает только
+    после приёма всего файла. Здесь запрос с Content-Length больше лимита
+    отклоняется сразу, а тело без него (chunked) - как только прочитано
+    больше лимита.
+    """
+
+    def __init__(self, app, path_suffix: str = "/upload-signed"):
+        self.app = app
+        self.path_suffix = path_suffix
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] != "POST"
+                or not scope["path"].endswith(self.path_suffix)):
+            await self.app(scope, receive, send)
+            return
+
+        limit = settings.max_file_size_bytes + MULTIPART_OVERHEAD_BYTES
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse(
+                {"detail": _too_large_detail()},
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                headers={"Connection": "close"}
+            )
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # HTTPException из разбора тела FastAPI отдаёт как есть
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=_too_large_detail()
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,236 @@
+import hashlib
+import io
+import queue
+import threading
+import zipfile
+from typing import BinaryIO, NamedTuple, Optional
+from app.config import settings
+from app.services.storage import DOCX_CONTENT_TYPE
+from app.services.streams import CountingReader
+
+# Сколько байт от начала нужно для определения формата
+HEAD_SIZE = 8 * 1024
+
+_OLE_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+_ZIP_MAGICS = (b"PK\x03\x04", b"PK\x05\x06")
+# Признак конца PDF ищется в последних байтах: после %%EOF допускается перевод строки и мусор
+_PDF_EOF_WINDOW = 4096
+
+CONTENT_TYPES = {
+    "pdf": "application/pdf",
+    "doc": "application/msword",
+    "docx": DOCX_CONTENT_TYPE,
+    "zip": "application/zip",
+}
+
+
+class UploadRejected(Exception):
+    """Содержимое загрузки не соответствует заявленному типу или повреждено"""
+
+
+class VerifiedUpload(NamedTuple):
+    sha256: str
+    size: int
+    content_type: str
+
+
+def sniff(head: bytes) -> Optional[str]:
+    """
+    Формат по сигнатуре: zip (в том числе DOCX), doc (OLE2), pdf или None.
+    Сначала сигнатуры в начале файла: ZIP с PDF внутри содержит %PDF- в
+    первых байтах. PDF допускает мусор перед заголовком, поэтому ищется последним.
+    """
+    if head.startswith(_ZIP_MAGICS):
+        return "zip"
+    if head.startswith(_OLE_MAGIC):
+        return "doc"
+    if b"%PDF-" in head[:1024]:
+        return "pdf"
+    return None
+
+
+class BackgroundHasher:
+    """
+    SHA-256 в отдельном потоке. hashlib отпускает GIL на больших блоках,
+    поэтому хэширование части идёт одновременно с её отправкой в хранилище.
+    Очередь ограничена: в памяти не больше max_pending непрохэшированных частей.
+    """
+
+    def __init__(self, max_pending: int = 4):
+        self._hash = hashlib.sha256()
+        self._queue: "queue.Queue[Optional[bytes]]" = queue.Queue(max_pending)
+        self._thread = threading.Thread(target=self._run, name="upload-hasher", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                return
+            self._hash.update(chunk)
+
+    def update(self, chunk: bytes) -> None:
+        self._queue.put(chunk)
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def hexdigest(self) -> str:
+        self.close()
+        return self._hash.hexdigest()
+
+
+class _TailFile(io.RawIOBase):
+    """
+    Файл, от которого известен только хвост. zipfile читает из него конец
+    архива и центральный каталог; чтение за пределами хвоста означает, что
+    каталог не поместился в SIGNED_ZIP_MAX_DIRECTORY_BYTES.
+    """
+
+    def __init__(self, tail: bytes, size: int):
+        super().__init__()
+        self._tail = tail
+        self._size = size
+        self._start = size - len(tail)
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self._size}[whence]
+        self._position = max(base + offset, 0)
+        return self._position
+
+    def tell(self) -> int:
+        return self._position
+
+    def read(self, size: int = -1) -> bytes:
+        if self._position >= self._size:
+            return b""
+        if self._position < self._start:
+            raise UploadRejected("ZIP central directory is too large to verify")
+        end = self._size if size is None or size < 0 else min(self._position + size, self._size)
+        data = self._tail[self._position - self._start:end - self._start]
+        self._position = end
+        return data
+
+
+def check_zip_directory(tail: bytes, size: int) -> bool:
+    """
+    Проверяет центральный каталог ZIP по хвосту файла, не распаковывая архив:
+    структуру каталога, смещения записей, пути и суммарный распакованный размер.
+    Возвращает True, если архив - документ Word (DOCX).
+    """
+    try:
+        with zipfile.ZipFile(_TailFile(tail, size)) as archive:
+            infos = archive.infolist()
+            directory_start = archive.start_dir
+    except zipfile.BadZipFile as e:
+        raise UploadRejected(f"Invalid ZIP archive: {e}")
+
+    names = set()
+    unpacked = 0
+    for info in infos:
+        name = info.filename
+        if name.startswith(("/", "\\")) or ".." in name.replace("\\", "/").split("/") or ":" in name:
+            raise UploadRejected(f"ZIP entry has an unsafe path: {name!r}")
+        if info.header_offset >= directory_start or info.compress_size > size:
+            raise UploadRejected(f"ZIP entry {name!r} points outside the archive")
+        unpacked += info.file_size
+        names.add(name)
+
+    if unpacked > settings.SIGNED_ZIP_MAX_UNCOMPRESSED_MB * 1024 * 1024:
+        raise UploadRejected("ZIP archive unpacks to more than "
+                             f"{settings.SIGNED_ZIP_MAX_UNCOMPRESSED_MB}MB")
+    return "[Content_Types].xml" in names and "word/document.xml" in names
+
+
+class VerifyingReader(CountingReader):
+    """
+    Поток загрузки, который по пути в хранилище проверяет содержимое.
+
+    prime() читает начало файла и по сигнатуре отклоняет несоответствие
+    расширению ещё до записи в хранилище. Дальше каждый прочитанный блок
+    уходит в BackgroundHasher, а последние SIGNED_ZIP_MAX_DIRECTORY_BYTES
+    сохраняются для проверки конца файла: центрального каталога ZIP или
+    маркера %%EOF у PDF. finish() выполняется после загрузки.
+    """
+
+    def __init__(self, raw: BinaryIO, extension: str):
+        super().__init__(raw)
+        self.extension = extension
+        self.kind: Optional[str] = None
+        self._head = b""
+        self._tail = bytearray()
+        self._tail_size = max(settings.SIGNED_ZIP_MAX_DIRECTORY_BYTES, _PDF_EOF_WINDOW)
+        self._hasher = BackgroundHasher()
+
+    @property
+    def content_type(self) -> str:
+        return CONTENT_TYPES.get(self.extension, "application/octet-stream")
+
+    def prime(self) -> None:
+        head = self.raw.read(HEAD_SIZE)
+        while len(head) < HEAD_SIZE:
+            more = self.raw.read(HEAD_SIZE - len(head))
+            if not more:
+                break
+            head += more
+        if not head:
+            self.close()
+            raise UploadRejected("File is empty")
+
+        self.kind = sniff(head)
+        expected = "zip" if self.extension in ("docx", "zip") else self.extension
+        if self.kind != expected:
+            self.close()
+            detected = self.kind or "unknown"
+            raise UploadRejected(f"File content ({detected}) does not match the .{self.extension} extension")
+        self._head = head
+
+    def read(self, size: int = -1) -> bytes:
+        if self._head:
+            if size is None or size < 0:
+                chunk, self._head = self._head + self.raw.read(), b""
+            else:
+                chunk, self._head = self._head[:size], self._head[size:]
+        else:
+            chunk = self.raw.read(size)
+        if chunk:
+            self.bytes_read += len(chunk)
+            self._hasher.update(chunk)
+            self._remember_tail(chunk)
+        return chunk
+
+    def _remember_tail(self, chunk: bytes) -> None:
+        if len(chunk) >= self._tail_size:
+            self._tail = bytearray(chunk[-self._tail_size:])
+            return
+        self._tail += chunk
+        excess = len(self._tail) - self._tail_size
+        if excess > 0:
+            del self._tail[:excess]
+
+    def finish(self) -> VerifiedUpload:
+        """Дожидается хэша и проверяет конец файла; UploadRejected, если он повреждён"""
+        digest = self._hasher.hexdigest()
+        tail = bytes(self._tail)
+        content_type = self.content_type
+
+        if self.kind == "pdf" and b"%%EOF" not in tail[-_PDF_EOF_WINDOW:]:
+            raise UploadRejected("PDF is truncated: no %%EOF marker at the end")
+        if self.kind == "zip":
+            is_docx = check_zip_directory(tail, self.bytes_read)
+            if self.extension == "docx" and not is_docx:
+                raise UploadRejected("File is a ZIP archive, not a Word document")
+
+        return VerifiedUpload(digest, self.bytes_read, content_type)
+
+    def close(self) -> None:
+        self._hasher.close()
@@ -0,0 +1,65 @@
+import logging
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class Warmup:
+    """
+    Инициализация сервисов после старта приложения.
+
+    Шаги выполняются в фоне, поэтому импорт app.main не ходит в сеть и не
+    грузит словари. Пока обязательные шаги не завершены, /ready отвечает 503.
+    """
+
+    def __init__(self):
+        self.steps: List[Tuple[str, Callable[[], Any]]] = []
+        self.timings: Dict[str, float] = {}
+        self.ready = False
+        self.error: Optional[str] = None
+
+    def add_step(self, name: str, fn: Callable[[], Any]) -> None:
+        self.steps.append((name, fn))
+
+    def _run_step(self, name: str, fn: Callable[[], Any]) -> None:
+        started = time.perf_counter()
+        fn()
+        self.timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    def run(self) -> None:
+        try:
+            for name, fn in self.steps:
+                self._run_step(name, fn)
+        except Exception as e:
+            self.error = f"{name}: {e}"
+            logger.exception("Startup step '%s' failed", name)
+            return
+
+        self.ready = True
+        logger.info(
+            "Startup complete: %s",
+            ", ".join(f"{name}={ms}ms" for name, ms in self.timings.items())
+        )
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "error": self.error,
+            "timings_ms": self.timings,
+        }
+
+
+def retry_until(fn: Callable[[], Any], timeout: float, interval: float = 1.0) -> Any:
+    """Повторяет fn до успеха или истечения timeout (например, пока MinIO не поднимется)"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return fn()
+        except Exception:
+            if time.monotonic() + interval > deadline:
+                raise
+            time.sleep(interval)
+
+
+warmup = Warmup()
@@ -0,0 +1,214 @@
+"""
+Память на один запрос /nda/generate, замеренная tracemalloc: пик всего
+запроса и пик передачи готового документа (загрузка в хранилище и тело
+ответа) сверх самого документа.
+
+Сравниваются два конвейера на одних и тех же шаблонах:
+- copy - прежний: seek + read после doc.save, тело ответа одним сообщением;
+- shared - текущий: getvalue без копии, ответ частями по RESPONSE_CHUNK_SIZE.
+
+В хранилище оба конвейера отдают готовые байты: BytesIO поверх bytes и
+чтение его целиком не копируют данные.
+
+Шаблоны синтетические (как в bench_suite.py), при --image-kb с несжимаемой
+картинкой - как логотип или скан подписи в реальном NDA. Они кладутся под
+отдельным именем и удаляются после замера, поэтому бенчмарк можно запускать
+и на MinIO (STORAGE_BACKEND=minio) вместе с буферами HTTP-клиента.
+
+    python scripts/bench_memory.py --paragraphs 200 --image-kb 0,4096
+"""
+import argparse
+import copy
+import json
+import random
+import struct
+import sys
+import tracemalloc
+import zlib
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+from uuid import uuid4
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from bench_suite import FIELDS, SEED, environment, parse_ints, synthetic_template
+from docx import Document
+from app.config import settings
+from app.models import NDAType
+from app.services.docx_generator import docx_generator
+from app.services.storage import DOCX_CONTENT_TYPE, storage
+from app.services.streams import iter_chunks
+
+NDA_TYPE = NDAType.ENG
+TEMPLATE_NAME = "bench-memory.docx"
+
+
+def noise_png(size_kb: int) -> bytes:
+    """PNG из случайных пикселей: не сжимается, поэтому DOCX растёт на size_kb"""
+    width = 512
+    height = max(size_kb * 1024 // (width * 3), 1)
+    rng = random.Random(SEED)
+    raw = b"".join(b"\x00" + rng.randbytes(width * 3) for _ in range(height))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header)
+            + chunk(b"IDAT", zlib.compress(raw, 0)) + chunk(b"IEND", b""))
+
+
+def install_template(paragraphs: int, image_kb: int) -> None:
+    placeholders = [f"[{key}]" for key in docx_generator._get_field_mapping(NDA_TYPE)]
+    data = synthetic_template(placeholders, paragraphs)
+    if image_kb:
+        doc = Document(BytesIO(data))
+        doc.add_picture(BytesIO(noise_png(image_kb)))
+        output = BytesIO()
+        doc.save(output)
+        data = output.getvalue()
+    storage.put_object(storage._get_template_path(TEMPLATE_NAME), data)
+    docx_generator.template_cache.invalidate()
+
+
+def copy_pipeline(mark: Callable[[], None], stored: List[str]) -> int:
+    """Конвейер до перехода на общий буфер"""
+    template = docx_generator.template_cache.get(TEMPLATE_NAME)
+    mapping = docx_generator._get_field_mapping(NDA_TYPE)
+    replacements = docx_generator._build_replacements(FIELDS[NDA_TYPE], mapping)
+    if settings.DOCX_RENDER_ENGINE == "ooxml":
+        docx_bytes = template.ooxml(mapping).render(replacements)
+        mark()
+    else:
+        doc = copy.deepcopy(template.document)
+        template.plan(mapping).apply(doc, replacements)
+        output = BytesIO()
+        doc.save(output)
+        mark()
+        output.seek(0)
+        docx_bytes = output.read()
+
+    nda_id = uuid4()
+    if storage.name == "minio":
+        path = storage._get_generated_path(nda_id, NDA_TYPE)
+        storage.client.put_object(
+            storage.bucket_name, path, BytesIO(docx_bytes), length=len(docx_bytes),
+            content_type=DOCX_CONTENT_TYPE
+        )
+    else:
+        path = storage.save_generated_docx_by_type(nda_id, docx_bytes, NDA_TYPE)
+    stored.append(path)
+
+    # Response(content=...) отдаёт тело одним сообщением, без копии
+    return len(docx_bytes)
+
+
+def shared_pipeline(mark: Callable[[], None], stored: List[str]) -> int:
+    docx_bytes = docx_generator.generate(uuid4(), NDA_TYPE, FIELDS[NDA_TYPE])
+    mark()
+    stored.append(storage.save_generated_docx_by_type(uuid4(), docx_bytes, NDA_TYPE))
+    # iter_chunks ничего не ждёт, поэтому части забираются без event loop и его аллокаций
+    chunks = iter_chunks(docx_bytes)
+    sent = 0
+    while True:
+        try:
+            chunks.__anext__().send(None)
+        except StopIteration as chunk:
+            sent += len(chunk.value)
+        except StopAsyncIteration:
+            return sent
+
+
+def measure(pipeline: Callable, ops: int, stored: List[str]) -> Dict[str, Any]:
+    """
+    Пики сверх памяти до запроса. Документ, который memory-хранилище оставляет
+    у себя, из пика запроса вычитается: он живёт дольше запроса.
+    """
+    pipeline(lambda: None, stored)
+    request_peaks, delivery_peaks, size = [], [], 0
+    tracemalloc.start()
+    try:
+        for _ in range(ops):
+            marks = []
+
+            def mark() -> None:
+                marks.append(tracemalloc.get_traced_memory())
+                tracemalloc.reset_peak()
+
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            size = pipeline(mark, stored)
+            current, peak = tracemalloc.get_traced_memory()
+            retained = max(current - baseline, 0)
+            (rendered, render_peak), = marks
+
+            request_peaks.append(max(render_peak, peak) - baseline - retained)
+            # Сверх готового документа и того, что осталось после запроса: копии при передаче
+            delivery_peaks.append(peak - max(rendered, current))
+    finally:
+        tracemalloc.stop()
+
+    def p50(values: List[int]) -> int:
+        return sorted(values)[len(values) // 2]
+
+    return {
+        "ops": ops,
+        "document_bytes": size,
+        "request_peak_bytes": p50(request_peaks),
+        "delivery_peak_bytes": max(p50(delivery_peaks), 0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request memory of the generate pipeline")
+    parser.add_argument("--ops", type=int, default=10)
+    parser.add_argument("--paragraphs", type=parse_ints, default=[200])
+    parser.add_argument("--image-kb", type=parse_ints, default=[0, 4096],
+                        help="Incompressible image embedded in the synthetic template")
+    parser.add_argument("--engines", default="python-docx,ooxml")
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    engine = settings.DOCX_RENDER_ENGINE
+    template_map = docx_generator.TEMPLATE_MAP
+    docx_generator.TEMPLATE_MAP = {**template_map, NDA_TYPE: TEMPLATE_NAME}
+    stored: List[str] = []
+    results = []
+    try:
+        for paragraphs in args.paragraphs:
+            for image_kb in args.image_kb:
+                install_template(paragraphs, image_kb)
+                for engine_name in args.engines.split(","):
+                    settings.DOCX_RENDER_ENGINE = engine_name
+                    for label, pipeline in (("copy", copy_pipeline), ("shared", shared_pipeline)):
+                        results.append({
+                            "benchmark": "generate_memory",
+                            "params": {
+                                "paragraphs": paragraphs, "image_kb": image_kb, "engine": engine_name,
+                                "pipeline": label, "backend": storage.name,
+                            },
+                            **measure(pipeline, args.ops, stored),
+                        })
+                    old, new = results[-2], results[-1]
+                    print(f"  {engine_name:<12} paragraphs={paragraphs:<5} image={image_kb:>5}KB "
+                          f"doc={new['document_bytes']:>10,}B  request peak "
+                          f"{old['request_peak_bytes']:>11,} -> {new['request_peak_bytes']:>11,}B  "
+                          f"delivery {old['delivery_peak_bytes']:>11,} -> {new['delivery_peak_bytes']:>9,}B",
+                          file=sys.stderr)
+    finally:
+        settings.DOCX_RENDER_ENGINE = engine
+        docx_generator.TEMPLATE_MAP = template_map
+        docx_generator.template_cache.invalidate()
+        storage.delete_objects([storage._get_template_path(TEMPLATE_NAME), *stored])
+
+    data = json.dumps({"environment": environment(), "results": results}, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(data)
+    else:
+        print(data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+Воспроизводимый набор бенчмарков: генерация DOCX, склонение, загрузка
+подписанных файлов и чтение/запись meta.json.
+
+По умолчанию работает на STORAGE_BACKEND=memory с синтетическими шаблонами,
+поэтому не нужен ни MinIO, ни сеть. Чтобы замерить реальный MinIO (например,
+локальный бинарник), задайте STORAGE_BACKEND=minio и MINIO_*.
+
+    python scripts/bench_suite.py --output bench/HEAD.json
+    python scripts/bench_suite.py --compare bench/HEAD.json
+
+Результаты выводятся в JSON; --compare сравнивает с прошлым запуском и
+завершается с кодом 1, если p50 какого-либо замера вырос больше --threshold.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+from uuid import uuid4
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("STORAGE_BACKEND", "memory")
+os.environ.setdefault("LOCAL_TEMPLATES_PATH", "")
+# Обязательные настройки, которые memory-бэкенду не нужны
+for name, value in {
+    "MINIO_ENDPOINT": "localhost:9000", "MINIO_ACCESS_KEY": "bench", "MINIO_SECRET_KEY": "bench",
+    "MAIL_USERNAME": "bench", "MAIL_PASSWORD": "bench", "MAIL_SERVER": "localhost",
+    "MAIL_FROM": "bench@example.com", "ADMIN_EMAIL": "bench@example.com",
+}.items():
+    os.environ.setdefault(name, value)
+
+from docx import Document
+from app.config import settings
+from app.models import NDAMetadata, NDAStatus, NDAType
+from app.services.docx_generator import docx_generator
+from app.services.inflection import GenitiveInflector
+from app.services.storage import storage
+from app.services.streams import LimitedReader
+
+SEED = 20260104
+
+FIELDS = {
+    NDAType.ENG: {
+        "effective_date": "04.01.2026",
+        "company_name": "Test Corporation Ltd",
+        "country": "Singapore",
+        "registration_number": "TEST123456",
+        "signatory_name": "Test User",
+        "signatory_title": "CEO",
+        "address": "123 Test Street, Singapore",
+        "email": "test@example.com"
+    },
+    NDAType.RU_EN: {
+        "effective_date": "04.01.2026",
+        "company_name_en": "Test Corporation Ltd",
+        "company_name_ru": "ООО «Тест»",
+        "country_en": "Russia",
+        "country_ru": "Российской Федерации",
+        "registration_number": "1027700132195",
+        "signatory_name_en": "Ivan Petrov",
+        "signatory_title_en": "General Director",
+        "signatory_name_ru": "Иван Петров",
+        "address_en": "Moscow, Tverskaya st. 1",
+        "address_ru": "Москва, ул. Тверская, д. 1",
+        "email": "test@example.com"
+    },
+}
+
+FIRST_NAMES = ["Иван", "Пётр", "Сергей", "Алексей", "Дмитрий", "Андрей", "Михаил", "Николай"]
+PATRONYMICS = ["Иванович", "Петрович", "Сергеевич", "Алексеевич", "Дмитриевич", "Андреевич"]
+LAST_NAMES = ["Петров", "Сидоров", "Кузнецов", "Смирнов", "Попов", "Васильев", "Соколов",
+              "Михайлов", "Новиков", "Фёдоров", "Морозов", "Волков", "Алексеев", "Лебедев"]
+
+
+def synthetic_template(placeholders: List[str], paragraphs: int) -> bytes:
+    """
+    DOCX, в котором каждый абзац содержит плейсхолдер, разбитый на несколько
+    run'ов (как после правки в Word), плюс таблица с плейсхолдерами в ячейках.
+    """
+    rng = random.Random(SEED + paragraphs)
+    doc = Document()
+    for i in range(paragraphs):
+        placeholder = placeholders[i % len(placeholders)]
+        cut = rng.randint(1, len(placeholder) - 1)
+        paragraph = doc.add_paragraph(f"{i + 1}. The Party identified as ")
+        paragraph.add_run(placeholder[:cut]).bold = True
+        paragraph.add_run(placeholder[cut:]).bold = True
+        paragraph.add_run(" undertakes to keep Confidential Information secret. " * 3)
+
+    table = doc.add_table(rows=len(placeholders), cols=2)
+    for row, placeholder in zip(table.rows, placeholders):
+        row.cells[0].text = placeholder.strip("[]")
+        row.cells[1].text = placeholder
+
+    output = io.BytesIO()
+    doc.save(output)
+    return output.getvalue()
+
+
+def install_templates(paragraphs: int) -> None:
+    for nda_type, template_name in docx_generator.TEMPLATE_MAP.items():
+        placeholders = [f"[{key}]" for key in docx_generator._get_field_mapping(nda_type)]
+        storage.put_object(
+            storage._get_template_path(template_name), synthetic_template(placeholders, paragraphs)
+        )
+    docx_generator.template_cache.invalidate()
+    docx_generator.warm_up_templates()
+
+
+def summarize(latencies_ms: List[float], elapsed: float, unit_count: float) -> Dict[str, Any]:
+    ordered = sorted(latencies_ms)
+
+    def pct(q: float) -> float:
+        return round(ordered[min(int(len(ordered) * q), len(ordered) - 1)], 3)
+
+    return {
+        "ops": len(ordered),
+        "throughput_per_s": round(unit_count / elapsed, 2),
+        "latency_ms": {
+            "mean": round(statistics.fmean(ordered), 3),
+            "p50": pct(0.5),
+            "p95": pct(0.95),
+            "p99": pct(0.99),
+        },
+    }
+
+
+def run_concurrent(op: Callable[[int], Any], ops: int, concurrency: int) -> Dict[str, Any]:
+    def timed(i: int) -> float:
+        started = time.perf_counter()
+        op(i)
+        return (time.perf_counter() - started) * 1000
+
+    # Прогрев: первый вызов не должен попадать в статистику
+    op(-1)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, range(ops)))
+    return summarize(latencies, time.perf_counter() - started, ops)
+
+
+def bench_generate(sizes: List[int], engines: List[str], levels: List[int], ops: int) -> List[Dict]:
+    results = []
+    engine = settings.DOCX_RENDER_ENGINE
+    for paragraphs in sizes:
+        install_templates(paragraphs)
+        for engine_name in engines:
+            settings.DOCX_RENDER_ENGINE = engine_name
+            docx_generator.warm_up_templates()
+            for nda_type in (NDAType.ENG, NDAType.RU_EN):
+                for concurrency in levels:
+                    result = run_concurrent(
+                        lambda _: docx_generator.generate(uuid4(), nda_type, FIELDS[nda_type]),
+                        ops, concurrency
+                    )
+                    results.append({
+                        "benchmark": "generate",
+                        "params": {
+                            "paragraphs": paragraphs, "engine": settings.DOCX_RENDER_ENGINE,
+                            "type": nda_type.value, "concurrency": concurrency,
+                        },
+                        **result,
+                    })
+    settings.DOCX_RENDER_ENGINE = engine
+    return results
+
+
+def bench_genitive(ops: int) -> List[Dict]:
+    rng = random.Random(SEED)
+    names = [
+        f"{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)} {rng.choice(PATRONYMICS)}"
+        for _ in range(ops)
+    ]
+    results = []
+    # maxsize=0: каждое слово разбирается pymorphy3 заново
+    for label, cache_size in (("off", 0), ("on", settings.GENITIVE_CACHE_SIZE)):
+        inflector = GenitiveInflector(maxsize=cache_size)
+        inflector.warm_up()
+        latencies = []
+        started = time.perf_counter()
+        for name in names:
+            call_started = time.perf_counter()
+            inflector.to_genitive(name)
+            latencies.append((time.perf_counter() - call_started) * 1000)
+        results.append({
+            "benchmark": "genitive",
+            "params": {"cache": label, "distinct_words": len(set(" ".join(names).split()))},
+            **summarize(latencies, time.perf_counter() - started, ops),
+        })
+    return results
+
+
+def bench_upload(sizes_mb: List[int], levels: List[int], ops: int) -> List[Dict]:
+    nda = NDAMetadata(type=NDAType.ENG, status=NDAStatus.GENERATED, fields={})
+    storage.save_metadata(nda)
+    results = []
+    for size_mb in sizes_mb:
+        payload = random.Random(SEED + size_mb).randbytes(size_mb * 1024 * 1024)
+        for concurrency in levels:
+            result = run_concurrent(
+                lambda i: storage.save_signed_stream(
+                    nda.nda_id,
+                    LimitedReader(io.BytesIO(payload), len(payload)),
+                    f"bench_{i % concurrency}.pdf"
+                ),
+                ops, concurrency
+            )
+            # Пропускная способность в MB/s вместо операций
+            result["throughput_mb_per_s"] = round(result["throughput_per_s"] * size_mb, 2)
+            results.append({
+                "benchmark": "upload",
+                "params": {"size_mb": size_mb, "concurrency": concurrency, "backend": storage.name},
+                **result,
+            })
+    return results
+
+
+def bench_metadata(entries: List[int], levels: List[int], ops: int) -> List[Dict]:
+    """Полный цикл meta.json без кэша: запись, чтение и условное обновление"""
+    cache_size = storage.metadata_cache.maxsize
+    storage.metadata_cache.clear()
+    storage.metadata_cache.maxsize = 0
+
+    results = []
+    for signed_files in entries:
+        for concurrency in levels:
+            ids = []
+            for _ in range(concurrency):
+                nda = NDAMetadata(type=NDAType.RU_EN, status=NDAStatus.GENERATED,
+                                  fields=FIELDS[NDAType.RU_EN])
+                nda.files["signed"] = [f"nda/{nda.nda_id}/nda_signed/file_{i}.pdf" for i in range(signed_files)]
+                storage.save_metadata(nda)
+                ids.append(nda.nda_id)
+
+            def round_trip(i: int) -> None:
+                nda_id = ids[i % len(ids)]
+                storage.get_metadata(nda_id)
+                storage.update_metadata(nda_id, lambda meta: setattr(meta, "status", NDAStatus.SIGNED_UPLOADED))
+
+            results.append({
+                "benchmark": "metadata",
+                "params": {"signed_files": signed_files, "concurrency": concurrency, "backend": storage.name},
+                **run_concurrent(round_trip, ops, concurrency),
+            })
+
+    storage.metadata_cache.maxsize = cache_size
+    return results
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "storage_backend": storage.name,
+        "seed": SEED,
+    }
+
+
+def result_key(result: Dict[str, Any]) -> str:
+    return json.dumps([result["benchmark"], result["params"]], sort_keys=True)
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float) -> bool:
+    """Печатает изменение p50 и пропускной способности; True, если есть регрессии"""
+    previous = {result_key(r): r for r in baseline["results"]}
+    regressed = False
+    print(f"Comparing with {baseline['environment'].get('commit')} "
+          f"({baseline['environment'].get('timestamp')})", file=sys.stderr)
+    for result in current["results"]:
+        old = previous.get(result_key(result))
+        if old is None:
+            continue
+        ratio = result["latency_ms"]["p50"] / old["latency_ms"]["p50"] if old["latency_ms"]["p50"] else 1
+        marker = ""
+        if ratio > 1 + threshold:
+            marker = "  REGRESSION"
+            regressed = True
+        elif ratio < 1 - threshold:
+            marker = "  improved"
+        params = " ".join(f"{k}={v}" for k, v in result["params"].items())
+        print(f"  {result['benchmark']:<9} {params:<60} p50 {old['latency_ms']['p50']:>9.3f} -> "
+              f"{result['latency_ms']['p50']:>9.3f}ms ({ratio - 1:+.1%}){marker}", file=sys.stderr)
+    return regressed
+
+
+def parse_ints(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NDA backend benchmark suite (JSON output)")
+    parser.add_argument("--only", default="generate,genitive,upload,metadata",
+                        help="Comma-separated benchmarks to run")
+    parser.add_argument("--ops", type=int, default=50, help="Operations per measurement")
+    parser.add_argument("--concurrency", type=parse_ints, default=[1, 4])
+    parser.add_argument("--paragraphs", type=parse_ints, default=[20, 200, 1000],
+                        help="Synthetic template sizes")
+    parser.add_argument("--engines", default="python-docx,ooxml")
+    parser.add_argument("--upload-mb", type=parse_ints, default=[1, 5, 10])
+    parser.add_argument("--signed-files", type=parse_ints, default=[0, 50, 500],
+                        help="meta.json sizes (entries in files.signed)")
+    parser.add_argument("--output", help="Write JSON here instead of stdout")
+    parser.add_argument("--compare", help="Previous JSON result to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Allowed p50 regression")
+    args = parser.parse_args()
+
+    selected = set(args.only.split(","))
+    # Синтетические шаблоны кладутся в templates/ - только в хранилище в памяти процесса
+    if "generate" in selected and storage.name != "memory":
+        sys.exit("Synthetic templates need STORAGE_BACKEND=memory; "
+                 "use --only genitive,upload,metadata for other backends")
+
+    results = []
+    if "generate" in selected:
+        results += bench_generate(args.paragraphs, args.engines.split(","), args.concurrency, args.ops)
+    if "genitive" in selected:
+        results += bench_genitive(args.ops * 20)
+    if "upload" in selected:
+        results += bench_upload(args.upload_mb, args.concurrency, max(args.ops // 5, 4))
+    if "metadata" in selected:
+        results += bench_metadata(args.signed_files, args.concurrency, args.ops)
+
+    report = {"environment": environment(), "results": results}
+    data = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(data)
+    else:
+        print(data)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if compare(baseline, report, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+import argparse
+import hashlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from uuid import uuid4
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config import settings
+from app.models import NDAMetadata, NDAStatus, NDAType
+from app.services.docx_generator import docx_generator
+from app.services.render_pool import ProcessRenderPool, warm_worker
+from app.services.storage import storage
+from app.services.streams import LimitedReader
+
+TEMPLATES_DIR = Path(__file__).parent.parent / "app" / "templates"
+
+FIELDS_RU_EN = {
+    "effective_date": "04.01.2026",
+    "company_name_en": "Test Corporation Ltd",
+    "company_name_ru": "ООО «Тест»",
+    "country_en": "Russia",
+    "country_ru": "Российской Федерации",
+    "registration_number": "1027700132195",
+    "signatory_name_en": "Ivan Petrov",
+    "signatory_title_en": "General Director",
+    "signatory_name_ru": "Иван Петров",
+    "address_en": "Moscow, Tverskaya st. 1",
+    "address_ru": "Москва, ул. Тверская, д. 1",
+    "email": "test@example.com"
+}
+
+
+class LocalTemplates:
+    """Шаблоны из app/templates вместо MinIO, чтобы мерить только рендеринг"""
+
+    def stat_template(self, template_name: str) -> str:
+        return hashlib.md5((TEMPLATES_DIR / template_name).read_bytes()).hexdigest()
+
+    def get_template(self, template_name: str) -> bytes:
+        return (TEMPLATES_DIR / template_name).read_bytes()
+
+
+def init_local_worker():
+    docx_generator.template_cache.source = LocalTemplates()
+    warm_worker()
+
+
+def bench_render_pool(max_workers: int, requests_per_worker: int):
+    print("=== Process pool rendering (ru_en) ===")
+    baseline = None
+
+    workers = 1
+    while workers <= max_workers:
+        pool = ProcessRenderPool(workers, initializer=init_local_worker)
+        pool.start()
+
+        total = workers * requests_per_worker
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers * 2) as clients:
+            list(clients.map(
+                lambda _: pool.generate(uuid4(), NDAType.RU_EN, FIELDS_RU_EN), range(total)
+            ))
+        elapsed = time.perf_counter() - started
+        pool.shutdown()
+
+        throughput = total / elapsed
+        baseline = baseline or throughput
+        print(f"  workers={workers:<3} {throughput:8.1f} docs/s  speedup x{throughput / baseline:.2f}")
+        workers *= 2
+
+
+def current_rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class PeakRSS:
+    """Фоновый замер пикового RSS процесса во время блока with"""
+
+    def __enter__(self):
+        self.baseline = current_rss_bytes()
+        self.peak = self.baseline
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(0.005):
+            self.peak = max(self.peak, current_rss_bytes())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    @property
+    def growth_mb(self) -> float:
+        return (self.peak - self.baseline) / 1024 / 1024
+
+
+def bench_upload(size_mb: int, parallel: int):
+    print(f"=== Signed upload to {storage.name}: {parallel} x {size_mb}MB ===")
+    nda = NDAMetadata(type=NDAType.ENG, status=NDAStatus.GENERATED, fields={})
+    storage.save_metadata(nda)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(parallel):
+            path = Path(tmp) / f"upload_{i}.pdf"
+            path.write_bytes(os.urandom(size_mb * 1024 * 1024))
+            paths.append(path)
+
+        def buffered(path: Path):
+            storage.save_signed_file(nda.nda_id, path.read_bytes(), path.name)
+
+        def streaming(path: Path):
+            with open(path, "rb") as f:
+                storage.save_signed_stream(
+                    nda.nda_id, LimitedReader(f, settings.max_file_size_bytes), path.name
+                )
+
+        for label, upload in (("buffered", buffered), ("streaming", streaming)):
+            started = time.perf_counter()
+            with PeakRSS() as rss, ThreadPoolExecutor(max_workers=parallel) as pool:
+                list(pool.map(upload, paths))
+            elapsed = time.perf_counter() - started
+            print(f"  {label:<10} {elapsed:6.2f}s  peak RSS growth {rss.growth_mb:7.1f}MB")
+
+
+def percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def bench_metadata(ndas: int, rounds: int, parallel: int):
+    print(f"=== Upload/submit flows ({storage.name}): {ndas} NDAs x {rounds} rounds, {parallel} clients ===")
+    signed = os.urandom(64 * 1024)
+    cache_size = storage.metadata_cache.maxsize
+
+    def upload_flow(nda_id):
+        storage.get_metadata(nda_id)
+        path = storage.save_signed_stream(
+            nda_id, LimitedReader(io.BytesIO(signed), settings.max_file_size_bytes), "bench.pdf"
+        )
+
+        def record_signed(meta):
+            meta.files.setdefault("signed", []).append(path)
+            meta.status = NDAStatus.SIGNED_UPLOADED
+
+        storage.update_metadata(nda_id, record_signed)
+
+    def submit_flow(nda_id):
+        storage.get_metadata(nda_id)
+        storage.update_metadata(nda_id, lambda meta: setattr(meta, "status", NDAStatus.SUBMITTED))
+
+    def timed(flow, nda_id):
+        started = time.perf_counter()
+        flow(nda_id)
+        return (time.perf_counter() - started) * 1000
+
+    for label, size in (("cache off", 0), ("cache on", cache_size or 1024)):
+        storage.metadata_cache.clear()
+        storage.metadata_cache.maxsize = size
+        ids = []
+        for _ in range(ndas):
+            nda = NDAMetadata(type=NDAType.ENG, status=NDAStatus.GENERATED, fields={})
+            storage.save_metadata(nda)
+            ids.append(nda.nda_id)
+
+        for name, flow in (("upload", upload_flow), ("submit", submit_flow)):
+            with ThreadPoolExecutor(max_workers=parallel) as pool:
+                samples = list(pool.map(lambda nda_id: timed(flow, nda_id), ids * rounds))
+            print(
+                f"  {label:<10} {name:<7} p50 {percentile(samples, 0.5):7.2f}ms"
+                f"  p99 {percentile(samples, 0.99):7.2f}ms"
+            )
+
+    storage.metadata_cache.maxsize = cache_size
+    print(f"  conflicts resolved: {storage.metadata_conflicts}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NDA backend benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    render = commands.add_parser("render", help="Process pool rendering throughput")
+    render.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    render.add_argument("--requests", type=int, default=20, help="Requests per worker")
+
+    upload = commands.add_parser("upload", help="Peak RSS of parallel signed uploads (STORAGE_BACKEND)")
+    upload.add_argument("--size-mb", type=int, default=settings.MAX_FILE_SIZE_MB)
+    upload.add_argument("--parallel", type=int, default=8)
+
+    metadata = commands.add_parser("metadata", help="p50/p99 of upload and submit flows (STORAGE_BACKEND)")
+    metadata.add_argument("--ndas", type=int, default=50)
+    metadata.add_argument("--rounds", type=int, default=4)
+    metadata.add_argument("--parallel", type=int, default=8)
+
+    args = parser.parse_args()
+
+    if args.command == "render":
+        bench_render_pool(args.workers, args.requests)
+    elif args.command == "upload":
+        bench_upload(args.size_mb, args.parallel)
+    elif args.command == "metadata":
+        bench_metadata(args.ndas, args.rounds, args.parallel)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Проверка очереди писем о лидах против локального SMTP-сервера (aiosmtpd).
+
+    pip install aiosmtpd
+    python scripts/check_lead_mail.py
+"""
+import asyncio
+import os
+import socket
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    sys.exit("aiosmtpd is required: pip install aiosmtpd")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+PORT = free_port()
+SPOOL_DIR = tempfile.mkdtemp()
+os.environ.update({
+    "MAIL_SERVER": "127.0.0.1",
+    "MAIL_PORT": str(PORT),
+    "MAIL_STARTTLS": "false",
+    "MAIL_SSL_TLS": "false",
+    "USE_CREDENTIALS": "false",
+    "LEAD_SPOOL_PATH": str(Path(SPOOL_DIR) / "spool.sqlite3"),
+    "LEAD_MAIL_RETRY_BASE_SECONDS": "0.2",
+    "LEAD_MAIL_POLL_SECONDS": "0.1",
+    "LEAD_DIGEST_THRESHOLD": "5",
+})
+
+from app.config import settings
+from app.services.lead_mailer import LeadMailer, LeadSpool, SMTPPool
+
+
+class Inbox:
+    def __init__(self):
+        self.messages = []
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope.content.decode())
+        return "250 OK"
+
+
+def lead(i: int) -> dict:
+    return {"name": f"Lead {i}", "email": f"lead{i}@example.com", "phone": "+100", "details": "NDA"}
+
+
+async def wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            return False
+        await asyncio.sleep(0.05)
+    return True
+
+
+def report(ok: bool, message: str) -> bool:
+    print(f"{'✓' if ok else '✗'} {message}")
+    return ok
+
+
+async def main():
+    ok = True
+    inbox = Inbox()
+    server = Controller(inbox, hostname="127.0.0.1", port=PORT)
+
+    mailer = LeadMailer(LeadSpool(settings.LEAD_SPOOL_PATH), SMTPPool(2, 60))
+    mailer.start()
+
+    # SMTP недоступен: лиды остаются в очереди и уходят в повтор
+    for i in range(3):
+        await mailer.enqueue(lead(i))
+    ok &= report(
+        await wait_for(lambda: mailer.failed_attempts >= 3),
+        f"SMTP down: {mailer.failed_attempts} failed attempts, queue depth {mailer.stats()['queue_depth']}"
+    )
+
+    server.start()
+    ok &= report(
+        await wait_for(lambda: len(inbox.messages) == 3, timeout=10),
+        f"SMTP up: {len(inbox.messages)} of 3 queued leads delivered after retry"
+    )
+
+    for i in range(3, 13):
+        await mailer.enqueue(lead(i))
+    ok &= report(
+        await wait_for(lambda: len(inbox.messages) == 13),
+        f"10 more leads over pooled connections: {mailer.pool.connects} SMTP connections in total"
+    )
+
+    settings.LEAD_DIGEST_INTERVAL_SECONDS = 1
+    delivered = len(inbox.messages)
+    # Без await между вставками цикл отправки видит весь всплеск сразу
+    for i in range(13, 25):
+        mailer.spool.enqueue(lead(i))
+    await wait_for(lambda: mailer.stats()["queue_depth"] == 0)
+    ok &= report(
+        len(inbox.messages) - delivered == 1 and "12 new leads" in inbox.messages[-1],
+        f"burst of 12 leads with digest on: {len(inbox.messages) - delivered} email(s)"
+    )
+
+    stats = mailer.stats()
+    ok &= report(stats["queue_depth"] == 0, f"queue drained: {stats}")
+
+    await mailer.stop()
+    server.stop()
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,174 @@
+import copy
+import sys
+import zipfile
+from io import BytesIO
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from docx import Document
+from lxml import etree
+from app.models import NDAType
+from app.services.docx_generator import DOCXGenerator
+from app.services.ooxml_renderer import OOXMLTemplate
+from app.services.placeholder_plan import PlaceholderPlan, part_roots
+
+TEMPLATES_DIR = Path(__file__).parent.parent / "app" / "templates"
+
+FIELDS = {
+    NDAType.ENG: {
+        "effective_date": "04.01.2026",
+        "company_name": "Test Corporation Ltd",
+        "country": "Singapore",
+        "registration_number": "TEST123456",
+        "signatory_name": "Test User",
+        "signatory_title": "CEO",
+        "address": "123 Test Street,\nSingapore\t<HQ> & Co",
+        "email": "test@example.com"
+    },
+    NDAType.RU_EN: {
+        "effective_date": "04.01.2026",
+        "company_name_en": "Test Corporation Ltd",
+        "company_name_ru": "ООО «Тест»",
+        "country_en": "Russia",
+        "country_ru": "Российской Федерации",
+        "registration_number": "1027700132195",
+        "signatory_name_en": "Ivan Petrov",
+        "signatory_title_en": "General Director",
+        "signatory_name_ru": "Иван Петров",
+        "address_en": "Moscow, Tverskaya st. 1",
+        "address_ru": "Москва, ул. Тверская, д. 1",
+        "email": "test@example.com"
+    }
+}
+
+
+def render_xml(doc: Document) -> bytes:
+    return b"".join(root.xml.encode() for _, root in sorted(part_roots(doc).items()))
+
+
+def with_header_footer(template_bytes: bytes, placeholders: list) -> bytes:
+    """Шаблон с плейсхолдерами в колонтитулах, включая разбитый на два run'а"""
+    doc = Document(BytesIO(template_bytes))
+    section = doc.sections[0]
+    section.header.is_linked_to_previous = False
+    section.footer.is_linked_to_previous = False
+    section.header.paragraphs[0].text = f"Header [{placeholders[0]}]"
+    paragraph = section.footer.paragraphs[0]
+    paragraph.text = ""
+    token = f"[{placeholders[-1]}]"
+    paragraph.add_run(f"Footer {token[:3]}")
+    paragraph.add_run(token[3:])
+    section.footer.add_table(1, 1, section.page_width).cell(0, 0).paragraphs[0].text = f"[{placeholders[1]}]"
+    output = BytesIO()
+    doc.save(output)
+    return output.getvalue()
+
+
+def resolve_content_types(archive: zipfile.ZipFile) -> dict:
+    # python-docx пересобирает [Content_Types].xml, поэтому сравниваем итоговые типы частей
+    defaults, overrides = {}, {}
+    for element in etree.fromstring(archive.read("[Content_Types].xml")):
+        if "Extension" in element.attrib:
+            defaults[element.get("Extension").lower()] = element.get("ContentType")
+        else:
+            overrides[element.get("PartName")] = element.get("ContentType")
+    return {
+        name: overrides.get(f"/{name}", defaults.get(name.rsplit(".", 1)[-1].lower()))
+        for name in archive.namelist()
+        if name != "[Content_Types].xml"
+    }
+
+
+def canonical_part(name: str, data: bytes):
+    if name.endswith((".xml", ".rels")):
+        return etree.tostring(etree.fromstring(data), method="c14n")
+    return data
+
+
+def template_bytes_for(generator: DOCXGenerator, nda_type: NDAType, header_footer: bool) -> bytes:
+    template_bytes = (TEMPLATES_DIR / generator.TEMPLATE_MAP[nda_type]).read_bytes()
+    if header_footer:
+        template_bytes = with_header_footer(template_bytes, list(generator._get_field_mapping(nda_type)))
+    return template_bytes
+
+
+def check_engines(generator: DOCXGenerator, nda_type: NDAType, fields: dict, label: str,
+                  header_footer: bool = False) -> bool:
+    template_bytes = template_bytes_for(generator, nda_type, header_footer)
+    mapping = generator._get_field_mapping(nda_type)
+    replacements = generator._build_replacements(fields, mapping)
+
+    master = Document(BytesIO(template_bytes))
+    doc = copy.deepcopy(master)
+    PlaceholderPlan.compile(master, list(mapping)).apply(doc, replacements)
+    output = BytesIO()
+    doc.save(output)
+
+    expected = zipfile.ZipFile(output)
+    actual = zipfile.ZipFile(BytesIO(OOXMLTemplate.compile(template_bytes, list(mapping)).render(replacements)))
+
+    if actual.testzip() is not None or sorted(expected.namelist()) != sorted(actual.namelist()):
+        print(f"✗ {nda_type.value} [{label}]: ooxml archive is broken or has different parts")
+        return False
+
+    if resolve_content_types(expected) != resolve_content_types(actual):
+        print(f"✗ {nda_type.value} [{label}]: ooxml content types differ from python-docx")
+        return False
+
+    for name in expected.namelist():
+        if name == "[Content_Types].xml":
+            continue
+        if canonical_part(name, expected.read(name)) != canonical_part(name, actual.read(name)):
+            print(f"✗ {nda_type.value} [{label}]: ooxml part {name} differs from python-docx")
+            return False
+
+    print(f"✓ {nda_type.value} [{label}]: ooxml engine matches python-docx")
+    return True
+
+
+def check(generator: DOCXGenerator, nda_type: NDAType, fields: dict, label: str,
+          header_footer: bool = False) -> bool:
+    master = Document(BytesIO(template_bytes_for(generator, nda_type, header_footer)))
+    mapping = generator._get_field_mapping(nda_type)
+
+    expected = copy.deepcopy(master)
+    generator._replace_placeholders(expected, fields, mapping)
+
+    actual = copy.deepcopy(master)
+    plan = PlaceholderPlan.compile(master, list(mapping))
+    plan.apply(actual, generator._build_replacements(fields, mapping))
+
+    if render_xml(expected) != render_xml(actual):
+        print(f"✗ {nda_type.value} [{label}]: output differs from _replace_placeholders")
+        return False
+
+    print(f"✓ {nda_type.value} [{label}]: {len(plan.paragraphs)} paragraphs in plan, output identical")
+    return True
+
+
+def main():
+    generator = DOCXGenerator.__new__(DOCXGenerator)
+    ok = True
+
+    for nda_type, fields in FIELDS.items():
+        ok &= check(generator, nda_type, fields, "all fields")
+        ok &= check_engines(generator, nda_type, fields, "all fields")
+
+        partial = dict(fields)
+        for field_name in list(partial)[::2]:
+            partial[field_name] = None
+        ok &= check(generator, nda_type, partial, "partial fields")
+        ok &= check_engines(generator, nda_type, partial, "partial fields")
+
+        ok &= check(generator, nda_type, {}, "no fields")
+
+        ok &= check(generator, nda_type, fields, "header/footer", header_footer=True)
+        ok &= check_engines(generator, nda_type, fields, "header/footer", header_footer=True)
+
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
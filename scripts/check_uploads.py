@@ -0,0 +1,74 @@
+import os
+import sys
+import zipfile
+from io import BytesIO
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.models import NDAType
+from app.services.docx_generator import DOCXGenerator
+from app.services.upload_verification import UploadRejected, VerifyingReader
+
+TEMPLATES_DIR = Path(__file__).parent.parent / "app" / "templates"
+
+PDF = b"%PDF-1.7\n" + os.urandom(64 * 1024) + b"\n%%EOF\n"
+OLE = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1" + b"\0" * 1024
+
+
+def archive(entries: dict, compression: int = zipfile.ZIP_STORED) -> bytes:
+    output = BytesIO()
+    with zipfile.ZipFile(output, "w", compression) as zf:
+        for name, data in entries.items():
+            zf.writestr(name, data)
+    return output.getvalue()
+
+
+def verify(data: bytes, extension: str) -> Optional[str]:
+    """Прогоняет данные через VerifyingReader так же, как загрузка; текст отказа или None"""
+    reader = VerifyingReader(BytesIO(data), extension)
+    try:
+        reader.prime()
+        while reader.read(64 * 1024):
+            pass
+        reader.finish()
+        return None
+    except UploadRejected as e:
+        return str(e)
+    finally:
+        reader.close()
+
+
+CASES = [
+    ("pdf", "pdf", PDF, True),
+    ("truncated pdf", "pdf", PDF[:-8], False),
+    ("empty file", "pdf", b"", False),
+    ("ole doc", "doc", OLE, True),
+    ("docx template", "docx", (TEMPLATES_DIR / DOCXGenerator.TEMPLATE_MAP[NDAType.ENG]).read_bytes(), True),
+    ("pdf named docx", "docx", PDF, False),
+    ("zip of stored pdf", "zip", archive({"signed.pdf": PDF}), True),
+    ("zip of deflated pdf", "zip", archive({"signed.pdf": PDF}, zipfile.ZIP_DEFLATED), True),
+    ("zip named docx", "docx", archive({"notes.txt": "signed"}), False),
+    ("zip with broken directory", "zip", archive({"signed.pdf": PDF})[:-30], False),
+    ("zip with unsafe path", "zip", archive({"../signed.pdf": PDF}), False),
+    ("zip bomb", "zip", archive({"bomb": b"\0" * (256 * 1024 * 1024)}, zipfile.ZIP_DEFLATED), False),
+]
+
+
+def main():
+    ok = True
+    for label, extension, data, accepted in CASES:
+        error = verify(data, extension)
+        if (error is None) != accepted:
+            print(f"✗ {label} (.{extension}): expected {'accept' if accepted else 'reject'}, got {error or 'accepted'}")
+            ok = False
+        else:
+            print(f"✓ {label} (.{extension}): {error or 'accepted'}")
+
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
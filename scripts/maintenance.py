@@ -0,0 +1,31 @@
+"""
+Однократный запуск обслуживания хранилища: удаление брошенных черновиков,
+архивирование старых SUBMITTED NDA и очистка устаревшего кэша.
+Пороги и темп берутся из MAINTENANCE_* настроек.
+
+    python scripts/maintenance.py --dry-run
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.maintenance import maintenance_job
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Expire stale drafts, archive old NDAs, drop stale cache")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be removed")
+    args = parser.parse_args()
+
+    report = maintenance_job.run_once(dry_run=args.dry_run)
+    if report is None:
+        print("Another maintenance run is in progress, skipped", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Пересобирает индекс NDA (NDA_INDEX_PATH) по meta.json из хранилища.
+
+Листинг идёт параллельно по 16 шардам (первый hex-символ ID), meta.json
+читаются пулом потоков. Приложение можно не останавливать: строки,
+обновлённые во время пересборки, не перезаписываются более старыми
+снимками, а строки NDA, которых больше нет в хранилище, удаляются.
+
+    python scripts/rebuild_index.py --workers 32
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.nda_index import nda_index
+from app.services.storage import storage
+
+SHARDS = "0123456789abcdef"
+BATCH_SIZE = 500
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the NDA index from storage")
+    parser.add_argument("--workers", type=int, default=16, help="Parallel meta.json fetches")
+    parser.add_argument("--no-prune", action="store_true", help="Keep index rows for missing NDAs")
+    args = parser.parse_args()
+
+    if nda_index is None:
+        sys.exit("NDA index is disabled (NDA_INDEX_ENABLED=false)")
+
+    started = time.time()
+    print(f"Rebuilding NDA index from {storage.name} storage...")
+
+    with ThreadPoolExecutor(max_workers=max(args.workers, len(SHARDS))) as pool:
+        shards = pool.map(lambda shard: list(storage.list_nda_ids(shard)), SHARDS)
+        nda_ids = [nda_id for shard in shards for nda_id in shard]
+        print(f"  listed {len(nda_ids)} NDAs in {time.time() - started:.1f}s")
+
+    def fetch(nda_id):
+        # Момент до чтения: запись приложения после него новее этого снимка
+        fetched_at = time.time()
+        metadata = storage.get_metadata_uncached(nda_id)
+        return (metadata, fetched_at) if metadata is not None else None
+
+    indexed = missing = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        entries = pool.map(fetch, nda_ids)
+        while True:
+            batch = list(islice(entries, BATCH_SIZE))
+            if not batch:
+                break
+            found = [entry for entry in batch if entry is not None]
+            nda_index.upsert_many(found)
+            indexed += len(found)
+            missing += len(batch) - len(found)
+            print(f"  indexed {indexed}/{len(nda_ids)}", end="\r")
+
+    pruned = 0 if args.no_prune else nda_index.prune(started)
+    print(f"\n✓ Indexed {indexed} NDAs ({missing} unreadable), pruned {pruned} stale rows "
+          f"in {time.time() - started:.1f}s")
+    print(f"  {nda_index.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import os
 import sys
+import time
 from pathlib import Path
 from minio import Minio
 from minio.error import S3Error
@@ -8,6 +9,7 @@ MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT")
 MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY")
 MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY")
 MINIO_BUCKET = os.getenv("MINIO_BUCKET")
+MINIO_WAIT_SECONDS = int(os.getenv("MINIO_WAIT_SECONDS", "60"))
 
 TEMPLATES = [
     "PT MITRA - NDA_eng.docx",
@@ -15,6 +17,22 @@ TEMPLATES = [
 ]
 
 
+def wait_for_minio(client: Minio) -> bool:
+    print("⏳ Waiting for MinIO to be ready...")
+    deadline = time.monotonic() + MINIO_WAIT_SECONDS
+    
+    while True:
+        try:
+            return client.bucket_exists(MINIO_BUCKET)
+        except S3Error:
+            raise
+        except Exception as e:
+            if time.monotonic() > deadline:
+                print(f"✗ MinIO is not reachable: {e}")
+                sys.exit(1)
+            time.sleep(0.5)
+
+
 def upload_templates():
     client = Minio(
         MINIO_ENDPOINT,
@@ -23,7 +41,7 @@ def upload_templates():
         secure=False
     )
 
-    if not client.bucket_exists(MINIO_BUCKET):
+    if not wait_for_minio(client):
         client.make_bucket(MINIO_BUCKET)
         print(f"✓ Bucket '{MINIO_BUCKET}' created")
     else: